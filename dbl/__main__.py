@@ -60,10 +60,14 @@ def main():
     # Sandbox commands
     sb = sub.add_parser("sandbox")
     sb_act = sb.add_subparsers(dest="action", required=True)
-    sb_act.add_parser("start")
+    sb_start = sb_act.add_parser("start")
+    sb_start.add_argument("--tables", nargs="+", help="Only shadow these tables; globs allowed (e.g., --tables users 'sales_*')")
     sb_act.add_parser("rollback")
     sb_act.add_parser("apply")
     sb_act.add_parser("status")
+    sb_act.add_parser("pool", help="Refill the pool of pre-cloned shadows (sandbox.pool_size)")
+    sb_sync = sb_act.add_parser("sync", help="Copy the active DB into the shadow again (after a failed background sync)")
+    sb_sync.add_argument("--job", help=argparse.SUPPRESS)
     
     # Diff and commit
     diff_p = sub.add_parser("diff")
@@ -71,6 +75,7 @@ def main():
     com_p = sub.add_parser("commit")
     com_p.add_argument("-m", "--message", required=True)
     com_p.add_argument("--schema-only", action="store_true", help="Commit only schema changes, exclude data changes")
+    com_p.add_argument("--no-edit", action="store_true", help="Write the layer without opening $EDITOR (CI)")
     
     # Branch commands
     br = sub.add_parser("branch")
@@ -98,7 +103,7 @@ def main():
     rev_p.add_argument("ref", help="Reference to resolve (HEAD, branch, etc)")
     
     # Reset
-    sub.add_parser("reset")
+    sub.add_parser("reset").add_argument("--full", action="store_true", help="Rebuild from scratch instead of applying only missing layers")
 
     # Validate
     val = sub.add_parser("validate", help="Validate anomalies in layers")
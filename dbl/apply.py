@@ -0,0 +1,245 @@
+"""Replay SQL files (snapshot and layers) against a database
+
+Every file goes through one client session, fed straight through its stdin
+(no shell, no `cat`). A marker statement after each file reports when it has
+finished, which gives per-layer timings.
+"""
+
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from .engines.mysql import MySQLEngine, COPY_BEGIN, COPY_END
+from .engines.postgres import PostgresEngine
+from .errors import DBLError
+from .ledger import ledger_setup_sql, ledger_insert_sql
+from .utils import log
+
+TRANSACTION_MODES = ("none", "layer", "single")
+
+
+def has_copy_blocks(path):
+    """Whether a layer contains MySQL bulk data sections"""
+    if not os.path.exists(path):
+        return False
+    with open(path, encoding="utf-8") as f:
+        return any(line.startswith(COPY_BEGIN) for line in f)
+
+
+def _parse_copy_header(line):
+    """'-- dbl:copy-begin t (c1, c2)' -> ('t', ['c1', 'c2'])"""
+    table, _, cols = line[len(COPY_BEGIN):].strip().partition(" ")
+    return table, [c.strip() for c in cols.strip("()").split(",") if c.strip()]
+
+
+def _segments(path):
+    """Yield ('sql', file) and ('copy', (table, columns), file) parts of a layer in order
+
+    Each part is spooled to a temporary file so the layer is never held in memory.
+    """
+    with open(path, encoding="utf-8") as f:
+        kind, header = "sql", None
+        part = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+        try:
+            for line in f:
+                if kind == "sql" and line.startswith(COPY_BEGIN):
+                    part.seek(0)
+                    yield kind, header, part
+                    part.close()
+                    kind, header = "copy", _parse_copy_header(line)
+                    part = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+                elif kind == "copy" and line.rstrip("\n") == COPY_END:
+                    part.seek(0)
+                    yield kind, header, part
+                    part.close()
+                    kind, header = "sql", None
+                    part = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+                else:
+                    part.write(line)
+            part.seek(0)
+            yield kind, header, part
+        finally:
+            part.close()
+
+
+class ApplySession:
+    """One client process fed through stdin; marker lines on stdout report progress"""
+
+    def __init__(self, engine, db_name, on_mark=None):
+        self.engine = engine
+        self.on_mark = on_mark
+        self.prefix = f"dbl-apply-{uuid.uuid4().hex[:12]}"
+        self.marks = {}
+        self._syncs = 0
+        self.eof = False
+        self._cond = threading.Condition()
+        self._err = tempfile.TemporaryFile()
+        env = engine._auth_env() if isinstance(engine, PostgresEngine) else None
+        argv = shlex.split(engine.get_apply_cmd(db_name), posix=os.name != 'nt')
+        self.proc = subprocess.Popen(argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self._err,
+                                     text=True, encoding="utf-8", env=env)
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        # Anything else the client prints (query results, notices) is dropped
+        for line in self.proc.stdout:
+            token = line.strip()
+            if token.startswith(self.prefix):
+                with self._cond:
+                    self.marks[token] = time.monotonic()
+                    self._cond.notify_all()
+                if self.on_mark:
+                    self.on_mark(token)
+        self.proc.stdout.close()
+        with self._cond:
+            self.eof = True
+            self._cond.notify_all()
+
+    def write(self, text):
+        try:
+            self.proc.stdin.write(text)
+        except OSError:
+            self.fail()
+
+    def copy(self, f):
+        """Send a whole file"""
+        try:
+            shutil.copyfileobj(f, self.proc.stdin)
+            self.proc.stdin.write("\n")
+        except OSError:
+            self.fail()
+
+    def mark(self, token):
+        self.write(self.engine.get_apply_marker_sql(token) + "\n")
+
+    def sync(self):
+        """Block until everything sent so far has run"""
+        self._syncs += 1
+        token = f"{self.prefix}-sync-{self._syncs}"
+        self.mark(token)
+        try:
+            self.proc.stdin.flush()
+        except OSError:
+            self.fail()
+        with self._cond:
+            while token not in self.marks and not self.eof:
+                self._cond.wait()
+        if token not in self.marks:
+            self.fail()
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        code = self.proc.wait()
+        self._reader.join()
+        if code != 0:
+            self.fail(code)
+        self._err.close()
+
+    def kill(self):
+        if self.proc.poll() is None:
+            self.proc.kill()
+            self.proc.wait()
+        if not self._err.closed:
+            self._err.close()
+
+    def fail(self, code=None):
+        code = self.proc.wait() if code is None else code
+        self._err.seek(0)
+        error_msg = self._err.read().decode('utf-8', 'replace').strip()
+        log(f"   Error: {error_msg}", "error")
+        raise DBLError(f"Failed applying layers (exit code {code}).\n   Err: {error_msg}")
+
+
+def apply_layers(engine, db_name, paths, config=None, fresh=False, ledger=None):
+    """Replay SQL files in order through a single client session
+
+    `apply.transaction` in the config picks the transaction scope: none
+    (each statement autocommits, the default), layer (one transaction per
+    file) or single (all files or nothing). `apply.fast_settings` (default
+    true) adds session settings that speed up replay; `fresh` says the
+    database was just created, which makes skipping key checks safe.
+    Each file's time is logged as it finishes. `ledger` holds one
+    (seq, file, sha256) entry per path to record in the applied-layer
+    ledger, in the same transaction as the file itself; the ledger table is
+    only set up once the first file has run.
+    """
+    acfg = (config or {}).get('apply') or {}
+    mode = acfg.get('transaction', 'none')
+    if mode not in TRANSACTION_MODES:
+        raise DBLError(f"apply.transaction inválido: '{mode}'. Usa: {', '.join(TRANSACTION_MODES)}")
+    paths = list(paths)
+    if not paths:
+        return
+
+    done = {}  # layer marker -> (file name, marker of the previous file)
+
+    def on_mark(token):
+        if token in done:
+            name, previous = done[token]
+            log(f"  ✓ {name} ({session.marks[token] - session.marks[previous]:.2f}s)", "info")
+
+    session = ApplySession(engine, db_name, on_mark)
+    tokens = [f"{session.prefix}-{i}" for i in range(len(paths) + 1)]
+    for i, path in enumerate(paths):
+        done[tokens[i + 1]] = (os.path.basename(path), tokens[i])
+    settings = engine.get_apply_settings_sql(fresh) if acfg.get('fast_settings', True) else []
+    # Sent after every file: the next file (and the ledger row) start from a clean session
+    reset_sql = engine.get_apply_reset_sql()
+    reset = "".join(s + "\n" for s in reset_sql + settings) if reset_sql else ""
+    try:
+        if settings:
+            session.write("".join(s + "\n" for s in settings))
+        session.mark(tokens[0])
+        if mode == 'single':
+            session.write("BEGIN;\n")
+        for i, path in enumerate(paths):
+            if mode == 'layer':
+                session.write("BEGIN;\n")
+            _send_file(session, engine, db_name, path, bulk=mode == 'none')
+            if reset:
+                session.write(reset)
+            if ledger:
+                if i == 0:
+                    # Only now: a pg_dump of a managed DB used as the snapshot creates the ledger itself
+                    session.write(ledger_setup_sql(engine, ledger[0][0]))
+                session.write(ledger_insert_sql(engine, *ledger[i]))
+            if mode == 'layer':
+                session.write("COMMIT;\n")
+            session.mark(tokens[i + 1])
+        if mode == 'single':
+            session.write("COMMIT;\n")
+        session.close()
+    except BaseException:
+        session.kill()
+        raise
+
+
+def _send_file(session, engine, db_name, path, bulk):
+    if not (isinstance(engine, MySQLEngine) and has_copy_blocks(path)):
+        with open(path, encoding="utf-8") as f:
+            session.copy(f)
+        return
+    for kind, header, part in _segments(path):
+        if kind == "sql":
+            session.copy(part)
+        elif bulk:
+            # LOAD DATA runs in its own process once the session has caught up
+            session.sync()
+            engine.bulk_load(db_name, header[0], header[1], part)
+        else:
+            # Inside a transaction the rows have to go through the session itself
+            for stmt in engine.copy_rows_to_inserts(header[0], header[1], part):
+                session.write(stmt)
+
+
+def apply_sql_file(engine, db_name, path, config=None, fresh=False):
+    """Replay a single SQL file"""
+    apply_layers(engine, db_name, [path], config=config, fresh=fresh)
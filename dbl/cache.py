@@ -0,0 +1,69 @@
+"""Persistent fingerprint cache keyed on engine change counters"""
+
+import json
+import os
+import time
+from .constants import DBL_DIR, FINGERPRINT_CACHE_FILE
+
+
+DEFAULT_CACHE_SIZE = 5000
+
+
+def _key(db_name, table):
+    return f"{db_name}|{table}"
+
+
+def load_fingerprint_cache():
+    """Load cached table fingerprints"""
+    if not os.path.exists(FINGERPRINT_CACHE_FILE):
+        return {}
+    try:
+        with open(FINGERPRINT_CACHE_FILE, 'r') as f:
+            return json.load(f).get("entries", {})
+    except (ValueError, OSError):
+        # A corrupt cache is never fatal, it only costs a full rehash
+        return {}
+
+
+def save_fingerprint_cache(entries, max_entries=DEFAULT_CACHE_SIZE):
+    """Save cached fingerprints, evicting the least recently used entries"""
+    if len(entries) > max_entries:
+        keep = sorted(entries.items(), key=lambda kv: kv[1].get("used", 0), reverse=True)[:max_entries]
+        entries = dict(keep)
+    os.makedirs(DBL_DIR, exist_ok=True)
+    tmp = FINGERPRINT_CACHE_FILE + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump({"version": 1, "entries": entries}, f)
+    os.replace(tmp, FINGERPRINT_CACHE_FILE)
+
+
+def lookup_fingerprint(entries, db_name, table, token, mode):
+    """Return the cached hash if the table's change token and mode still match"""
+    if not token:
+        return None
+    entry = entries.get(_key(db_name, table))
+    if not entry or entry.get("token") != token or entry.get("mode") != mode:
+        return None
+    entry["used"] = time.time()
+    return entry["hash"]
+
+
+def store_fingerprint(entries, db_name, table, token, mode, hash_val):
+    """Remember a freshly computed hash for a table"""
+    if not token or hash_val in (None, "read_error"):
+        return
+    entries[_key(db_name, table)] = {"token": token, "mode": mode, "hash": hash_val, "used": time.time()}
+
+
+def invalidate_fingerprint_cache(db_name=None):
+    """Drop cached fingerprints for one database (or all of them)"""
+    if not os.path.exists(FINGERPRINT_CACHE_FILE):
+        return
+    if db_name is None:
+        os.remove(FINGERPRINT_CACHE_FILE)
+        return
+    entries = load_fingerprint_cache()
+    prefix = _key(db_name, "")
+    kept = {k: v for k, v in entries.items() if not k.startswith(prefix)}
+    if len(kept) != len(entries):
+        save_fingerprint_cache(kept, max_entries=max(len(kept), 1))
@@ -0,0 +1,215 @@
+"""Checkpoint databases: cached results of replaying the snapshot plus a layer prefix
+
+Each checkpoint is a template database keyed by the content hash of the
+files replayed into it, so a reset only replays the layers after the longest
+cached prefix. Checkpoints are evicted least recently used first once the
+count or disk budget is exceeded. When the database's own ledger shows it is
+simply behind, the missing layers are applied in place instead.
+"""
+
+import hashlib
+import json
+import os
+import time
+from .apply import apply_layers
+from .constants import DBL_DIR, CHECKPOINTS_FILE
+from .errors import DBLError
+from .ledger import read_ledger, applied_prefix, stamp_schema
+from .utils import log
+
+
+DEFAULT_MAX_CHECKPOINTS = 3
+
+
+def load_checkpoints():
+    """Load the checkpoint registry ({'entries': {...}, 'files': {...}})"""
+    if not os.path.exists(CHECKPOINTS_FILE):
+        return {"entries": {}, "files": {}}
+    try:
+        with open(CHECKPOINTS_FILE, 'r') as f:
+            data = json.load(f)
+        return {"entries": data.get("entries", {}), "files": data.get("files", {})}
+    except (ValueError, OSError):
+        # A lost registry only orphans checkpoints; it never breaks a reset
+        return {"entries": {}, "files": {}}
+
+
+def save_checkpoints(registry):
+    """Save the checkpoint registry atomically"""
+    os.makedirs(DBL_DIR, exist_ok=True)
+    tmp = CHECKPOINTS_FILE + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump({"version": 1, **registry}, f)
+    os.replace(tmp, CHECKPOINTS_FILE)
+
+
+def _file_digest(registry, path):
+    """SHA-256 of a file, memoized on its size and mtime"""
+    st = os.stat(path)
+    memo = registry["files"].get(path)
+    if memo and memo["size"] == st.st_size and memo["mtime"] == st.st_mtime_ns:
+        return memo["sha256"]
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    registry["files"][path] = {"size": st.st_size, "mtime": st.st_mtime_ns, "sha256": h.hexdigest()}
+    return h.hexdigest()
+
+
+def prefix_keys(registry, paths):
+    """Key of the state after replaying paths[:i + 1], for every i"""
+    keys = []
+    prev = ""
+    for path in paths:
+        prev = hashlib.sha256(f"{prev}:{_file_digest(registry, path)}".encode()).hexdigest()
+        keys.append(prev)
+    return keys
+
+
+def layer_entries(registry, paths, start=0):
+    """Ledger entries (seq, file, sha256) for `paths` replayed from position `start`"""
+    return [(start + i, os.path.basename(p), _file_digest(registry, p)) for i, p in enumerate(paths)]
+
+
+def appendable_entries(engine, db_name, base_paths, new_paths, check_schema=True):
+    """Ledger entries for new_paths if db_name holds exactly base_paths, else None
+
+    Without them the ledger falls behind, which only costs a full rebuild
+    on the next reset.
+    """
+    applied = read_ledger(engine, db_name)
+    if not applied or len(applied) != len(base_paths):
+        return None
+    registry = load_checkpoints()
+    try:
+        base = layer_entries(registry, base_paths)
+        entries = layer_entries(registry, new_paths, len(base_paths))
+    finally:
+        save_checkpoints(registry)
+    if applied_prefix(engine, db_name, base, applied, check_schema) != len(base_paths):
+        return None
+    return entries
+
+
+def checkpoint_db_name(db_name, key):
+    return f"{db_name}_ckpt_{key[:12]}"
+
+
+def _restore(engine, registry, keys, db_name):
+    """Clone the longest cached prefix into db_name; returns how many files it covers"""
+    entries = registry["entries"]
+    for i in range(len(keys), 0, -1):
+        entry = entries.get(keys[i - 1])
+        if not entry:
+            continue
+        try:
+            engine.clone_db(entry["db"], db_name)
+        except DBLError:
+            log(f"   Checkpoint {entry['db']} is unusable, discarding it", "warn")
+            entries.pop(keys[i - 1])
+            engine.drop_db(db_name)
+            continue
+        entry["used"] = time.time()
+        log(f"   Restored checkpoint {entry['db']} ({i}/{len(keys)} files)", "info")
+        return i
+    return 0
+
+
+def _store(engine, registry, config, db_name, key, files):
+    entries = registry["entries"]
+    if key in entries:
+        return
+    name = checkpoint_db_name(config['db_name'], key)
+    try:
+        engine.clone_db(db_name, name)
+    except DBLError:
+        # The rebuild itself succeeded; a missing checkpoint only costs time later
+        log(f"   Could not store checkpoint {name}", "warn")
+        engine.drop_db(name)
+        return
+    now = time.time()
+    entries[key] = {"db": name, "files": files, "size": engine.get_db_size(name), "created": now, "used": now}
+
+
+def evict_checkpoints(engine, registry, config):
+    """Drop least recently used checkpoints until the count and size budgets hold"""
+    ccfg = config.get('checkpoints') or {}
+    max_count = int(ccfg.get('max_count', DEFAULT_MAX_CHECKPOINTS))
+    max_bytes = int(float(ccfg.get('max_size_mb', 0)) * 1024 * 1024)
+    entries = registry["entries"]
+    by_age = sorted(entries, key=lambda k: entries[k].get("used", 0))
+    total = sum(e.get("size") or 0 for e in entries.values())
+    for key in by_age:
+        if len(entries) <= max_count and (not max_bytes or total <= max_bytes):
+            break
+        entry = entries.pop(key)
+        total -= entry.get("size") or 0
+        log(f"   Evicting checkpoint {entry['db']}", "info")
+        engine.drop_db(entry["db"])
+
+
+def _catch_up(engine, config, db_name, paths, entries):
+    """Apply only the layers db_name is missing; False if it is not a clean prefix"""
+    done = applied_prefix(engine, db_name, entries)
+    if done is None:
+        return False
+    if done == len(paths):
+        log("   Database already matches the branch", "info")
+        return True
+    log(f"   Ledger matches {done}/{len(paths)} files, applying the rest", "info")
+    apply_layers(engine, db_name, paths[done:], config, ledger=entries[done:])
+    stamp_schema(engine, db_name, entries[-1][0])
+    return True
+
+
+def rebuild_db(engine, config, db_name, paths, full=False):
+    """Recreate db_name as the replay of `paths` (snapshot + layers), reusing checkpoints
+
+    If the database's ledger shows it is a clean prefix of `paths`, only
+    the missing files are applied (unless `full`). Otherwise, with
+    `checkpoints.enabled`, it starts from the longest cached prefix and
+    replays only the rest; a new checkpoint is stored at the end, and every
+    `checkpoints.every` files if set.
+    """
+    ccfg = config.get('checkpoints') or {}
+    # Opt-in: each checkpoint is a full copy of the database kept on the server
+    enabled = ccfg.get('enabled', False)
+    registry = load_checkpoints()
+    entries = layer_entries(registry, paths)
+    if enabled:
+        save_checkpoints(registry)
+    if not full and paths and _catch_up(engine, config, db_name, paths, entries):
+        return
+
+    engine.drop_db(db_name)
+    if not enabled:
+        engine.create_db(db_name)
+        _replay(engine, config, db_name, paths, entries)
+        return
+
+    keys = prefix_keys(registry, paths)
+    start = _restore(engine, registry, keys, db_name)
+    if start == 0:
+        engine.create_db(db_name)
+
+    every = int(ccfg.get('every', 0))
+    bounds = set(range(every, len(paths), every)) if every > 0 else set()
+    bounds.add(len(paths))
+    try:
+        pos = start
+        for end in sorted(b for b in bounds if b > start):
+            _replay(engine, config, db_name, paths[pos:end], entries[pos:end])
+            pos = end
+            if int(ccfg.get('max_count', DEFAULT_MAX_CHECKPOINTS)) > 0:
+                _store(engine, registry, config, db_name, keys[end - 1], end)
+        evict_checkpoints(engine, registry, config)
+    finally:
+        save_checkpoints(registry)
+
+
+def _replay(engine, config, db_name, paths, entries):
+    if not paths:
+        return
+    apply_layers(engine, db_name, paths, config, fresh=True, ledger=entries)
+    stamp_schema(engine, db_name, entries[-1][0])
@@ -3,12 +3,15 @@
 import os
 from datetime import datetime
 from ..constants import LAYERS_DIR
-from ..manifest import load_manifest, save_manifest
+from ..manifest import load_manifest, save_manifest, branch_paths
 from ..config import load_config, get_engine
 from ..state import get_target_db
 from ..errors import DBLError
-from ..utils import log, run_command
-from ..engines.postgres import PostgresEngine
+from ..utils import log
+from ..apply import apply_layers
+from ..checkpoints import appendable_entries
+from ..ledger import stamp_schema
+from ..pool import schedule_refill
 
 
 def cmd_branch(args):
@@ -92,16 +95,22 @@ def cmd_merge(args):
     engine = get_engine(config)
     db = config['db_name']
     
-    for l in new_layers:
-        log(f"Applying {l['file']}", "info")
-        path = os.path.join(LAYERS_DIR, l['file'])
-        cat_cmd = "type" if os.name == 'nt' else "cat"
-        run_command(f"{cat_cmd} {path} | {engine.get_base_cmd(db)}", 
-                   env=engine._auth_env() if isinstance(engine, PostgresEngine) else None)
-        m['branches'][curr].append(l)
+    log(f"Applying {len(new_layers)} layers", "info")
+    _apply_new_layers(engine, config, db, m['branches'][curr], new_layers)
+    m['branches'][curr].extend(new_layers)
     
     save_manifest(m)
     log("Merge completed.", "success")
+    schedule_refill(config)
+
+
+def _apply_new_layers(engine, config, db, layers, new_layers):
+    """Apply layers on top of the branch, extending the DB's ledger when it is in sync"""
+    paths = [os.path.join(LAYERS_DIR, l['file']) for l in new_layers]
+    entries = appendable_entries(engine, db, branch_paths(layers), paths)
+    apply_layers(engine, db, paths, config, ledger=entries)
+    if entries:
+        stamp_schema(engine, db, entries[-1][0])
 
 
 def cmd_pull(args):
@@ -128,12 +137,9 @@ def cmd_pull(args):
         return log(f"No new changes from '{src}'", "info")
     
     log(f"Pulling {len(new_layers)} layers from branch '{src}'...", "info")
-    for l in new_layers:
-        log(f"  Applying: {l['file']}", "info")
-        path = os.path.join(LAYERS_DIR, l['file'])
-        run_command(f"cat {path} | {engine.get_base_cmd(db)}", 
-                   env=engine._auth_env() if isinstance(engine, PostgresEngine) else None)
-        m['branches'][curr].append(l)
+    _apply_new_layers(engine, config, db, m['branches'][curr], new_layers)
+    m['branches'][curr].extend(new_layers)
     
     save_manifest(m)
     log(f"Pull from '{src}' completed. Branch '{curr}' updated.", "success")
+    schedule_refill(config)
@@ -7,10 +7,17 @@ import subprocess
 import tempfile
 from ..constants import SANDBOX_META_FILE, LAYERS_DIR
 from ..config import load_config, get_engine
-from ..state import get_target_db
-from ..manifest import load_manifest, save_manifest
-from ..planner import generate_migration_sql
+from ..state import get_target_db, get_states, store_baseline_state, clear_baseline_state, scope_violations
+from ..manifest import load_manifest, save_manifest, branch_paths
+from ..checkpoints import appendable_entries
+from ..ledger import record_layers
+from ..errors import DBLError
+from ..pool import schedule_refill
+from ..shadow import start_shadow_sync, wait_for_shadow, refresh_shadow
+from ..planner import write_migration_sql
+from ..writer import LayerWriter, file_has_sql
 from ..utils import log
+from ..cache import invalidate_fingerprint_cache
 
 
 def cmd_commit(args):
@@ -25,43 +32,54 @@ def cmd_commit(args):
     with open(SANDBOX_META_FILE) as f: 
         meta = json.load(f)
     backup_db = meta['backup_db']
+    # The diff below needs the shadow as of the previous commit
+    wait_for_shadow()
     
     schema_only = args.schema_only if hasattr(args, 'schema_only') and args.schema_only else False
     include_data = not schema_only  # Data is included by default, unless --schema-only specified
     
-    # Generate migration SQL
-    sql = generate_migration_sql(config, engine, db, backup_db, include_data=include_data)
+    no_edit = args.no_edit if hasattr(args, 'no_edit') and args.no_edit else False
     
-    # Check if there is actual SQL
-    clean_lines = [l for l in sql.splitlines() if not l.strip().startswith("--") and l.strip()]
-    if not clean_lines:
-        return log("No structural or data changes detected.", "warn")
-    
-    # Open editor
-    with tempfile.NamedTemporaryFile(suffix=".sql", mode='w+', delete=False) as tf:
-        tf.write(sql)
-        tpath = tf.name
-    
-    editor = os.environ.get('EDITOR', 'nano')
-    try: 
-        subprocess.call([editor, tpath])
-    except: 
-        pass
-    
-    with open(tpath, 'r') as f: 
-        final_sql = f.read().strip()
-    os.remove(tpath)
-    
-    if not final_sql or len([l for l in final_sql.splitlines() if not l.strip().startswith("--")]) == 0:
-        return log("Commit canceled (empty SQL).", "warn")
+    # Stream the migration SQL straight to a pending layer file
+    states, schemas = {}, {}
+    scope = meta.get('tables')
+    if scope:
+        # The layer can only describe the tables the partial shadow holds
+        schemas['active'] = engine.inspect_db(db)
+        outside = scope_violations(schemas['active'], meta)
+        if outside:
+            raise DBLError(f"Cambios de esquema fuera del sandbox parcial: {', '.join(outside)}\n"
+                           "   Revierte esos cambios o inicia un sandbox que incluya esas tablas.")
+    os.makedirs(LAYERS_DIR, exist_ok=True)
+    fd, tpath = tempfile.mkstemp(suffix=".sql", prefix=".pending_", dir=LAYERS_DIR)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(f"-- {args.message}\n")
+            writer = LayerWriter(f)
+            write_migration_sql(writer, config, engine, db, backup_db, include_data=include_data,
+                                states=states, schemas=schemas, scope=scope)
         
-    # Save layer
-    manifest = load_manifest()
-    curr = manifest['current']
-    fname = f"{curr}_{int(time.time())}.sql"
-    
-    with open(os.path.join(LAYERS_DIR, fname), 'w') as f:
-        f.write(f"-- {args.message}\n{final_sql}")
+        # Checked while streaming: is there actual SQL?
+        if not writer.has_sql:
+            return log("No structural or data changes detected.", "warn")
+        
+        if not no_edit:
+            editor = os.environ.get('EDITOR', 'nano')
+            try: 
+                subprocess.call([editor, tpath])
+            except: 
+                pass
+            if not file_has_sql(tpath):
+                return log("Commit canceled (empty SQL).", "warn")
+        
+        # Save layer
+        manifest = load_manifest()
+        curr = manifest['current']
+        fname = f"{curr}_{int(time.time())}.sql"
+        os.replace(tpath, os.path.join(LAYERS_DIR, fname))
+    finally:
+        if os.path.exists(tpath):
+            os.remove(tpath)
     
     # Add commit metadata
     commit_info = {"file": fname, "msg": args.message}
@@ -70,10 +88,39 @@ def cmd_commit(args):
     else:
         commit_info["type"] = "schema"
     
+    base_paths = branch_paths(manifest['branches'][curr])
+    layer_path = os.path.join(LAYERS_DIR, fname)
+    # Saved right after the file lands, so nothing below can leave it out of the branch
     manifest['branches'][curr].append(commit_info)
     save_manifest(manifest)
     
+    # The active DB now holds the branch plus this layer; keep its ledger in step
+    try:
+        entries = appendable_entries(engine, db, base_paths, [layer_path], check_schema=False)
+        if entries:
+            record_layers(engine, db, entries)
+    except DBLError:
+        log("Could not update the layer ledger; the next reset rebuilds from scratch", "warn")
+    
     log(f"Capa guardada: {fname} ({commit_info['type']})", "success")
-    log("Syncing shadow DB...", "info")
-    engine.drop_db(backup_db)
-    engine.clone_db(db, backup_db)
+    invalidate_fingerprint_cache(backup_db)
+    if include_data:
+        # The sync job measures the shadow's baseline once the layer is applied
+        clear_baseline_state()
+        # What the shadow must match afterwards (not computed yet when no table was compared)
+        expected = states.get('active') or get_states(engine, [db], config, schemas={db: schemas['active']},
+                                                      scope=scope)[0]
+        # Applying the layer to the shadow yields the committed state without
+        # touching the active DB, so it can run while you keep working
+        job = start_shadow_sync(meta, base_paths, layer_path, expected)
+        log(f"Syncing shadow DB in the background ({job['id']})...", "info")
+    else:
+        # A schema-only layer leaves the data changes out, so the shadow has to be a copy
+        log("Syncing shadow DB...", "info")
+        refresh_shadow(engine, config, db, backup_db, states=states, schemas=schemas, scope=scope)
+        if 'active' in states:
+            # The shadow now holds what the active DB held, so its fingerprints are already known
+            store_baseline_state(engine, config, states['active'])
+        else:
+            clear_baseline_state()
+        schedule_refill(config)
@@ -5,8 +5,10 @@ import json
 import sys
 from ..constants import STATE_FILE, SANDBOX_META_FILE
 from ..config import load_config, get_engine
-from ..state import get_target_db, get_state
+from ..state import get_target_db, get_state, get_db_states, scope_violations
 from ..utils import log
+from ..merkle import changed_ranges
+from ..shadow import wait_for_shadow
 
 
 def cmd_diff(args):
@@ -20,13 +22,22 @@ def cmd_diff(args):
     if filter_tables:
         log(f"🔍 Filtering {len(filter_tables)} specific tables: {', '.join(filter_tables)}", "info")
     
-    current_state = get_state(engine, target_db, config, filter_tables=filter_tables)
-    
     if is_sandbox:
         with open(SANDBOX_META_FILE) as f: 
             meta = json.load(f)
-        baseline_state = get_state(engine, meta['backup_db'], config, filter_tables=filter_tables)
+        wait_for_shadow()
+        schemas = {}
+        if meta.get('tables'):
+            log(f"🔍 Partial sandbox: {len(meta['tables'])} tables in scope", "info")
+            schemas[target_db] = engine.inspect_db(target_db)
+            outside = scope_violations(schemas[target_db], meta)
+            if outside:
+                log(f"⚠️  DDL outside the sandbox scope (commit will refuse): {', '.join(outside)}", "warn")
+        # Both databases are fingerprinted concurrently on one worker pool
+        current_state, baseline_state = get_db_states(engine, [target_db, meta['backup_db']], config,
+                                                      filter_tables=filter_tables, schemas=schemas)
     else:
+        current_state = get_state(engine, target_db, config, filter_tables=filter_tables)
         if not os.path.exists(STATE_FILE): 
             return False, []
         with open(STATE_FILE) as f: 
@@ -60,6 +71,12 @@ def cmd_diff(args):
                 log(f"🔴 DATA CHANGE: {table}", "warn")
                 log(f"   Current:  {current_hash[:16]}...", "info")
                 log(f"   Baseline: {baseline_hash[:16]}...", "info")
+                ranges = changed_ranges(current_state.get('chunks', {}).get(table),
+                                        baseline_state.get('chunks', {}).get(table))
+                if ranges:
+                    pk = current_state['chunks'][table]['pk']
+                    shown = ", ".join(f"{lo}-{hi}" for lo, hi in ranges[:5])
+                    log(f"   Changed {pk} ranges: {shown}{'...' if len(ranges) > 5 else ''}", "info")
             has_changes = True
             changed_data_tables.append(table)
             
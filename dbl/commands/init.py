@@ -6,7 +6,10 @@ from ..constants import CONFIG_FILE, LAYERS_DIR, SNAPSHOT_FILE
 from ..utils import log, confirm_action, run_command
 from ..config import load_config, get_engine
 from ..manifest import save_manifest
-from ..engines.postgres import PostgresEngine
+from ..cache import invalidate_fingerprint_cache
+from ..apply import apply_layers
+from ..checkpoints import load_checkpoints, layer_entries
+from ..ledger import stamp_schema
 
 
 def cmd_init(args):
@@ -49,7 +52,9 @@ def cmd_import(args):
     run_command(f"cp {args.file} {SNAPSHOT_FILE}")
     engine.drop_db(db)
     engine.create_db(db)
-    run_command(f"cat {SNAPSHOT_FILE} | {engine.get_base_cmd(db)}", 
-               env=engine._auth_env() if isinstance(engine, PostgresEngine) else None)
+    invalidate_fingerprint_cache(db)
+    entries = layer_entries(load_checkpoints(), [SNAPSHOT_FILE])
+    apply_layers(engine, db, [SNAPSHOT_FILE], config, fresh=True, ledger=entries)
+    stamp_schema(engine, db, 0)
     save_manifest({"current": "master", "branches": {"master": []}})
     log("Snapshot imported. Master reset.", "success")
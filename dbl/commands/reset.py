@@ -1,12 +1,12 @@
 """Reset command"""
 
-import os
-from ..constants import SNAPSHOT_FILE, LAYERS_DIR
 from ..config import load_config, get_engine
 from ..state import get_target_db
-from ..manifest import load_manifest
-from ..utils import log, confirm_action, run_command
-from ..engines.postgres import PostgresEngine
+from ..manifest import load_manifest, branch_paths
+from ..utils import log, confirm_action
+from ..cache import invalidate_fingerprint_cache
+from ..checkpoints import rebuild_db
+from ..pool import schedule_refill
 
 
 def cmd_reset(args):
@@ -15,24 +15,19 @@ def cmd_reset(args):
     engine = get_engine(config)
     db, is_sandbox = get_target_db(config)
     m = load_manifest()
+    full = args.full if hasattr(args, 'full') and args.full else False
     
     if not is_sandbox:
         if not confirm_action(f"This will rebuild database '{db}'. Continue?"):
             return
     
     log(f"Rebuilding {db} on branch {m['current']}...", "warn")
-    engine.drop_db(db)
-    engine.create_db(db)
+    invalidate_fingerprint_cache(db)
     
-    if os.path.exists(SNAPSHOT_FILE):
-        cat_cmd = "type" if os.name == 'nt' else "cat"
-        run_command(f"{cat_cmd} {SNAPSHOT_FILE} | {engine.get_base_cmd(db)}", 
-                   env=engine._auth_env() if isinstance(engine, PostgresEngine) else None)
-        
-    for l in m['branches'][m['current']]:
-        path = os.path.join(LAYERS_DIR, l['file'])
-        cat_cmd = "type" if os.name == 'nt' else "cat"
-        run_command(f"{cat_cmd} {path} | {engine.get_base_cmd(db)}", 
-                   env=engine._auth_env() if isinstance(engine, PostgresEngine) else None)
+    # Applies only the missing layers when the DB's ledger allows it; otherwise
+    # starts from the longest cached checkpoint and replays the remaining layers.
+    # A sandbox may hold uncommitted data edits the ledger can't see, so it is always rebuilt.
+    rebuild_db(engine, config, db, branch_paths(m['branches'][m['current']]), full=full or is_sandbox)
     
     log("State restored.", "success")
+    schedule_refill(config)
@@ -7,6 +7,14 @@ from ..constants import SANDBOX_META_FILE
 from ..config import load_config, get_engine
 from ..manifest import load_manifest
 from ..utils import log
+from ..cache import invalidate_fingerprint_cache
+from ..pool import claim_shadow, refill_pool, schedule_refill, load_pool, pool_size
+from ..jobs import list_jobs, wait_for_jobs, describe_job
+from ..shadow import (
+    JOB_KIND, run_shadow_sync, wait_for_shadow, clear_shadow_jobs, refresh_shadow,
+    create_partial_shadow, restore_partial
+)
+from ..state import clear_baseline_state, resolve_tables, outside_signatures, scope_violations
 
 
 def cmd_sandbox(args):
@@ -19,14 +27,31 @@ def cmd_sandbox(args):
         if os.path.exists(SANDBOX_META_FILE): 
             return log("Sandbox already active.", "error")
         
-        bk = f"{db}_dbl_shadow_{int(time.time())}"
+        patterns = args.tables if hasattr(args, 'tables') and args.tables else None
         log("🛡️  Creating safe environment (Sandbox)...", "header")
-        engine.backup_db(db, bk)
+        meta = {"mode": "shadow", "active_db": db}
+        if patterns:
+            # Partial sandbox: the shadow only holds the selected tables
+            schema = engine.inspect_db(db)
+            tables = resolve_tables(patterns, sorted(schema))
+            bk = f"{db}_dbl_shadow_{int(time.time())}"
+            log(f"   Scope: {len(tables)} of {len(schema)} tables", "info")
+            create_partial_shadow(engine, config, db, bk, tables)
+            meta.update(tables=tables, outside=outside_signatures(schema, tables))
+        else:
+            bk = claim_shadow(engine, config, db)
+            if bk:
+                log(f"   Using pooled shadow {bk}", "info")
+            else:
+                bk = f"{db}_dbl_shadow_{int(time.time())}"
+                engine.backup_db(db, bk)
+        meta["backup_db"] = bk
         
         with open(SANDBOX_META_FILE, 'w') as f:
-            json.dump({"mode":"shadow","active_db":db,"backup_db":bk}, f)
+            json.dump(meta, f)
         
         log("✅ Sandbox ready. You can work locally as usual.", "success")
+        schedule_refill(config)
         
     elif args.action == "rollback":
         if not os.path.exists(SANDBOX_META_FILE): 
@@ -35,11 +60,24 @@ def cmd_sandbox(args):
         with open(SANDBOX_META_FILE) as f: 
             meta = json.load(f)
         
+        # The shadow must hold the last commit before it can replace the active DB
+        wait_for_shadow()
         log("🔙 Reverting changes...", "warn")
-        engine.drop_db(meta['active_db'])
-        engine.clone_db(meta['backup_db'], meta['active_db'])
-        engine.drop_db(meta['backup_db'])
+        if meta.get('tables'):
+            # Only the scoped tables go back; the shadow never held the rest
+            outside = scope_violations(engine.inspect_db(meta['active_db']), meta)
+            if outside:
+                log(f"   Tables outside the sandbox changed and are left as they are: {', '.join(outside)}", "warn")
+            # Raises before anything below, so a failed restore keeps the sandbox (and its shadow)
+            restore_partial(engine, config, meta)
+            engine.drop_db(meta['backup_db'])
+        else:
+            # The shadow takes the active DB's name; no data is copied
+            engine.replace_db(meta['backup_db'], meta['active_db'])
         os.remove(SANDBOX_META_FILE)
+        invalidate_fingerprint_cache(meta['active_db'])
+        invalidate_fingerprint_cache(meta['backup_db'])
+        clear_shadow_jobs()
         log("DB restored to original state.", "success")
         
     elif args.action == "apply":
@@ -50,14 +88,48 @@ def cmd_sandbox(args):
             meta = json.load(f)
         
         log("💾 Confirming changes (Sandbox closed)...", "success")
+        # The shadow is dropped either way; only don't pull it from under a running sync
+        wait_for_jobs(JOB_KIND)
         engine.drop_db(meta['backup_db'])
         os.remove(SANDBOX_META_FILE)
+        invalidate_fingerprint_cache(meta['backup_db'])
+        clear_shadow_jobs()
+
+    elif args.action == "sync":
+        if getattr(args, 'job', None):
+            # Background side of commit
+            return run_shadow_sync(engine, config, args.job)
+        if not os.path.exists(SANDBOX_META_FILE): 
+            return log("No sandbox active.", "error")
+        
+        with open(SANDBOX_META_FILE) as f: 
+            meta = json.load(f)
+        
+        wait_for_jobs(JOB_KIND)
+        log("Copying the active DB into the shadow...", "info")
+        refresh_shadow(engine, config, meta['active_db'], meta['backup_db'], scope=meta.get('tables'))
+        invalidate_fingerprint_cache(meta['backup_db'])
+        clear_baseline_state()
+        clear_shadow_jobs()
+        log("Shadow DB in sync.", "success")
+
+    elif args.action == "pool":
+        # Also what the background refill after start/commit/reset runs
+        refill_pool(engine, config)
+        members = load_pool()["members"]
+        log(f"Sandbox pool: {len(members)}/{pool_size(config)} ready", "info")
+        for member in members:
+            log(f"  {member['db']}", "info")
 
     elif args.action == "status":
         if os.path.exists(SANDBOX_META_FILE):
             with open(SANDBOX_META_FILE) as f: 
                 meta = json.load(f)
             log(f"Sandbox Active: {meta['active_db']} (Shadow: {meta['backup_db']})", "branch")
+            if meta.get('tables'):
+                log(f"  Partial sandbox: {', '.join(meta['tables'])}", "info")
+            for job in list_jobs(JOB_KIND):
+                log(f"  Shadow sync {describe_job(job)}", "error" if job["status"] == "failed" else "info")
         else:
             m = load_manifest()
             log(f"Current branch: {m['current']}", "info")
@@ -4,7 +4,7 @@ import os
 import yaml
 from .constants import CONFIG_FILE
 from .errors import DBLError
-from .engines import PostgresEngine, MySQLEngine
+from .engines import PostgresEngine, MySQLEngine, PostgresDriverEngine, MySQLDriverEngine
 
 
 def load_config():
@@ -15,11 +15,30 @@ def load_config():
         return yaml.safe_load(f)
 
 
+def _use_driver(config, driver_engine, extra):
+    """Decide between the driver-backed engine and the CLI one ('driver' in dbl.yaml)"""
+    mode = config.get('driver', 'auto')
+    if mode == 'cli':
+        return False
+    if mode == 'native':
+        if not driver_engine.available:
+            raise DBLError(f"driver: native requiere el driver de Python. Instala: pip install dbl-sandbox[{extra}]")
+        return True
+    if mode != 'auto':
+        raise DBLError(f"driver '{mode}' no soportado (usa auto, cli o native).")
+    # Containers are reached through docker exec, so their port may not be published
+    return driver_engine.available and not config.get('container_name')
+
+
 def get_engine(config):
     """Get database engine instance based on configuration"""
     if config['engine'] == 'postgres': 
+        if _use_driver(config, PostgresDriverEngine, 'postgres'):
+            return PostgresDriverEngine(config)
         return PostgresEngine(config)
     elif config['engine'] == 'mysql': 
+        if _use_driver(config, MySQLDriverEngine, 'mysql'):
+            return MySQLDriverEngine(config)
         return MySQLEngine(config)
     else: 
         raise DBLError(f"Motor '{config['engine']}' no soportado.")
@@ -13,6 +13,14 @@ SNAPSHOT_FILE = os.path.join(DBL_DIR, "snapshot.sql")
 STATE_FILE = os.path.join(DBL_DIR, "state.json")
 MANIFEST_FILE = os.path.join(LAYERS_DIR, "manifest.json")
 SANDBOX_META_FILE = os.path.join(DBL_DIR, "sandbox.json")
+FINGERPRINT_CACHE_FILE = os.path.join(DBL_DIR, "fingerprints.json")
+MERKLE_DIR = os.path.join(DBL_DIR, "merkle")
+CHECKPOINTS_FILE = os.path.join(DBL_DIR, "checkpoints.json")
+POOL_FILE = os.path.join(DBL_DIR, "pool.json")
+JOBS_DIR = os.path.join(DBL_DIR, "jobs")
+
+# Table inside managed databases recording which layer files were applied
+LEDGER_TABLE = "_dbl_ledger"
 
 # Colors
 class Color:
@@ -3,5 +3,7 @@
 from .base import DBEngine
 from .postgres import PostgresEngine
 from .mysql import MySQLEngine
+from .postgres_driver import PostgresDriverEngine
+from .mysql_driver import MySQLDriverEngine
 
-__all__ = ['DBEngine', 'PostgresEngine', 'MySQLEngine']
+__all__ = ['DBEngine', 'PostgresEngine', 'MySQLEngine', 'PostgresDriverEngine', 'MySQLDriverEngine']
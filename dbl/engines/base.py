@@ -1,6 +1,18 @@
 """Abstract base class for database engines"""
 
+import atexit
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from .session import SessionManager
+from .docker import resolve_docker_endpoint
+from .dumps import spool_lines
+from ..constants import LEDGER_TABLE
+from ..errors import DBLError
+
+# Tables hashed concurrently (also the size of driver connection pools)
+DEFAULT_WORKERS = 8
+# Tables per pg_dump/mysqldump invocation when dumping many tables
+DUMP_BATCH_SIZE = 50
 
 
 class DBEngine(ABC):
@@ -13,6 +25,18 @@ class DBEngine(ABC):
         self.password = config.get('password', '')
         self.container = config.get('container_name')
         self.is_docker = bool(self.container)
+        # Query clients connect straight to the container when it is reachable
+        self.docker_direct = bool(config.get('docker_direct', True))
+        self._endpoint = None
+        # Catalog lookups cached for the life of the command, keyed by database
+        self._pk_cache = {}
+        fcfg = config.get('fingerprint') or {}
+        self.max_workers = max(1, int(fcfg.get('workers', DEFAULT_WORKERS)))
+        # execution: session keeps psql/mysql processes open instead of one per query
+        self.sessions = None
+        if config.get('execution') == 'session':
+            self.sessions = SessionManager(self.open_session, self.max_workers)
+            atexit.register(self.sessions.close)
 
     @abstractmethod
     def get_base_cmd(self, db_name=None):
@@ -48,6 +72,16 @@ class DBEngine(ABC):
     def execute_query(self, db_name, query):
         """Execute a query and return the command string"""
         pass
+
+    @abstractmethod
+    def fetch_rows(self, db_name, query):
+        """Run a query and return its rows as tuples of strings"""
+        pass
+
+    @abstractmethod
+    def stream_query(self, db_name, query):
+        """Run a query and yield one text line per row, in bounded memory"""
+        pass
     
     # --- INSPECTOR (AST Generator) ---
     @abstractmethod
@@ -61,9 +95,75 @@ class DBEngine(ABC):
         pass
     
     @abstractmethod
-    def dump_table_data(self, db_name, table):
-        """Dump table data as INSERT statements"""
+    def dump_table_data(self, db_name, table, data_format="inserts", columns=None):
+        """Dump table data as INSERT statements, or as a bulk-load section (data_format="copy")"""
+        pass
+
+    @abstractmethod
+    def get_dump_table_data_cmd(self, db_name, table):
+        """Get the command that dumps table data (for streaming consumers)"""
         pass
+
+    def dump_tables_create(self, db_name, tables):
+        """CREATE TABLE statements of several tables as {table: sql}"""
+        return self._dump_tables(db_name, tables, self._dump_create_batch, self.dump_table_create)
+
+    def dump_tables_data(self, db_name, tables, data_format="inserts", columns=None):
+        """Data of several tables as {table: dump}; `columns` maps tables to their columns"""
+        columns = columns or {}
+        return self._dump_tables(
+            db_name, tables,
+            lambda db, batch: self._dump_data_batch(db, batch, data_format),
+            lambda db, t: self.dump_table_data(db, t, data_format=data_format, columns=columns.get(t)))
+
+    def spool_tables_data(self, db_name, tables, data_format="inserts", columns=None):
+        """Like dump_tables_data, but each dump is streamed to a temporary file ({table: file})"""
+        columns = columns or {}
+        return self._dump_tables(
+            db_name, tables,
+            lambda db, batch: self._spool_data_batch(db, batch, data_format),
+            lambda db, t: spool_lines(self.stream_table_data(db, t, data_format=data_format, columns=columns.get(t))))
+
+    def stream_table_data(self, db_name, table, data_format="inserts", columns=None):
+        """Yield the lines of dump_table_data"""
+        yield from (self.dump_table_data(db_name, table, data_format=data_format, columns=columns) or "").splitlines()
+
+    def _spool_data_batch(self, db_name, tables, data_format):
+        """Stream the data of several tables from one process into temporary files (None if unsupported)"""
+        return None
+
+    def _dump_create_batch(self, db_name, tables):
+        """Dump the CREATE statements of several tables in one process ({table: sql}, None if unsupported)"""
+        return None
+
+    def _dump_data_batch(self, db_name, tables, data_format):
+        """Dump the data of several tables in one process ({table: dump}, None if unsupported)"""
+        return None
+
+    def _dump_tables(self, db_name, tables, dump_batch, dump_one):
+        """Dump tables in batches of DUMP_BATCH_SIZE, batches running concurrently
+
+        Tables a batch could not produce (unsupported, failed, or not split
+        back cleanly) are dumped one by one, also concurrently.
+        """
+        tables = list(tables)
+        dumps = {}
+
+        def run_batch(batch):
+            try:
+                return dump_batch(db_name, batch) or {}
+            except DBLError:
+                return {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            if len(tables) > 1:
+                batches = [tables[i:i + DUMP_BATCH_SIZE] for i in range(0, len(tables), DUMP_BATCH_SIZE)]
+                for result in pool.map(run_batch, batches):
+                    dumps.update(result)
+            missing = [t for t in tables if t not in dumps]
+            for t, sql in zip(missing, pool.map(lambda t: dump_one(db_name, t), missing)):
+                dumps[t] = sql
+        return {t: dumps[t] for t in tables}
     
     # --- SQL GENERATORS (Dialect Specific) ---
     @abstractmethod
@@ -86,6 +186,150 @@ class DBEngine(ABC):
         """Get primary key columns for a table"""
         pass
 
+    def _fetch_all_primary_keys(self, db_name):
+        """Fetch the primary-key map of a whole schema (engines override with one catalog query)"""
+        return {t: self.get_primary_keys(db_name, t) for t in self.get_tables(db_name)}
+
+    def get_all_primary_keys(self, db_name):
+        """Get primary key columns for every table ({table: [cols]}), cached per command"""
+        if db_name not in self._pk_cache:
+            self._pk_cache[db_name] = self._fetch_all_primary_keys(db_name)
+        return self._pk_cache[db_name]
+
+    # --- DATA FINGERPRINTS ---
+    default_fingerprint_mode = "rows"
+
+    def get_fingerprint_query(self, table, columns=None, mode="server"):
+        """Get a query that computes a table data fingerprint server-side (None if unsupported)"""
+        return None
+
+    def get_chunk_fingerprint_query(self, table, pk_col, columns, chunk_size):
+        """Get a query returning (bucket, digest) rows per primary-key range chunk (None if unsupported)"""
+        return None
+
+    def dump_table_rows(self, db_name, table, where, columns=None):
+        """Dump the rows matching a WHERE clause as INSERT statements (None if unsupported)"""
+        return None
+
+    # --- ROW DIFFS ---
+    def get_row_diff_query(self, table, pk_cols, columns, where=None):
+        """Get a query returning one 'key<TAB>payload' line per row (None if unsupported)"""
+        return None
+
+    def parse_row_diff_line(self, line):
+        """Split a row diff line into (key, payload)"""
+        key, _, payload = line.partition("\t")
+        return key, payload
+
+    def qualified_table(self, table):
+        """Table name for statements written into layers, valid whatever the session's search path"""
+        return table
+
+    def get_generated_columns(self, db_name, table):
+        """Columns the server computes (generated columns), which INSERTs must leave out"""
+        return []
+
+    @abstractmethod
+    def get_row_delete_sql(self, table, pk_cols, key, payload):
+        """SQL deleting the row identified by a row diff key/payload"""
+        pass
+
+    @abstractmethod
+    def get_row_upsert_sql(self, table, pk_cols, columns, payload):
+        """SQL inserting a row diff payload, or updating the row if its key exists"""
+        pass
+
+    def get_change_counters(self, db_name):
+        """Get a cheap per-table change token ({table: token}); empty if unsupported"""
+        return {}
+
+    # Query client run on the host when the container is reachable directly
+    client_binary = None
+    # Whether DROP/CREATE TABLE can be rolled back with the rest of a transaction
+    transactional_ddl = True
+
+    def _direct_endpoint(self):
+        """(host, port) reaching the container without docker exec, resolved once (None if unavailable)"""
+        if not self.is_docker or not self.docker_direct:
+            return None
+        if self._endpoint is None:
+            self._endpoint = resolve_docker_endpoint(self.container, self.port, self.client_binary,
+                                                     self._direct_login) or False
+        return self._endpoint or None
+
+    def _direct_login(self, host, port):
+        """Whether the configured credentials log in at host:port through the host client"""
+        return False
+
+    def _client_target(self, interactive=False):
+        """(command prefix, host, port) for query clients: direct when possible, else docker exec"""
+        direct = self._direct_endpoint()
+        if direct:
+            return ("",) + tuple(direct)
+        return self._docker_prefix(interactive), self.host, self.port
+
+    def _docker_prefix(self, interactive=False):
+        return ""
+
+    def _in_container(self, pipeline):
+        """Wrap a shell pipeline so it runs entirely inside the container"""
+        # Double quotes work with both sh and cmd.exe; the pipelines never contain any
+        return f'docker exec {self.container} sh -c "{pipeline}"'
+
+    # --- LAYER APPLY ---
+    def get_apply_cmd(self, db_name):
+        """Client command that replays SQL read from stdin in a single session"""
+        return self.get_base_cmd(db_name)
+
+    @abstractmethod
+    def get_apply_marker_sql(self, token):
+        """Statement that prints `token` on stdout once everything sent before it has run"""
+        pass
+
+    def get_apply_settings_sql(self, fresh=False):
+        """Session settings that speed up replaying layers (`fresh`: the database was just created)"""
+        return []
+
+    def get_apply_reset_sql(self):
+        """Statements undoing session state a replayed file may have left behind"""
+        return []
+
+    @abstractmethod
+    def open_session(self, db_name):
+        """Start a long-lived client process for execution: session"""
+        pass
+
+    def release_db(self, db_name):
+        """Close pooled sessions/connections to a database (before dropping or cloning it)"""
+        if self.sessions:
+            self.sessions.close(db_name)
+
+    def close(self):
+        """Release open sessions and connections"""
+        if self.sessions:
+            self.sessions.close()
+
+    def get_db_size(self, db_name):
+        """Size of a database on disk in bytes (None if unknown)"""
+        return None
+
+    # Name the ledger is queried by; engines qualify it where files can change the search path
+    ledger_table = LEDGER_TABLE
+
+    @abstractmethod
+    def has_table(self, db_name, table):
+        """Whether a table exists, including the internal ones hidden from get_tables"""
+        pass
+
+    def replace_db(self, source_db, target_db):
+        """Make target_db hold what source_db holds, consuming source_db
+
+        Engines override this with a rename; this fallback copies the data.
+        """
+        self.drop_db(target_db)
+        self.clone_db(source_db, target_db)
+        self.drop_db(source_db)
+
     def backup_db(self, source_db, backup_db):
         """Backup a database by cloning it"""
         self.clone_db(source_db, backup_db)
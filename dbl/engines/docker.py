@@ -0,0 +1,72 @@
+"""Resolve a direct network route to a database running in a container"""
+
+import shutil
+import socket
+import subprocess
+
+# Seconds to wait for a TCP handshake when probing an endpoint
+CONNECT_TIMEOUT = 1.0
+# Seconds a trial login through the host client may take
+LOGIN_TIMEOUT = 10
+
+
+def _docker_output(args):
+    """Run a docker CLI command quietly; empty string on failure"""
+    try:
+        result = subprocess.run(["docker"] + args, capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return ""
+    return result.stdout.strip() if result.returncode == 0 else ""
+
+
+def _candidates(container, port):
+    # Published port first ("0.0.0.0:5433", "[::]:5433"), then the container IPs
+    for line in _docker_output(["port", container, f"{port}/tcp"]).splitlines():
+        host, _, host_port = line.strip().rpartition(":")
+        host = host.strip("[]")
+        if host in ("", "0.0.0.0", "::"):
+            host = "127.0.0.1"
+        if host_port.isdigit():
+            yield host, host_port
+    networks = _docker_output(["inspect", "-f", "{{range .NetworkSettings.Networks}}{{.IPAddress}} {{end}}", container])
+    for ip in networks.split():
+        yield ip, str(port)
+
+
+def _reachable(host, port):
+    try:
+        with socket.create_connection((host, int(port)), timeout=CONNECT_TIMEOUT):
+            return True
+    except (OSError, ValueError):
+        return False
+
+
+def logs_in(argv, env=None):
+    """True when a client command (a trial `SELECT 1`) exits cleanly"""
+    try:
+        result = subprocess.run(argv, capture_output=True, text=True, env=env,
+                                stdin=subprocess.DEVNULL, timeout=LOGIN_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    return result.returncode == 0
+
+
+def resolve_docker_endpoint(container, port, client=None, login=None):
+    """(host, port) that reaches the container's server from here, or None
+
+    Returns None when the client binary is not installed on the host, since
+    the query commands would then have to run inside the container anyway.
+    An open port is not enough: `login(host, port)` must also succeed, since
+    credentials that work inside the container (trust or peer auth) may be
+    refused over the network.
+    """
+    if client and not shutil.which(client):
+        return None
+    seen = set()
+    for endpoint in _candidates(container, port):
+        if endpoint in seen:
+            continue
+        seen.add(endpoint)
+        if _reachable(*endpoint) and (login is None or login(*endpoint)):
+            return endpoint
+    return None
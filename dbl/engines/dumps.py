@@ -0,0 +1,145 @@
+"""Split the output of a multi-table dump back into per-table dumps"""
+
+import io
+import tempfile
+
+
+def split_dump_lines(lines, tables, header_re, section_table, open_part, epilogue_re=None):
+    """Stream one pg_dump/mysqldump run over several tables into per-table parts
+
+    Sections start at lines matching `header_re`; `section_table(match, text)`
+    names the table a section belongs to (anything not in `tables` means the
+    same table as the previous section). The header alone is tried first so
+    that large data sections are written straight through; other sections are
+    buffered until they end. The lines before the first section (session
+    settings) and from the last `epilogue_re` match on (restored settings) are
+    repeated around every table, as in a single-table dump.
+
+    `open_part(table)` returns the writable file for a table. Returns
+    {table: part}, or None if a section can't be attributed to any table.
+    """
+    wanted = set(tables)
+    preamble = []
+    parts = {}
+    state = {"owner": None, "sink": preamble, "section": None}
+    # Lines held back: a bare "--" may open the next comment block, and
+    # anything after an epilogue match may turn out to be the epilogue
+    held = []
+    in_epilogue = False
+
+    def write(text_lines):
+        sink = state["sink"]
+        if isinstance(sink, list):
+            sink.extend(text_lines)
+        else:
+            for line in text_lines:
+                sink.write(line + "\n")
+
+    def route(table):
+        if table in wanted:
+            state["owner"] = table
+        elif state["owner"] is None:
+            return False
+        owner = state["owner"]
+        if owner not in parts:
+            parts[owner] = open_part(owner)
+            for line in preamble:
+                parts[owner].write(line + "\n")
+        state["sink"] = parts[owner]
+        return True
+
+    def close_section():
+        # A buffered section is attributed once its text is complete
+        if state["section"] is not None:
+            match, body = state["section"]
+            state["section"] = None
+            if not route(section_table(match, "\n".join(body))):
+                return False
+            write(body)
+        return True
+
+    for line in lines:
+        line = line.rstrip("\n")
+        match = header_re.match(line)
+        if match:
+            lead = [held.pop()] if held and held[-1].strip() == "--" else []
+            write(held)
+            held, in_epilogue = [], False
+            if not close_section():
+                return None
+            table = section_table(match, "")
+            if table in wanted:
+                route(table)
+                write(lead + [line])
+            else:
+                state["section"] = (match, lead + [line])
+                state["sink"] = state["section"][1]
+            continue
+        if epilogue_re is not None and epilogue_re.match(line):
+            write(held)
+            held, in_epilogue = [], True
+        if in_epilogue or line.strip() == "--":
+            held.append(line)
+        else:
+            write(held)
+            held = []
+            write([line])
+
+    if not close_section():
+        return None
+    epilogue = held if in_epilogue else []
+    if not in_epilogue:
+        write(held)
+    for part in parts.values():
+        for line in epilogue:
+            part.write(line + "\n")
+    return parts
+
+
+def split_dump(output, tables, header_re, section_table, epilogue_re=None):
+    """{table: dump} from the captured output of a multi-table dump (None if it can't be split)"""
+    parts = split_dump_lines(output.splitlines(), tables, header_re, section_table,
+                             lambda t: io.StringIO(), epilogue_re)
+    if parts is None:
+        return None
+    return {t: part.getvalue() for t, part in parts.items()}
+
+
+def _temp_part():
+    return tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+
+
+def spool_lines(lines):
+    """Write dump lines to a temporary file and rewind it"""
+    part = _temp_part()
+    try:
+        for line in lines:
+            part.write(line.rstrip("\n") + "\n")
+    except BaseException:
+        part.close()
+        raise
+    part.seek(0)
+    return part
+
+
+def spool_dump(lines, tables, header_re, section_table, epilogue_re=None):
+    """Like split_dump, streaming each table's dump into a rewound temporary file"""
+    opened = []
+
+    def open_part(table):
+        opened.append(_temp_part())
+        return opened[-1]
+
+    try:
+        parts = split_dump_lines(lines, tables, header_re, section_table, open_part, epilogue_re)
+    except BaseException:
+        for part in opened:
+            part.close()
+        raise
+    if parts is None:
+        for part in opened:
+            part.close()
+        return None
+    for part in parts.values():
+        part.seek(0)
+    return parts
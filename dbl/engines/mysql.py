@@ -1,27 +1,178 @@
 """MySQL engine implementation"""
 
+import os
+import re
+import tempfile
+import time
 from .base import DBEngine
-from ..utils import run_command
+from .docker import logs_in
+from .session import CLISession
+from .dumps import split_dump, spool_dump
+from ..utils import run_command, stream_command, log
+from ..errors import DBLError
+from ..constants import LEDGER_TABLE
+
+
+# mysql --batch escapes backslash, tab, newline and NUL inside values
+_BATCH_ESCAPE = re.compile(r"\\(.)")
+_BATCH_UNESCAPES = {"\\": "\\", "t": "\t", "n": "\n", "0": "\0"}
+
+
+def _batch_unescape(text):
+    return _BATCH_ESCAPE.sub(lambda m: _BATCH_UNESCAPES.get(m.group(1), m.group(0)), text)
+
+
+def quote_ident(name):
+    """Backtick-quote an identifier, so reserved words (order, key, group...) work as names"""
+    return "`" + name.replace("`", "``") + "`"
+
+
+def _ident_list(names):
+    return ", ".join(quote_ident(n) for n in names)
+
+
+def _shell_sql(query):
+    """A query ready for mysql -e "..." (POSIX shells run backticks inside double quotes)"""
+    return query if os.name == "nt" else query.replace("`", "\\`")
+
+
+# mysqldump section headers and the settings restored at the end of a dump
+_DUMP_HEADER = re.compile(r"^-- (?:Table structure|Dumping data) for table `(.+?)`")
+_DUMP_EPILOGUE = re.compile(r"^/\*!40103 SET TIME_ZONE=@OLD_TIME_ZONE \*/;")
+
+# Markers around bulk data sections of MySQL layers (rows in LOAD DATA format)
+COPY_BEGIN = "-- dbl:copy-begin "
+COPY_END = "-- dbl:copy-end"
+INSERT_BATCH_ROWS = 500
+
+_DATA_DUMP_OPTIONS = "--no-create-info --complete-insert --skip-extended-insert"
+
+_COPY_UNESCAPES = {"t": "\t", "n": "\n", "0": "\0"}
+
+
+def copy_row_to_values(line):
+    """Turn a COPY block row into a '(v1, v2, ...)' VALUES tuple"""
+    values = []
+    for field in line.rstrip("\n").split("\t"):
+        if field == "\\N":
+            values.append("NULL")
+            continue
+        text = _BATCH_ESCAPE.sub(lambda m: _COPY_UNESCAPES.get(m.group(1), m.group(1)), field)
+        values.append("'" + text.replace("\\", "\\\\").replace("'", "\\'") + "'")
+    return "(" + ", ".join(values) + ")"
 
 
 class MySQLEngine(DBEngine):
     """MySQL database engine implementation"""
     
-    def _docker_prefix(self):
+    client_binary = "mysql"
+    # DDL commits implicitly, so a failed table copy can't be rolled back
+    transactional_ddl = False
+
+    def _docker_prefix(self, interactive=True):
         return f"docker exec -i {self.container} " if self.is_docker else ""
     
+    def _direct_login(self, host, port):
+        # MYSQL_PWD instead of -p: an empty password must not prompt
+        env = dict(os.environ, MYSQL_PWD=self.password)
+        return logs_in(["mysql", f"-h{host}", f"-P{port}", f"-u{self.user}", "--connect-timeout=5",
+                        "-e", "SELECT 1"], env)
+
     def get_base_cmd(self, db_name=None):
         target = db_name if db_name else ""
-        return f"{self._docker_prefix()}mysql -h{self.host} -P{self.port} -u{self.user} -p{self.password} {target}"
+        prefix, host, port = self._client_target()
+        return f"{prefix}mysql -h{host} -P{port} -u{self.user} -p{self.password} {target}"
     
     def get_admin_db_name(self): 
         return ""
+
+    def get_db_size(self, db_name):
+        query = f"SELECT COALESCE(SUM(DATA_LENGTH + INDEX_LENGTH), 0) FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = '{db_name}';"
+        rows = self.fetch_rows(self.get_admin_db_name(), query)
+        return int(rows[0][0]) if rows and rows[0][0].strip().isdigit() else None
+
+    def has_table(self, db_name, table):
+        query = f"SELECT 1 FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = '{db_name}' AND TABLE_NAME = '{table}';"
+        return bool(self.fetch_rows(self.get_admin_db_name(), query))
+
+    def get_apply_cmd(self, db_name):
+        return f"{self.get_base_cmd(db_name)} -N -B"
+
+    def get_apply_marker_sql(self, token):
+        return f"SELECT '{token}';"
+
+    def get_apply_settings_sql(self, fresh=False):
+        # Skipping the checks is only safe when the database is rebuilt from known-good layers
+        if not fresh:
+            return []
+        return ["SET unique_checks = 0;", "SET foreign_key_checks = 0;"]
+
+    def copy_rows_to_inserts(self, table, columns, rows):
+        """Batched INSERT statements for a file of COPY block rows"""
+        batch = []
+        for line in rows:
+            batch.append(copy_row_to_values(line))
+            if len(batch) >= INSERT_BATCH_ROWS:
+                yield f"INSERT INTO {quote_ident(table)} ({_ident_list(columns)}) VALUES {', '.join(batch)};\n"
+                batch = []
+        if batch:
+            yield f"INSERT INTO {quote_ident(table)} ({_ident_list(columns)}) VALUES {', '.join(batch)};\n"
     
     def drop_db(self, db_name):
+        self._pk_cache.pop(db_name, None)
+        self.release_db(db_name)
         run_command(f'{self.get_base_cmd()} -e "DROP DATABASE IF EXISTS {db_name};"')
     
     def create_db(self, db_name):
         run_command(f'{self.get_base_cmd()} -e "CREATE DATABASE {db_name};"')
+
+    def replace_db(self, source, target):
+        """Move every table of source into target with one atomic RENAME TABLE
+
+        Views and triggers can't move between databases, so those fall back
+        to a copy. The old target tables end up in a scratch database that is
+        dropped afterwards.
+        """
+        dbs = f"'{source}', '{target}'"
+        admin = self.get_admin_db_name()
+        query = (
+            f"SELECT (SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA IN ({dbs}) AND TABLE_TYPE <> 'BASE TABLE') "
+            f"+ (SELECT COUNT(*) FROM INFORMATION_SCHEMA.TRIGGERS WHERE TRIGGER_SCHEMA IN ({dbs}));"
+        )
+        rows = self.fetch_rows(admin, query)
+        if not rows or rows[0][0].strip() != "0":
+            log("Views or triggers present, copying the database instead of renaming...", "warn")
+            return super().replace_db(source, target)
+
+        tables = {}
+        query = f"SELECT TABLE_SCHEMA, TABLE_NAME FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA IN ({dbs});"
+        for row in self.fetch_rows(admin, query):
+            if len(row) == 2:
+                tables.setdefault(row[0], []).append(row[1])
+        trash = f"{target}_dbl_old_{int(time.time())}"
+        pairs = [f"{target}.{t} TO {trash}.{t}" for t in tables.get(target, [])]
+        pairs += [f"{source}.{t} TO {target}.{t}" for t in tables.get(source, [])]
+
+        for db in (source, target):
+            self._pk_cache.pop(db, None)
+            self.release_db(db)
+        # RENAME TABLE waits for metadata locks held by other clients, so end their sessions first
+        query = f"SELECT ID FROM INFORMATION_SCHEMA.PROCESSLIST WHERE DB IN ({dbs}) AND ID <> CONNECTION_ID();"
+        for row in self.fetch_rows(admin, query):
+            try:
+                run_command(f'{self.get_base_cmd()} -e "KILL {row[0].strip()};"')
+            except DBLError:
+                pass  # Already gone
+        self.create_db(trash)
+        try:
+            if pairs:
+                run_command(f'{self.get_base_cmd()} -e "RENAME TABLE {", ".join(pairs)};"')
+        except DBLError:
+            # Nothing moved: RENAME TABLE is all or nothing
+            self.drop_db(trash)
+            raise
+        self.drop_db(source)
+        self.drop_db(trash)
     
     def clone_db(self, source, target):
         from ..utils import log
@@ -29,7 +180,11 @@ class MySQLEngine(DBEngine):
         self.create_db(target)
         dump = f"mysqldump -h{self.host} -P{self.port} -u{self.user} -p{self.password} {source}"
         if self.is_docker: 
-            dump = f"docker exec {self.container} {dump}"
+            # Dump and load inside the container: the data never crosses docker exec
+            load = f"mysql -h{self.host} -P{self.port} -u{self.user} -p{self.password} {target}"
+            pipeline = self._in_container(f"{dump} | {load}")
+        else:
+            pipeline = f"{dump} | {self.get_base_cmd(target)}"
         
         import subprocess, threading, sys
         # Show spinner while cloning
@@ -48,29 +203,45 @@ class MySQLEngine(DBEngine):
         t = threading.Thread(target=spinner)
         t.start()
         try:
-            run_command(f"{dump} | {self.get_base_cmd(target)}")
+            run_command(pipeline)
         finally:
             stop_spinner = True
             t.join()
 
     def get_tables(self, db_name):
-        cmd = f'{self.get_base_cmd(db_name)} -N -e "SHOW TABLES;"'
-        out = run_command(cmd, capture=True)
-        return [line.strip() for line in out.splitlines() if line.strip()]
+        tables = [row[0].strip() for row in self.fetch_rows(db_name, "SHOW TABLES;")]
+        return [t for t in tables if t and t != LEDGER_TABLE]
     
     def execute_query(self, db_name, query):
         """Execute a query and return command string for MySQL"""
-        return f'{self.get_base_cmd(db_name)} -N -B -e "{query}"'
+        return f'{self.get_base_cmd(db_name)} -N -B -e "{_shell_sql(query)}"'
+
+    def fetch_rows(self, db_name, query):
+        """Run a query through the mysql client and return its rows as tuples of strings"""
+        if self.sessions:
+            lines = self.sessions.run(db_name, query)
+        else:
+            lines = run_command(self.execute_query(db_name, query), capture=True).splitlines()
+        return [tuple(line.split("\t")) for line in lines if line.strip()]
+
+    def stream_query(self, db_name, query):
+        """Run a query through the mysql client and yield its output lines in bounded memory"""
+        if self.sessions:
+            return self.sessions.stream(db_name, query)
+        return stream_command(self.execute_query(db_name, query))
+
+    def open_session(self, db_name):
+        # --force keeps the client alive after a failed statement
+        cmd = f"{self.get_base_cmd(db_name)} -N -B --unbuffered --force"
+        return CLISession(cmd, lambda token: f"SELECT '{token}';")
 
     def inspect_db(self, db_name):
-        query = f"SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE, IS_NULLABLE, COLUMN_DEFAULT, CHARACTER_MAXIMUM_LENGTH, NUMERIC_PRECISION, NUMERIC_SCALE FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_SCHEMA = '{db_name}' ORDER BY TABLE_NAME, ORDINAL_POSITION;"
-        cmd = f'{self.get_base_cmd(db_name)} -N -B -e "{query}"'
-        out = run_command(cmd, capture=True)
+        query = f"SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE, IS_NULLABLE, COLUMN_DEFAULT, CHARACTER_MAXIMUM_LENGTH, NUMERIC_PRECISION, NUMERIC_SCALE FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_SCHEMA = '{db_name}' AND TABLE_NAME <> '{LEDGER_TABLE}' ORDER BY TABLE_NAME, ORDINAL_POSITION;"
+        rows = self.fetch_rows(db_name, query)
         schema = {}
-        if not out: return schema
+        if not rows: return schema
         
-        for line in out.splitlines():
-            parts = line.split("\t")
+        for parts in rows:
             if len(parts) < 8: continue
             
             t_name, c_name, dtype, nullable = parts[0], parts[1], parts[2], parts[3]
@@ -92,26 +263,191 @@ class MySQLEngine(DBEngine):
             }
         return schema
 
-    def dump_table_create(self, db_name, table):
-        dump = f"mysqldump -h{self.host} -P{self.port} -u{self.user} -p{self.password} --no-data {db_name} {table}"
+    def _mysqldump_cmd(self, db_name, tables, options):
+        dump = f"mysqldump -h{self.host} -P{self.port} -u{self.user} -p{self.password} {options} {db_name} {' '.join(tables)}"
         if self.is_docker: 
             dump = f"docker exec {self.container} {dump}"
-        sql = run_command(dump, capture=True)
+        return dump
+
+    def _split_dump(self, output, tables):
+        return split_dump(output or "", tables, _DUMP_HEADER, lambda m, text: m.group(1), _DUMP_EPILOGUE)
+
+    def dump_table_create(self, db_name, table):
+        sql = run_command(self._mysqldump_cmd(db_name, [table], "--no-data"), capture=True)
         if sql:
             sql = sql.replace("CREATE TABLE ", "CREATE TABLE IF NOT EXISTS ", 1)
         return sql
 
-    def dump_table_data(self, db_name, table):
-        dump = f"mysqldump -h{self.host} -P{self.port} -u{self.user} -p{self.password} --no-create-info --complete-insert --skip-extended-insert {db_name} {table}"
-        if self.is_docker: 
-            dump = f"docker exec {self.container} {dump}"
-        return run_command(dump, capture=True)
+    def _dump_create_batch(self, db_name, tables):
+        parts = self._split_dump(run_command(self._mysqldump_cmd(db_name, tables, "--no-data"), capture=True), tables)
+        if parts is None:
+            return None
+        return {t: sql.replace("CREATE TABLE ", "CREATE TABLE IF NOT EXISTS ", 1) for t, sql in parts.items()}
+
+    def get_dump_table_data_cmd(self, db_name, table):
+        return self._mysqldump_cmd(db_name, [table], _DATA_DUMP_OPTIONS)
+
+    def _dump_data_batch(self, db_name, tables, data_format):
+        if data_format == "copy":
+            # COPY sections come from SELECTs, one per table
+            return None
+        return self._split_dump(run_command(self._mysqldump_cmd(db_name, tables, _DATA_DUMP_OPTIONS), capture=True), tables)
+
+    def stream_table_data(self, db_name, table, data_format="inserts", columns=None):
+        if data_format == "copy":
+            return self._iter_table_copy(db_name, table, columns)
+        return stream_command(self.get_dump_table_data_cmd(db_name, table))
+
+    def _spool_data_batch(self, db_name, tables, data_format):
+        if data_format == "copy":
+            return None
+        lines = stream_command(self._mysqldump_cmd(db_name, tables, _DATA_DUMP_OPTIONS))
+        return spool_dump(lines, tables, _DUMP_HEADER, lambda m, text: m.group(1), _DUMP_EPILOGUE)
+
+    def dump_table_data(self, db_name, table, data_format="inserts", columns=None):
+        if data_format == "copy":
+            return self.dump_table_copy(db_name, table, columns)
+        return run_command(self.get_dump_table_data_cmd(db_name, table), capture=True)
+
+    def dump_table_copy(self, db_name, table, columns=None):
+        """Dump a table as a COPY_BEGIN/COPY_END block of LOAD DATA-compatible TSV rows"""
+        return "\n".join(self._iter_table_copy(db_name, table, columns))
+
+    def _iter_table_copy(self, db_name, table, columns=None):
+        if not columns:
+            query = f"SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_SCHEMA = '{db_name}' AND TABLE_NAME = '{table}' ORDER BY ORDINAL_POSITION;"
+            columns = [row[0] for row in self.fetch_rows(db_name, query)]
+        # Escape server-side (\\, \t, \n, \N for NULL); CHAR() keeps backslashes out of the shell
+        bs = "CHAR(92 USING utf8mb4)"
+        fields = ", ".join(
+            f"IFNULL(REPLACE(REPLACE(REPLACE({quote_ident(c)}, {bs}, CONCAT({bs}, {bs})), CHAR(9), CONCAT({bs}, 't')), "
+            f"CHAR(10), CONCAT({bs}, 'n')), CONCAT({bs}, 'N'))"
+            for c in columns
+        )
+        query = f"SELECT CONCAT_WS(CHAR(9), {fields}) FROM {quote_ident(table)};"
+        yield f"{COPY_BEGIN}{table} ({', '.join(columns)})"
+        yield from stream_command(f'{self.get_base_cmd(db_name)} -N -B -r -e "{_shell_sql(query)}"')
+        yield COPY_END
+
+    def bulk_load(self, db_name, table, columns, rows):
+        """Load a file of COPY block rows with LOAD DATA LOCAL INFILE, falling back to INSERTs"""
+        load = (
+            f"LOAD DATA LOCAL INFILE '/dev/stdin' INTO TABLE {quote_ident(table)} "
+            f"FIELDS TERMINATED BY X'09' ESCAPED BY X'5C' LINES TERMINATED BY X'0A' ({_ident_list(columns)})"
+        )
+        try:
+            run_command(f'{self.get_base_cmd(db_name)} --local-infile=1 -e "{_shell_sql(load)}"', capture=True, stdin=rows)
+            return
+        except DBLError:
+            log(f"   LOAD DATA not available for {table}, loading with INSERTs", "warn")
+        rows.seek(0)
+        with tempfile.TemporaryFile(mode="w+", encoding="utf-8") as sql:
+            sql.writelines(self.copy_rows_to_inserts(table, columns, rows))
+            sql.seek(0)
+            run_command(self.get_base_cmd(db_name), stdin=sql)
 
     def get_primary_keys(self, db_name, table):
         query = f"SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE WHERE TABLE_SCHEMA = '{db_name}' AND TABLE_NAME = '{table}' AND CONSTRAINT_NAME = 'PRIMARY' ORDER BY ORDINAL_POSITION;"
-        cmd = f'{self.get_base_cmd(db_name)} -N -B -e "{query}"'
-        out = run_command(cmd, capture=True)
-        return [line.strip() for line in out.splitlines() if line.strip()]
+        return [row[0].strip() for row in self.fetch_rows(db_name, query) if row[0].strip()]
+
+    default_fingerprint_mode = "server"
+
+    def get_fingerprint_query(self, table, columns=None, mode="server"):
+        """CHECKSUM TABLE, or an order-independent BIT_XOR/SUM aggregate over per-row MD5s"""
+        if mode == "checksum":
+            return f"CHECKSUM TABLE {quote_ident(table)};"
+        if not columns:
+            return None
+        return f"SELECT {self._DIGEST_AGG} FROM (SELECT {self._row_md5(columns)} AS h FROM {quote_ident(table)}) s;"
+
+    # Order-independent aggregate over per-row MD5s "h"
+    _DIGEST_AGG = (
+        "CONCAT(COUNT(*), ':', "
+        "COALESCE(SUM(CAST(CONV(SUBSTRING(h, 1, 16), 16, 10) AS UNSIGNED)), 0), ':', "
+        "COALESCE(BIT_XOR(CAST(CONV(SUBSTRING(h, 17, 16), 16, 10) AS UNSIGNED)), 0))"
+    )
+
+    def _row_md5(self, columns):
+        # QUOTE() escapes separators inside values and spells NULL unquoted,
+        # so ('a,b', 'c') and ('a', 'b,c') or NULL and '' can't collide
+        return f"MD5(CONCAT_WS(',', {', '.join(f'QUOTE({quote_ident(c)})' for c in columns)}))"
+
+    def get_chunk_fingerprint_query(self, table, pk_col, columns, chunk_size):
+        return (
+            f"SELECT b, {self._DIGEST_AGG} "
+            f"FROM (SELECT FLOOR({quote_ident(pk_col)} / {int(chunk_size)}) AS b, {self._row_md5(columns)} AS h "
+            f"FROM {quote_ident(table)}) s "
+            "GROUP BY b;"
+        )
+
+    def get_row_diff_query(self, table, pk_cols, columns, where=None):
+        """Key and payload as QUOTE()d SQL literal lists, ready to paste into statements"""
+        if not columns:
+            return None
+        key = ", ".join(f"QUOTE({quote_ident(c)})" for c in pk_cols)
+        values = ", ".join(f"QUOTE({quote_ident(c)})" for c in columns)
+        cond = f" WHERE {where}" if where else ""
+        return f"SELECT CONCAT_WS(', ', {key}), CONCAT_WS(', ', {values}) FROM {quote_ident(table)}{cond};"
+
+    def parse_row_diff_line(self, line):
+        # Only the separator is a raw tab; tabs inside values arrive escaped
+        key, _, payload = line.partition("\t")
+        return _batch_unescape(key), _batch_unescape(payload)
+
+    def get_row_delete_sql(self, table, pk_cols, key, payload):
+        return f"DELETE FROM {quote_ident(table)} WHERE ({_ident_list(pk_cols)}) = ({key});"
+
+    def get_row_upsert_sql(self, table, pk_cols, columns, payload):
+        updates = [quote_ident(c) for c in columns if c not in pk_cols]
+        insert = f"INSERT INTO {quote_ident(table)} ({_ident_list(columns)}) VALUES ({payload})"
+        if not updates:
+            return f"INSERT IGNORE INTO {quote_ident(table)} ({_ident_list(columns)}) VALUES ({payload});"
+        return f"{insert} ON DUPLICATE KEY UPDATE " + ", ".join(f"{c} = VALUES({c})" for c in updates) + ";"
+
+    def get_generated_columns(self, db_name, table):
+        query = (f"SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_SCHEMA = '{db_name}' "
+                 f"AND TABLE_NAME = '{table}' AND EXTRA IN ('VIRTUAL GENERATED', 'STORED GENERATED');")
+        return [row[0] for row in self.fetch_rows(db_name, query) if row and row[0]]
+
+    def dump_table_rows(self, db_name, table, where, columns=None):
+        """INSERTs built server-side with QUOTE(); --raw keeps the quoting intact"""
+        if not columns:
+            return None
+        generated = set(self.get_generated_columns(db_name, table))
+        columns = [c for c in columns if c not in generated]
+        values = ", ".join(f"QUOTE({quote_ident(c)})" for c in columns)
+        query = (
+            f"SELECT CONCAT('INSERT INTO {quote_ident(table)} ({_ident_list(columns)}) VALUES (', "
+            f"CONCAT_WS(', ', {values}), ');') FROM {quote_ident(table)} WHERE {where};"
+        )
+        return run_command(f'{self.get_base_cmd(db_name)} -N -B -r -e "{_shell_sql(query)}"', capture=True)
+
+    def get_change_counters(self, db_name):
+        """Tokens from information_schema.TABLES (tables touched in the last seconds are skipped)"""
+        # UPDATE_TIME has one-second resolution, so a very recent write can't be trusted yet
+        query = (
+            "SELECT TABLE_NAME, CONCAT_WS('/', CREATE_TIME, UPDATE_TIME, CHECKSUM) "
+            f"FROM information_schema.TABLES WHERE TABLE_SCHEMA = '{db_name}' "
+            "AND UPDATE_TIME IS NOT NULL AND UPDATE_TIME < NOW() - INTERVAL 2 SECOND;"
+        )
+        try:
+            rows = self.fetch_rows(db_name, self._fresh_stats_query(query))
+        except DBLError:
+            rows = self.fetch_rows(db_name, query)
+        return {row[0]: row[1] for row in rows if len(row) == 2 and row[1]}
+
+    def _fresh_stats_query(self, query):
+        # MySQL 8 caches these columns for a day unless the expiry is disabled;
+        # the versioned comment turns the SET into a no-op on 5.7
+        return f"SET @dbl_noop = 0 /*!80003 , SESSION information_schema_stats_expiry = 0 */; {query}"
+
+    def _fetch_all_primary_keys(self, db_name):
+        query = f"SELECT TABLE_NAME, COLUMN_NAME FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE WHERE TABLE_SCHEMA = '{db_name}' AND CONSTRAINT_NAME = 'PRIMARY' ORDER BY TABLE_NAME, ORDINAL_POSITION;"
+        pk_map = {}
+        for row in self.fetch_rows(db_name, query):
+            if len(row) == 2:
+                pk_map.setdefault(row[0], []).append(row[1])
+        return pk_map
 
     def get_alter_column_type_sql(self, table, col, new_type):
         return f"ALTER TABLE {table} MODIFY COLUMN {col} {new_type};"
@@ -0,0 +1,79 @@
+"""MySQL engine backed by PyMySQL or mysqlclient (optional dependency)"""
+
+from .mysql import MySQLEngine
+from .pool import PooledDriverMixin
+
+try:
+    import pymysql as mysql_driver
+    import pymysql.cursors as mysql_cursors
+except ImportError:  # pragma: no cover - depends on the environment
+    try:
+        import MySQLdb as mysql_driver
+        import MySQLdb.cursors as mysql_cursors
+    except ImportError:
+        mysql_driver = None
+
+# mysql --batch escapes these so each row stays on one line
+_BATCH_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\0": "\\0"})
+
+
+class MySQLDriverEngine(PooledDriverMixin, MySQLEngine):
+    """MySQL engine that runs queries over pooled PyMySQL/mysqlclient connections
+
+    Dumps, restores and DDL still go through the CLI tools; only the query
+    primitives (fetch_rows/stream_query) use the driver.
+    """
+
+    available = mysql_driver is not None
+    driver_error = mysql_driver.Error if mysql_driver else ()
+    row_separator = "\t"
+
+    def __init__(self, config):
+        super().__init__(config)
+        self._init_pools()
+
+    def _connect(self, db_name):
+        host, port = self._direct_endpoint() or (self.host, self.port)
+        kwargs = {"host": host, "port": int(port), "user": self.user,
+                  "charset": "utf8mb4", "autocommit": True, "conv": {}}
+        # No converters: values come back as the text the server sent
+        if mysql_driver.__name__ == "pymysql":
+            kwargs.update(password=self.password, database=db_name or None)
+        else:
+            kwargs.update(passwd=self.password)
+            if db_name:
+                kwargs["db"] = db_name
+        conn = mysql_driver.connect(**kwargs)
+        cur = conn.cursor()
+        try:
+            # MySQL 8 caches information_schema.TABLES stats; 5.7 has no such variable
+            cur.execute("SET SESSION information_schema_stats_expiry = 0")
+        except Exception:
+            pass
+        finally:
+            cur.close()
+        return conn
+
+    def _fresh_stats_query(self, query):
+        # Stats expiry is already disabled for every pooled session
+        return query
+
+    def _iter_rows(self, conn, query):
+        # Unbuffered cursor: rows are read from the socket as they are consumed
+        cur = conn.cursor(mysql_cursors.SSCursor)
+        try:
+            cur.execute(query)
+            while True:
+                rows = cur.fetchmany(1000)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cur.close()
+
+    def _format_value(self, value):
+        if value is None:
+            return "NULL"
+        if isinstance(value, (bytes, bytearray)):
+            value = bytes(value).decode("utf-8", "replace")
+        return str(value).translate(_BATCH_ESCAPES)
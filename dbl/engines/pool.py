@@ -0,0 +1,143 @@
+"""Thread-safe connection pooling for driver-backed engines"""
+
+import atexit
+import threading
+from contextlib import contextmanager
+from ..errors import DBLError
+
+
+class ConnectionPool:
+    """Fixed-size pool of open connections to one database"""
+
+    def __init__(self, connect, max_size):
+        self._connect = connect
+        self.max_size = max(1, int(max_size))
+        self._idle = []
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Take an idle connection, open a new one, or wait until one is released"""
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("connection pool is closed")
+                if self._idle:
+                    return self._idle.pop()
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                self._cond.wait()
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool (discarded ones are closed)"""
+        with self._cond:
+            if discard or self._closed:
+                self._size -= 1
+                _close_quietly(conn)
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; it is discarded if the block raises"""
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            self.release(conn, discard=True)
+            raise
+        self.release(conn)
+
+    def close(self):
+        """Close idle connections; borrowed ones are closed when released"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            _close_quietly(conn)
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+class PooledDriverMixin:
+    """Query primitives over a DB-API driver, one pool per database
+
+    Subclasses implement _connect(db_name), _iter_rows(conn, query) and
+    _format_value(value), which renders a value the way the CLI client prints it.
+    `driver_error` is the driver's base exception; it is raised as DBLError,
+    like a failed CLI command.
+    """
+
+    driver_error = ()
+
+    def _init_pools(self):
+        self._pools = {}
+        self._pools_lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _pool(self, db_name):
+        with self._pools_lock:
+            pool = self._pools.get(db_name)
+            if pool is None:
+                pool = ConnectionPool(lambda: self._connect(db_name), self.max_workers)
+                self._pools[db_name] = pool
+            return pool
+
+    def close_pool(self, db_name):
+        """Close the pooled connections to one database"""
+        with self._pools_lock:
+            pool = self._pools.pop(db_name, None)
+        if pool:
+            pool.close()
+
+    def release_db(self, db_name):
+        super().release_db(db_name)
+        self.close_pool(db_name)
+
+    def close(self):
+        super().close()
+        with self._pools_lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            pool.close()
+
+    def _query_error(self, query, e):
+        return DBLError(f"Failed driver query.\n   Query: {query[:200]}\n   Err: {e}")
+
+    def fetch_rows(self, db_name, query):
+        try:
+            with self._pool(db_name).connection() as conn:
+                cur = conn.cursor()
+                try:
+                    cur.execute(query)
+                    rows = cur.fetchall() if cur.description else []
+                finally:
+                    cur.close()
+        except self.driver_error as e:
+            raise self._query_error(query, e) from e
+        return [tuple(self._format_value(v) for v in row) for row in rows]
+
+    def stream_query(self, db_name, query):
+        try:
+            with self._pool(db_name).connection() as conn:
+                for row in self._iter_rows(conn, query):
+                    yield self.row_separator.join(self._format_value(v) for v in row)
+        except self.driver_error as e:
+            raise self._query_error(query, e) from e
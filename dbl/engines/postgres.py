@@ -1,31 +1,113 @@
 """PostgreSQL engine implementation"""
 
 import os
+import re
+import time
 from .base import DBEngine
-from ..utils import run_command, log
+from .docker import logs_in
+from .session import CLISession
+from .dumps import split_dump, spool_dump
+from ..utils import run_command, stream_command, log
+from ..constants import LEDGER_TABLE
+from ..errors import DBLError
+
+
+# Tries at swapping databases by rename; a client may reconnect right after its session is terminated
+RENAME_ATTEMPTS = 5
+# application_name of DBL's own connections, which don't count as recent writers
+APP_NAME = "dbl"
+# Backends publish their table counters up to ~10s after going idle (PG15+)
+STATS_FLUSH_SECONDS = 11
+
+# pg_dump comment headers: "-- Name: users users_pkey; Type: CONSTRAINT; Schema: public; ..."
+_DUMP_HEADER = re.compile(r"^-- (?:Data for )?Name: (.+?); Type: (.+?); Schema: ")
+# Statements that name their table: CREATE INDEX ... ON t, ALTER SEQUENCE ... OWNED BY t.c, ALTER TABLE t
+_DUMP_TABLE_REF = re.compile(r"\b(?:ON|OWNED BY|ALTER TABLE(?: ONLY)?)\s+(?:public\.)?(\w+)")
+
+
+def _dump_section_table(tables):
+    """Map a pg_dump section to the table it belongs to"""
+    by_length = sorted(tables, key=len, reverse=True)
+
+    def section_table(match, text):
+        name, kind = match.group(1), match.group(2)
+        if kind == "COMMENT":
+            # "COLUMN users.email" / "TABLE users"
+            name = name.split(" ", 1)[-1].split(".")[0]
+        first = name.split(" ")[0]
+        if first in tables:
+            return first
+        for ref in _DUMP_TABLE_REF.findall(text):
+            if ref in tables:
+                return ref
+        # Sequences and indexes are usually named after their table (users_id_seq)
+        return next((t for t in by_length if first.startswith(t + "_")), None)
+    return section_table
 
 
 class PostgresEngine(DBEngine):
     """PostgreSQL database engine implementation"""
     
-    def _docker_prefix(self):
-        return f"docker exec {self.container} " if self.is_docker else ""
+    def _docker_prefix(self, interactive=False):
+        if not self.is_docker:
+            return ""
+        return f"docker exec -i {self.container} " if interactive else f"docker exec {self.container} "
     
+    client_binary = "psql"
+    # pg_dump output empties search_path, so the ledger is always addressed by its schema
+    ledger_table = f"public.{LEDGER_TABLE}"
+
     def _auth_env(self):
         env = os.environ.copy()
-        if not self.is_docker: 
+        env['PGAPPNAME'] = APP_NAME
+        if not self.is_docker or self._direct_endpoint(): 
             env['PGPASSWORD'] = self.password
         return env
+
+    def _direct_login(self, host, port):
+        env = dict(os.environ, PGAPPNAME=APP_NAME, PGPASSWORD=self.password, PGCONNECT_TIMEOUT="5")
+        # -w: a missing password fails the probe instead of prompting
+        return logs_in(["psql", "-h", host, "-p", str(port), "-U", self.user, "-d", self.get_admin_db_name(),
+                        "-w", "-tAc", "SELECT 1"], env)
     
     def get_base_cmd(self, db_name=None):
         target = db_name if db_name else "postgres"
-        cmd = f"psql -h {self.host} -p {self.port} -U {self.user} -d {target} -v ON_ERROR_STOP=1"
-        return self._docker_prefix() + cmd
+        # -i so that scripts piped into the command reach psql inside the container
+        prefix, host, port = self._client_target(interactive=True)
+        return f"{prefix}psql -h {host} -p {port} -U {self.user} -d {target} -v ON_ERROR_STOP=1"
     
     def get_admin_db_name(self): 
         return "postgres"
 
+    def get_db_size(self, db_name):
+        rows = self.fetch_rows(self.get_admin_db_name(), f"SELECT pg_database_size('{db_name}');")
+        return int(rows[0][0]) if rows and rows[0][0].strip().isdigit() else None
+
+    def has_table(self, db_name, table):
+        # Asking the admin DB first keeps a missing database from failing loudly
+        if not self.fetch_rows(self.get_admin_db_name(), f"SELECT 1 FROM pg_database WHERE datname = '{db_name}';"):
+            return False
+        query = f"SELECT 1 FROM pg_tables WHERE schemaname = 'public' AND tablename = '{table}';"
+        return bool(self.fetch_rows(db_name, query))
+
+    def get_apply_cmd(self, db_name):
+        return f"{self.get_base_cmd(db_name)} -q"
+
+    def get_apply_marker_sql(self, token):
+        # Meta-commands run in order with the statements before them
+        return f"\\echo {token}"
+
+    def get_apply_settings_sql(self, fresh=False):
+        # Commits don't wait for the WAL flush; a crash can only lose the last commits
+        return ["SET synchronous_commit = off;"]
+
+    def get_apply_reset_sql(self):
+        # pg_dump output empties search_path, which would break unqualified names in later files
+        return ["RESET ALL;"]
+
     def drop_db(self, db_name):
+        self._pk_cache.pop(db_name, None)
+        self.release_db(db_name)
         kill = f"SELECT pg_terminate_backend(pid) FROM pg_stat_activity WHERE datname='{db_name}' AND pid <> pg_backend_pid();"
         run_command(f'{self.get_base_cmd(self.get_admin_db_name())} -c "{kill}"', env=self._auth_env())
         run_command(f'{self.get_base_cmd(self.get_admin_db_name())} -c "DROP DATABASE IF EXISTS {db_name};"', env=self._auth_env())
@@ -33,6 +115,29 @@ class PostgresEngine(DBEngine):
     def create_db(self, db_name):
         run_command(f'{self.get_base_cmd(self.get_admin_db_name())} -c "CREATE DATABASE {db_name};"', env=self._auth_env())
 
+    def replace_db(self, source, target):
+        """Swap source in as target with two renames in one transaction; the old target is dropped"""
+        trash = f"{target}_dbl_old_{int(time.time())}"
+        admin = self.get_base_cmd(self.get_admin_db_name())
+        swap = f"BEGIN; ALTER DATABASE {target} RENAME TO {trash}; ALTER DATABASE {source} RENAME TO {target}; COMMIT;"
+        kill = (f"SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+                f"WHERE datname IN ('{source}', '{target}') AND pid <> pg_backend_pid();")
+        for db in (source, target):
+            self._pk_cache.pop(db, None)
+            self.release_db(db)
+        for attempt in range(RENAME_ATTEMPTS):
+            try:
+                run_command(f'{admin} -c "{kill}"', env=self._auth_env())
+                run_command(f'{admin} -v ON_ERROR_STOP=1 -c "{swap}"', env=self._auth_env())
+                break
+            except DBLError:
+                # Terminated backends exit asynchronously; give them a moment
+                time.sleep(0.2 * (attempt + 1))
+        else:
+            log("Rename swap failed, copying the database instead...", "warn")
+            return super().replace_db(source, target)
+        self.drop_db(trash)
+
     def clone_db(self, source, target):
         log(f"   🔄 Cloning {source} → {target}...", "info")
         
@@ -50,6 +155,9 @@ class PostgresEngine(DBEngine):
             sys.stdout.write('\r   ✓ Database cloned successfully' + ' '*20 + '\n')
             sys.stdout.flush()
         
+        # CREATE DATABASE ... TEMPLATE needs the source free of sessions
+        self.release_db(source)
+        self.release_db(target)
         t = threading.Thread(target=spinner)
         t.start()
         try:
@@ -61,32 +169,53 @@ class PostgresEngine(DBEngine):
             self.create_db(target)
             dump = f"pg_dump -h {self.host} -p {self.port} -U {self.user} {source}"
             if self.is_docker: 
-                dump = f"docker exec {self.container} {dump}"
-            run_command(f"{dump} | {self.get_base_cmd(target)}", env=self._auth_env())
+                # Dump and restore inside the container: the data never crosses docker exec
+                load = f"psql -h {self.host} -p {self.port} -U {self.user} -d {target} -q -v ON_ERROR_STOP=1"
+                run_command(self._in_container(f"{dump} | {load}"), env=self._auth_env())
+            else:
+                run_command(f"{dump} | {self.get_base_cmd(target)}", env=self._auth_env())
         finally:
             stop_spinner = True
             t.join()
 
     def get_tables(self, db_name):
-        cmd = f'{self.get_base_cmd(db_name)} -t -c "SELECT tablename FROM pg_tables WHERE schemaname=\'public\';"'
-        out = run_command(cmd, capture=True, env=self._auth_env())
-        return [line.strip() for line in out.splitlines() if line.strip()]
+        rows = self.fetch_rows(db_name, f"SELECT tablename FROM pg_tables WHERE schemaname='public' AND tablename <> '{LEDGER_TABLE}';")
+        return [row[0].strip() for row in rows if row[0].strip()]
     
     def execute_query(self, db_name, query):
         """Execute a query and return command string for PostgreSQL"""
         return f'{self.get_base_cmd(db_name)} -t -A -c "{query}"'
 
+    def fetch_rows(self, db_name, query):
+        """Run a query through psql and return its rows as tuples of strings"""
+        if self.sessions:
+            lines = self.sessions.run(db_name, query)
+        else:
+            lines = run_command(f'{self.get_base_cmd(db_name)} -t -A -F "|" -c "{query}"', capture=True, env=self._auth_env()).splitlines()
+        return [tuple(line.split("|")) for line in lines if line.strip()]
+
+    def stream_query(self, db_name, query):
+        """Run a query through psql and yield its output lines in bounded memory"""
+        if self.sessions:
+            return self.sessions.stream(db_name, query)
+        return stream_command(self.execute_query(db_name, query), env=self._auth_env())
+
+    def open_session(self, db_name):
+        # Errors must not end the session; each query reports them through :ERROR
+        prefix, host, port = self._client_target(interactive=True)
+        # Named in the conninfo: PGAPPNAME doesn't reach psql through docker exec
+        conninfo = f"dbname={db_name or self.get_admin_db_name()} application_name={APP_NAME}"
+        cmd = f"{prefix}psql -h {host} -p {port} -U {self.user} -d '{conninfo}' -q -t -A -F \"|\" -v ON_ERROR_STOP=0"
+        return CLISession(cmd, lambda token: f"\\echo {token} :ERROR", env=self._auth_env())
+
     def inspect_db(self, db_name):
-        query = "SELECT table_name, column_name, data_type, is_nullable, column_default, character_maximum_length, numeric_precision, numeric_scale FROM information_schema.columns WHERE table_schema = 'public' ORDER BY table_name, ordinal_position;"
-        cmd = f'{self.get_base_cmd(db_name)} -t -A -F "|" -c "{query}"'
-        out = run_command(cmd, capture=True, env=self._auth_env())
+        query = f"SELECT table_name, column_name, data_type, is_nullable, column_default, character_maximum_length, numeric_precision, numeric_scale FROM information_schema.columns WHERE table_schema = 'public' AND table_name <> '{LEDGER_TABLE}' ORDER BY table_name, ordinal_position;"
+        rows = self.fetch_rows(db_name, query)
         
         schema = {}
-        if not out: return schema
+        if not rows: return schema
         
-        for line in out.splitlines():
-            if not line.strip(): continue
-            parts = line.split("|")
+        for parts in rows:
             if len(parts) < 8: continue
             
             t_name, c_name, dtype, nullable = parts[0], parts[1], parts[2], parts[3]
@@ -108,20 +237,48 @@ class PostgresEngine(DBEngine):
             }
         return schema
 
-    def dump_table_create(self, db_name, table):
-        dump = f"pg_dump -h {self.host} -p {self.port} -U {self.user} --schema-only --table=public.{table} {db_name}"
+    def _pg_dump_cmd(self, db_name, tables, options):
+        selected = " ".join(f"--table=public.{t}" for t in tables)
+        dump = f"pg_dump -h {self.host} -p {self.port} -U {self.user} {options} {selected} {db_name}"
         if self.is_docker: 
             dump = f"docker exec {self.container} {dump}"
-        sql = run_command(dump, capture=True, env=self._auth_env())
+        return dump
+
+    def dump_table_create(self, db_name, table):
+        sql = run_command(self._pg_dump_cmd(db_name, [table], "--schema-only"), capture=True, env=self._auth_env())
         if sql:
             sql = sql.replace("CREATE TABLE ", "CREATE TABLE IF NOT EXISTS ", 1)
         return sql
 
-    def dump_table_data(self, db_name, table):
-        dump = f"pg_dump -h {self.host} -p {self.port} -U {self.user} --data-only --column-inserts --table=public.{table} {db_name}"
-        if self.is_docker: 
-            dump = f"docker exec {self.container} {dump}"
-        return run_command(dump, capture=True, env=self._auth_env())
+    def _dump_create_batch(self, db_name, tables):
+        output = run_command(self._pg_dump_cmd(db_name, tables, "--schema-only"), capture=True, env=self._auth_env())
+        parts = split_dump(output or "", tables, _DUMP_HEADER, _dump_section_table(tables))
+        if parts is None:
+            return None
+        return {t: sql.replace("CREATE TABLE ", "CREATE TABLE IF NOT EXISTS ", 1) for t, sql in parts.items()}
+
+    def _data_dump_options(self, data_format):
+        # pg_dump's default data format is COPY ... FROM stdin, which psql replays natively
+        return "--data-only --column-inserts" if data_format != "copy" else "--data-only"
+
+    def get_dump_table_data_cmd(self, db_name, table, data_format="inserts"):
+        return self._pg_dump_cmd(db_name, [table], self._data_dump_options(data_format))
+
+    def _dump_data_batch(self, db_name, tables, data_format):
+        output = run_command(self._pg_dump_cmd(db_name, tables, self._data_dump_options(data_format)),
+                             capture=True, env=self._auth_env())
+        return split_dump(output or "", tables, _DUMP_HEADER, _dump_section_table(tables))
+
+    def stream_table_data(self, db_name, table, data_format="inserts", columns=None):
+        return stream_command(self.get_dump_table_data_cmd(db_name, table, data_format), env=self._auth_env())
+
+    def _spool_data_batch(self, db_name, tables, data_format):
+        lines = stream_command(self._pg_dump_cmd(db_name, tables, self._data_dump_options(data_format)),
+                               env=self._auth_env())
+        return spool_dump(lines, tables, _DUMP_HEADER, _dump_section_table(tables))
+
+    def dump_table_data(self, db_name, table, data_format="inserts", columns=None):
+        return run_command(self.get_dump_table_data_cmd(db_name, table, data_format), capture=True, env=self._auth_env())
     
     def get_primary_keys(self, db_name, table):
         query = f"""
@@ -131,9 +288,102 @@ class PostgresEngine(DBEngine):
             WHERE i.indrelid = '{table}'::regclass AND i.indisprimary
             ORDER BY array_position(i.indkey, a.attnum);
         """
-        cmd = f'{self.get_base_cmd(db_name)} -t -c "{query}"'
-        out = run_command(cmd, capture=True, env=self._auth_env())
-        return [line.strip() for line in out.splitlines() if line.strip()]
+        return [row[0].strip() for row in self.fetch_rows(db_name, query) if row[0].strip()]
+
+    # Order-independent aggregate over per-row MD5s "h" (constant memory on the server)
+    _DIGEST_AGG = (
+        "count(*) || ':' "
+        "|| coalesce(sum(('x' || substr(h, 1, 16))::bit(64)::bigint::numeric), 0) || ':' "
+        "|| coalesce(sum(('x' || substr(h, 17, 16))::bit(64)::bigint::numeric), 0)"
+    )
+
+    def get_fingerprint_query(self, table, columns=None, mode="server"):
+        return f"SELECT {self._DIGEST_AGG} FROM (SELECT md5(t::text) AS h FROM {table} t) s;"
+
+    def get_chunk_fingerprint_query(self, table, pk_col, columns, chunk_size):
+        return (
+            f"SELECT b, {self._DIGEST_AGG} "
+            f"FROM (SELECT floor({pk_col} / {int(chunk_size)}.0)::bigint AS b, md5(t::text) AS h FROM {table} t) s "
+            "GROUP BY b;"
+        )
+
+    def get_row_diff_query(self, table, pk_cols, columns, where=None):
+        """Key as a JSON array of the PK values, payload as row_to_json (JSON never contains raw tabs/newlines)"""
+        cond = f" WHERE {where}" if where else ""
+        return f"SELECT json_build_array({', '.join(f't.{c}' for c in pk_cols)})::text || chr(9) || row_to_json(t)::text FROM {table} t{cond};"
+
+    @staticmethod
+    def _literal(text):
+        return "'" + text.replace("'", "''") + "'"
+
+    def qualified_table(self, table):
+        # Layers follow pg_dump output, which empties search_path
+        return f"public.{table}"
+
+    def get_generated_columns(self, db_name, table):
+        query = (f"SELECT column_name FROM information_schema.columns WHERE table_schema = 'public' "
+                 f"AND table_name = '{table}' AND is_generated = 'ALWAYS';")
+        return [row[0] for row in self.fetch_rows(db_name, query) if row and row[0]]
+
+    def _insert_from_json(self, table, columns, json_literal):
+        """INSERT of a row_to_json payload; OVERRIDING SYSTEM VALUE keeps GENERATED ALWAYS identities"""
+        qualified = self.qualified_table(table)
+        cols = ", ".join(columns)
+        return (f"INSERT INTO {qualified} ({cols}) OVERRIDING SYSTEM VALUE "
+                f"SELECT {cols} FROM json_populate_record(NULL::{qualified}, {json_literal})")
+
+    def get_row_delete_sql(self, table, pk_cols, key, payload):
+        pk = ", ".join(pk_cols)
+        qualified = self.qualified_table(table)
+        return (f"DELETE FROM {qualified} WHERE ({pk}) = "
+                f"(SELECT {pk} FROM json_populate_record(NULL::{qualified}, {self._literal(payload)}));")
+
+    def get_row_upsert_sql(self, table, pk_cols, columns, payload):
+        updates = [c for c in columns if c not in pk_cols]
+        action = "DO UPDATE SET " + ", ".join(f"{c} = EXCLUDED.{c}" for c in updates) if updates else "DO NOTHING"
+        return f"{self._insert_from_json(table, columns, self._literal(payload))} ON CONFLICT ({', '.join(pk_cols)}) {action};"
+
+    def dump_table_rows(self, db_name, table, where, columns=None):
+        """INSERTs built server-side; json_populate_record keeps every column type intact"""
+        if not columns:
+            return None
+        generated = set(self.get_generated_columns(db_name, table))
+        insert = self._insert_from_json(table, [c for c in columns if c not in generated], "%L")
+        query = f"SELECT format('{insert};', row_to_json(t)::text) FROM {table} t WHERE {where};"
+        return run_command(self.execute_query(db_name, query), capture=True, env=self._auth_env())
+
+    def get_change_counters(self, db_name):
+        """Tokens from pg_stat_user_tables; the database OID keeps re-created clones apart
+
+        Backends publish their counters asynchronously, so while another
+        client was busy on the database in the last seconds a recent write
+        may not be counted yet; no tokens are returned then.
+        """
+        query = (
+            "SELECT s.relname, d.oid || '/' || pg_relation_filenode(s.relid) || '/' "
+            "|| s.n_tup_ins || '/' || s.n_tup_upd || '/' || s.n_tup_del "
+            "FROM pg_stat_user_tables s JOIN pg_database d ON d.datname = current_database() "
+            "WHERE s.schemaname = 'public' AND NOT EXISTS (SELECT 1 FROM pg_stat_activity a "
+            "WHERE a.datname = current_database() AND a.pid <> pg_backend_pid() "
+            f"AND a.backend_type = 'client backend' AND a.application_name <> '{APP_NAME}' "
+            f"AND a.state_change > now() - interval '{STATS_FLUSH_SECONDS} seconds');"
+        )
+        return {row[0]: row[1] for row in self.fetch_rows(db_name, query) if len(row) == 2 and row[1]}
+
+    def _fetch_all_primary_keys(self, db_name):
+        query = (
+            "SELECT c.relname, a.attname FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indrelid "
+            "JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey) "
+            "WHERE i.indisprimary AND n.nspname = 'public' "
+            "ORDER BY c.relname, array_position(i.indkey, a.attnum);"
+        )
+        pk_map = {}
+        for row in self.fetch_rows(db_name, query):
+            if len(row) == 2:
+                pk_map.setdefault(row[0], []).append(row[1])
+        return pk_map
 
     def get_alter_column_type_sql(self, table, col, new_type):
         return f"ALTER TABLE {table} ALTER COLUMN {col} TYPE {new_type};"
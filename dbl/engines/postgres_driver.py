@@ -0,0 +1,53 @@
+"""PostgreSQL engine backed by psycopg (optional dependency)"""
+
+from .postgres import PostgresEngine, APP_NAME
+from .pool import PooledDriverMixin
+
+try:
+    import psycopg
+    from psycopg.types.string import TextLoader
+except ImportError:  # pragma: no cover - depends on the environment
+    psycopg = None
+
+
+class PostgresDriverEngine(PooledDriverMixin, PostgresEngine):
+    """PostgreSQL engine that runs queries over pooled psycopg connections
+
+    Dumps, restores and DDL still go through the CLI tools; only the query
+    primitives (fetch_rows/stream_query) use the driver.
+    """
+
+    available = psycopg is not None
+    driver_error = psycopg.Error if psycopg else ()
+    row_separator = "|"
+
+    def __init__(self, config):
+        super().__init__(config)
+        self._init_pools()
+
+    def _connect(self, db_name):
+        host, port = self._direct_endpoint() or (self.host, self.port)
+        conn = psycopg.connect(
+            host=host, port=port, user=self.user, password=self.password,
+            dbname=db_name or self.get_admin_db_name(), autocommit=True, application_name=APP_NAME
+        )
+        # Load every column as its text representation, exactly what psql prints
+        seen = set()
+        for info in conn.adapters.types:
+            for oid in (info.oid, info.array_oid):
+                if oid and oid not in seen:
+                    seen.add(oid)
+                    conn.adapters.register_loader(oid, TextLoader)
+        return conn
+
+    def _iter_rows(self, conn, query):
+        cur = conn.cursor()
+        try:
+            # Single-row mode: rows arrive as the server produces them
+            yield from cur.stream(query)
+        finally:
+            cur.close()
+
+    def _format_value(self, value):
+        # psql -A prints NULL as an empty field
+        return "" if value is None else str(value)
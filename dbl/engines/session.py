@@ -0,0 +1,111 @@
+"""Long-lived psql/mysql processes that run many queries each"""
+
+import subprocess
+import tempfile
+import uuid
+from .pool import ConnectionPool
+from ..errors import DBLError
+
+
+class CLISession:
+    """One database client process fed queries over stdin
+
+    Every query is followed by a command that prints a unique sentinel line,
+    so results can be read back from the shared stdout without guessing where
+    they end. `sentinel_cmd` formats that command from the sentinel token; for
+    psql it also prints the :ERROR variable after the token.
+    """
+
+    def __init__(self, cmd, sentinel_cmd, env=None):
+        self.cmd = cmd
+        self._sentinel_cmd = sentinel_cmd
+        self._token = f"__dbl_{uuid.uuid4().hex}__"
+        # stderr goes to a file so it can never block the stdout pipe
+        self._err = tempfile.TemporaryFile()
+        self._err_pos = 0
+        self._proc = subprocess.Popen(
+            cmd, shell=True, text=True, bufsize=1, env=env,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self._err
+        )
+
+    def run(self, query):
+        """Send a query and yield its output lines as they arrive"""
+        query = query.strip()
+        if not query.endswith(";"):
+            query += ";"
+        try:
+            self._proc.stdin.write(f"{query}\n{self._sentinel_cmd(self._token)}\n")
+            self._proc.stdin.flush()
+        except (BrokenPipeError, OSError):
+            self._fail(query)
+        failed = False
+        while True:
+            line = self._proc.stdout.readline()
+            if not line:
+                self._fail(query)
+            line = line.rstrip("\n")
+            if line.startswith(self._token):
+                failed = line[len(self._token):].strip() == "true"
+                break
+            yield line
+        errors = [l for l in self._new_stderr().splitlines() if "ERROR" in l]
+        if failed or errors:
+            raise DBLError(f"Failed session query.\n   Query: {query[:200]}\n   Err: {' '.join(errors)}")
+
+    def _new_stderr(self):
+        self._err.seek(self._err_pos)
+        data = self._err.read()
+        self._err_pos += len(data)
+        return data.decode("utf-8", "replace")
+
+    def _fail(self, query):
+        self._proc.poll()
+        raise DBLError(
+            f"Database session exited unexpectedly.\n   Cmd: {self.cmd}\n"
+            f"   Query: {query[:200]}\n   Err: {self._new_stderr().strip()}"
+        )
+
+    def close(self):
+        try:
+            if self._proc.poll() is None:
+                self._proc.stdin.close()
+                try:
+                    self._proc.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    self._proc.kill()
+                    self._proc.wait()
+        finally:
+            self._err.close()
+
+
+class SessionManager:
+    """Pools of CLISession per database (execution: session in dbl.yaml)"""
+
+    def __init__(self, open_session, max_size):
+        self._open_session = open_session
+        self.max_size = max_size
+        self._pools = {}
+
+    def _pool(self, db_name):
+        # dict.setdefault is atomic, so racing threads share one pool
+        pool = self._pools.get(db_name)
+        if pool is None:
+            pool = self._pools.setdefault(db_name, ConnectionPool(lambda: self._open_session(db_name), self.max_size))
+        return pool
+
+    def run(self, db_name, query):
+        """Run a query on a pooled session and return all of its output lines"""
+        return list(self.stream(db_name, query))
+
+    def stream(self, db_name, query):
+        """Run a query on a pooled session and yield its output lines"""
+        with self._pool(db_name).connection() as session:
+            yield from session.run(query)
+
+    def close(self, db_name=None):
+        """Close the sessions of one database, or all of them"""
+        names = [db_name] if db_name is not None else list(self._pools)
+        for name in names:
+            pool = self._pools.pop(name, None)
+            if pool:
+                pool.close()
@@ -0,0 +1,139 @@
+"""Background jobs tracked in .dbl/jobs
+
+A job is a detached `dbl` process plus a JSON file describing it. The
+process keeps the file up to date (current step, heartbeat, final status),
+so other commands can show its progress and wait for it. A running job whose
+heartbeat stops is reported as failed.
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+import uuid
+from .constants import JOBS_DIR
+from .utils import log, spawn_dbl
+
+HEARTBEAT_INTERVAL = 2
+# A running job that hasn't written a heartbeat for this long has died
+HEARTBEAT_TIMEOUT = 30
+# Finished jobs are kept this long for `sandbox status`
+KEEP_FINISHED = 24 * 3600
+
+
+def _job_path(job_id):
+    return os.path.join(JOBS_DIR, f"{job_id}.json")
+
+
+def load_job(job_id):
+    try:
+        with open(_job_path(job_id)) as f:
+            return json.load(f)
+    except (ValueError, OSError):
+        return None
+
+
+def save_job(job):
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    tmp = _job_path(job["id"]) + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(job, f)
+    os.replace(tmp, _job_path(job["id"]))
+
+
+def remove_job(job_id):
+    for path in (_job_path(job_id), os.path.join(JOBS_DIR, f"{job_id}.log")):
+        with contextlib.suppress(OSError):
+            os.remove(path)
+
+
+def list_jobs(kind=None):
+    """Jobs oldest first; running jobs without a recent heartbeat show up as failed"""
+    if not os.path.isdir(JOBS_DIR):
+        return []
+    jobs = []
+    for name in os.listdir(JOBS_DIR):
+        if not name.endswith(".json"):
+            continue
+        job = load_job(name[:-len(".json")])
+        if not job or (kind and job.get("kind") != kind):
+            continue
+        if job["status"] == "running" and time.time() - job.get("heartbeat", 0) > HEARTBEAT_TIMEOUT:
+            job.update(status="failed", error="The job stopped responding")
+        jobs.append(job)
+    return sorted(jobs, key=lambda j: j.get("started", 0))
+
+
+def start_job(kind, payload, argv):
+    """Record a job and run `dbl <argv> <job id>` for it in a detached process"""
+    for old in list_jobs(kind):
+        if old["status"] == "done" and time.time() - old.get("finished", 0) > KEEP_FINISHED:
+            remove_job(old["id"])
+    now = time.time()
+    job = {"id": f"{kind}-{int(now)}-{uuid.uuid4().hex[:6]}", "kind": kind, "status": "running",
+           "step": "starting", "started": now, "heartbeat": now, "payload": payload}
+    save_job(job)
+    with open(os.path.join(JOBS_DIR, f"{job['id']}.log"), 'a') as out:
+        spawn_dbl([*argv, job["id"]], out)
+    return job
+
+
+class JobRun:
+    """The running side of a job: reports steps and keeps the heartbeat alive"""
+
+    def __init__(self, job):
+        self.job = job
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._beat = threading.Thread(target=self._heartbeat, daemon=True)
+
+    def _heartbeat(self):
+        while not self._stop.wait(HEARTBEAT_INTERVAL):
+            self._save()
+
+    def _save(self, **changes):
+        with self._lock:
+            self.job.update(changes, heartbeat=time.time())
+            save_job(self.job)
+
+    def step(self, text):
+        self._save(step=text)
+
+    def __enter__(self):
+        self._beat.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._beat.join()
+        if exc is None:
+            self._save(status="done", step="done", finished=time.time())
+        else:
+            self._save(status="failed", error=str(exc), finished=time.time())
+        return False
+
+
+def wait_for_jobs(kind=None, poll=0.5):
+    """Block while jobs of `kind` are running; returns the failed ones"""
+    announced = set()
+    while True:
+        jobs = list_jobs(kind)
+        running = [j for j in jobs if j["status"] == "running"]
+        if not running:
+            return [j for j in jobs if j["status"] == "failed"]
+        for job in running:
+            if job["id"] not in announced:
+                announced.add(job["id"])
+                log(f"⏳ Waiting for background job {job['id']} ({job.get('step')})...", "info")
+        time.sleep(poll)
+
+
+def describe_job(job):
+    """One status line: kind, state and elapsed time"""
+    end = job.get("finished") or time.time()
+    state = job["step"] if job["status"] == "running" else job["status"]
+    line = f"{job['id']}: {state} ({end - job['started']:.0f}s)"
+    if job["status"] == "failed":
+        line += f" - {job.get('error')}"
+    return line
@@ -0,0 +1,87 @@
+"""Applied-layer ledger: which files a managed database was built from
+
+Every replay records one row per file (position, name and content hash) in
+a table inside the database itself, so the ledger travels with clones and
+checkpoints. The row of the last file also stores the schema hash seen
+right after it was applied, which exposes schema edits made outside DBL.
+"""
+
+import hashlib
+import json
+from .constants import LEDGER_TABLE
+from .errors import DBLError
+from .utils import log
+
+
+def ledger_setup_sql(engine, first_seq):
+    """Create the ledger if needed and forget rows from `first_seq` on (one statement per line)"""
+    table = engine.ledger_table
+    return (
+        f"CREATE TABLE IF NOT EXISTS {table} (seq INTEGER PRIMARY KEY, file VARCHAR(255) NOT NULL, "
+        "sha256 CHAR(64) NOT NULL, schema_hash CHAR(32), applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);\n"
+        f"DELETE FROM {table} WHERE seq >= {int(first_seq)};\n"
+    )
+
+
+def ledger_insert_sql(engine, seq, name, sha256):
+    name = name.replace("'", "''")
+    return f"INSERT INTO {engine.ledger_table} (seq, file, sha256) VALUES ({int(seq)}, '{name}', '{sha256}');\n"
+
+
+def read_ledger(engine, db_name):
+    """Ledger rows as (seq, file, sha256, schema_hash), ordered; None if there is none"""
+    try:
+        if not engine.has_table(db_name, LEDGER_TABLE):
+            return None
+        rows = engine.fetch_rows(db_name, f"SELECT seq, file, sha256, COALESCE(schema_hash, '') FROM {engine.ledger_table} ORDER BY seq;")
+    except DBLError:
+        return None
+    return [(int(r[0]), r[1], r[2], r[3]) for r in rows if len(r) == 4]
+
+
+def common_prefix(applied, entries):
+    """How many of `entries` ((seq, file, sha256), in order) the ledger already covers"""
+    recorded = {row[0]: (row[1], row[2]) for row in applied}
+    n = 0
+    for seq, name, sha256 in entries:
+        if recorded.get(seq) != (name, sha256):
+            break
+        n += 1
+    return n
+
+
+def schema_hash(engine, db_name):
+    """Same schema hash as the diff state uses"""
+    return hashlib.md5(json.dumps(engine.inspect_db(db_name), sort_keys=True).encode()).hexdigest()
+
+
+def stamp_schema(engine, db_name, seq):
+    """Record the current schema hash on ledger row `seq`"""
+    engine.fetch_rows(db_name, f"UPDATE {engine.ledger_table} SET schema_hash = '{schema_hash(engine, db_name)}' WHERE seq = {int(seq)};")
+
+
+def applied_prefix(engine, db_name, entries, applied=None, check_schema=True):
+    """Files of `entries` already in db_name, or None when the DB is not a clean prefix
+
+    A clean prefix means the ledger holds nothing beyond the common prefix
+    and the schema still matches the one recorded after its last file.
+    """
+    applied = read_ledger(engine, db_name) if applied is None else applied
+    if not applied:
+        return None
+    n = common_prefix(applied, entries)
+    if n != len(applied):
+        return None
+    if check_schema and applied[-1][3] != schema_hash(engine, db_name):
+        log("   Schema changed since the last applied layer", "warn")
+        return None
+    return n
+
+
+def record_layers(engine, db_name, entries):
+    """Append ledger rows for files that are already part of db_name (a committed layer)"""
+    # One statement per query: driver connections do not accept several at once
+    sql = ledger_setup_sql(engine, entries[0][0]) + "".join(ledger_insert_sql(engine, *e) for e in entries)
+    for statement in sql.splitlines():
+        engine.fetch_rows(db_name, statement)
+    stamp_schema(engine, db_name, entries[-1][0])
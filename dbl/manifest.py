@@ -2,7 +2,7 @@
 
 import json
 import os
-from .constants import MANIFEST_FILE
+from .constants import MANIFEST_FILE, LAYERS_DIR, SNAPSHOT_FILE
 from .utils import log
 
 
@@ -28,3 +28,9 @@ def save_manifest(data):
     """Save the manifest file"""
     with open(MANIFEST_FILE, 'w') as f: 
         json.dump(data, f, indent=2)
+
+
+def branch_paths(layers):
+    """Files replayed to build a branch: the snapshot (if any) plus its layers"""
+    paths = [SNAPSHOT_FILE] if os.path.exists(SNAPSHOT_FILE) else []
+    return paths + [os.path.join(LAYERS_DIR, l['file']) for l in layers]
@@ -0,0 +1,113 @@
+"""Merkle trees over primary-key range chunks
+
+Each leaf is the server-side digest of the rows whose integer primary key
+falls in ``[bucket * chunk_size, (bucket + 1) * chunk_size)``. A parent node
+id is ``child_id // fanout``, so two trees line up level by level regardless
+of which buckets exist, and diffing them only descends into subtrees whose
+hashes differ.
+"""
+
+import hashlib
+import json
+import os
+from .constants import MERKLE_DIR
+
+
+DEFAULT_CHUNK_SIZE = 10000
+DEFAULT_FANOUT = 16
+
+INTEGER_TYPES = {
+    'smallint', 'integer', 'bigint', 'int', 'tinyint', 'mediumint',
+}
+
+
+def _md5(text):
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+
+def is_chunkable(pk_cols, schema_cols):
+    """Chunking needs a single integer primary key column"""
+    return len(pk_cols) == 1 and (schema_cols.get(pk_cols[0]) or {}).get('type') in INTEGER_TYPES
+
+
+def build_tree(leaves, fanout=DEFAULT_FANOUT, height=None):
+    """Build tree levels from {bucket: digest}; levels[0] holds the leaves"""
+    level = {int(b): _md5(str(d)) for b, d in leaves.items()}
+    levels = [level]
+    while (len(levels) < height) if height else any(k not in (0, -1) for k in level):
+        parents = {}
+        for node_id in sorted(level):
+            parents.setdefault(node_id // fanout, []).append(f"{node_id}:{level[node_id]}")
+        level = {pid: _md5(",".join(children)) for pid, children in parents.items()}
+        levels.append(level)
+    return levels
+
+
+def tree_root(levels):
+    """Root hash of a tree (the table's data fingerprint)"""
+    top = levels[-1]
+    return _md5(",".join(f"{k}:{top[k]}" for k in sorted(top)))
+
+
+def diff_buckets(leaves_a, leaves_b, fanout=DEFAULT_FANOUT):
+    """Return the sorted bucket ids whose digests differ between two trees"""
+    height = max(len(build_tree(leaves_a, fanout)), len(build_tree(leaves_b, fanout)))
+    tree_a = build_tree(leaves_a, fanout, height)
+    tree_b = build_tree(leaves_b, fanout, height)
+
+    frontier = set(tree_a[-1]) | set(tree_b[-1])
+    for depth in range(height - 1, -1, -1):
+        level_a, level_b = tree_a[depth], tree_b[depth]
+        changed = {n for n in frontier if level_a.get(n) != level_b.get(n)}
+        if depth == 0:
+            return sorted(changed)
+        below = set(tree_a[depth - 1]) | set(tree_b[depth - 1])
+        frontier = {c for c in below if c // fanout in changed}
+    return []
+
+
+def bucket_ranges(buckets, chunk_size):
+    """Merge bucket ids into inclusive (low, high) primary-key ranges"""
+    ranges = []
+    for b in sorted(buckets):
+        lo, hi = b * chunk_size, (b + 1) * chunk_size - 1
+        if ranges and ranges[-1][1] + 1 == lo:
+            ranges[-1] = (ranges[-1][0], hi)
+        else:
+            ranges.append((lo, hi))
+    return ranges
+
+
+def changed_ranges(chunks_a, chunks_b, fanout=DEFAULT_FANOUT):
+    """PK ranges that differ between two chunk states of a table (None if not comparable)"""
+    if not chunks_a or not chunks_b:
+        return None
+    if chunks_a['pk'] != chunks_b['pk'] or chunks_a['chunk_size'] != chunks_b['chunk_size']:
+        return None
+    buckets = diff_buckets(chunks_a['leaves'], chunks_b['leaves'], fanout)
+    return bucket_ranges(buckets, chunks_a['chunk_size'])
+
+
+def _chunk_file(db_name):
+    return os.path.join(MERKLE_DIR, f"{db_name}.json")
+
+
+def load_chunk_state(db_name):
+    """Load persisted chunk leaves for a database ({table: chunk_info})"""
+    path = _chunk_file(db_name)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (ValueError, OSError):
+        return {}
+
+
+def save_chunk_state(db_name, chunks):
+    """Persist chunk leaves for a database"""
+    os.makedirs(MERKLE_DIR, exist_ok=True)
+    tmp = _chunk_file(db_name) + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(chunks, f)
+    os.replace(tmp, _chunk_file(db_name))
@@ -1,16 +1,101 @@
 """Migration SQL generation (planner)"""
 
+import io
+import tempfile
 from datetime import datetime
 from .engines.postgres import PostgresEngine
-from .state import get_state
+from .state import get_db_states, scope_schema
 from .utils import log
+from .merkle import changed_ranges
+from .rowdiff import DEFAULT_RUN_SIZE, diff_table_rows
+from .writer import LayerWriter
 
 
-def generate_migration_sql(config, engine, active_db, backup_db, include_data=False):
-    """Generate migration SQL by comparing two database states"""
+def _dump_changed_ranges(engine, active_db, table, columns, current_state, backup_state):
+    """Resync only the PK ranges whose Merkle chunks differ (None = resync whole table)"""
+    current_chunks = current_state.get('chunks', {}).get(table)
+    ranges = changed_ranges(current_chunks, backup_state.get('chunks', {}).get(table))
+    if ranges is None:
+        return None
+    pk = current_chunks['pk']
+    lines = [f"-- Changed {pk} ranges: {len(ranges)}"]
+    for lo, hi in ranges:
+        where = f"{pk} BETWEEN {lo} AND {hi}"
+        rows = engine.dump_table_rows(active_db, table, where, list(columns))
+        if rows is None:
+            return None
+        lines.append(f"DELETE FROM {engine.qualified_table(table)} WHERE {where};")
+        if rows:
+            lines.append(rows)
+    return lines
+
+
+def _diff_changed_rows(config, engine, active_db, backup_db, table, active_cols, backup_cols,
+                       current_state, backup_state):
+    """Row-level upserts/deletes for a changed table (None = fall back to a bulk resync)"""
+    lcfg = config.get('layers') or {}
+    if not lcfg.get('row_diff', True):
+        return None
+    try:
+        pk_cols = engine.get_all_primary_keys(active_db).get(table)
+    except Exception:
+        pk_cols = engine.get_primary_keys(active_db, table)
+    if not pk_cols:
+        return None
+    # With Merkle trees, only the chunks that differ need to be compared
+    where = None
+    ranges = changed_ranges(current_state.get('chunks', {}).get(table), backup_state.get('chunks', {}).get(table))
+    if ranges:
+        pk = pk_cols[0]
+        where = " OR ".join(f"{pk} BETWEEN {lo} AND {hi}" for lo, hi in ranges)
+    statements = diff_table_rows(engine, active_db, backup_db, table, pk_cols, active_cols, backup_cols,
+                                 where=where, run_size=int(lcfg.get('sort_buffer_rows', DEFAULT_RUN_SIZE)))
+    if statements is None:
+        return None
+    # Statements are spooled to disk; the count heads the section
+    spool = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+    count = 0
+    try:
+        for stmt in statements:
+            spool.write(stmt if count == 0 else "\n" + stmt)
+            count += 1
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return [f"-- Changed rows: {count}", spool]
+
+
+def generate_migration_sql(config, engine, active_db, backup_db, include_data=False, states=None, schemas=None,
+                           scope=None):
+    """Generate migration SQL by comparing two database states, as a string"""
+    buf = io.StringIO()
+    write_migration_sql(LayerWriter(buf), config, engine, active_db, backup_db,
+                        include_data=include_data, states=states, schemas=schemas, scope=scope)
+    return buf.getvalue()
+
+
+def write_migration_sql(sql, config, engine, active_db, backup_db, include_data=False, states=None, schemas=None,
+                        scope=None):
+    """Stream migration SQL comparing two database states into a LayerWriter
+
+    Each database is inspected and fingerprinted once; the schema diff, the
+    data-change detection and the backfill share the results. `schemas` and
+    `states` ({'active': ..., 'backup': ...}) may carry results the caller
+    already has; computed states are stored back into `states` for reuse.
+    `scope` restricts the comparison to the tables of a partial sandbox.
+    Data dumps go through temporary files, never through memory.
+    """
+    schemas = schemas if schemas is not None else {}
+    states = states if states is not None else {}
     log("🕵️  Inspecting schemas...", "info")
-    active_schema = engine.inspect_db(active_db)
-    backup_schema = engine.inspect_db(backup_db)
+    for key, db in (('active', active_db), ('backup', backup_db)):
+        if schemas.get(key) is None:
+            schemas[key] = engine.inspect_db(db)
+        # A partial shadow only holds the scoped tables; the rest would look new
+        schemas[key] = scope_schema(schemas[key], scope)
+    active_schema = schemas['active']
+    backup_schema = schemas['backup']
 
     def format_type(info):
         """Format column type with length/precision"""
@@ -47,7 +132,6 @@ def generate_migration_sql(config, engine, active_db, backup_db, include_data=Fa
         'allow_drop_column': False
     })
     
-    sql = []
     type_changes_sql = []
     hardening_sql = []
     
@@ -68,9 +152,10 @@ def generate_migration_sql(config, engine, active_db, backup_db, include_data=Fa
     if new_tables:
         sql.append("-- [EXPAND PHASE] --")
         sql.append("-- New tables (safe, no conflicts)")
+        creates = engine.dump_tables_create(active_db, sorted(new_tables))
         for t in sorted(new_tables):
             sql.append(f"-- phase: expand")
-            sql.append(engine.dump_table_create(active_db, t))
+            sql.append(creates[t])
             sql.append("")
 
     # 2. Modified Tables
@@ -138,46 +223,53 @@ def generate_migration_sql(config, engine, active_db, backup_db, include_data=Fa
         sql.append("")
 
     # 5. Data Sync (BACKFILL)
-    if include_data:
-        whitelist = config.get('track_tables', [])
-        blacklist = config.get('ignore_tables', [])
-        data_sql_buffer = []
-        
-        candidates = [t for t in common_tables if (t in whitelist) or (not whitelist and t not in blacklist)]
-        if candidates:
-            current_state = get_state(engine, active_db, config)
-            backup_state = get_state(engine, backup_db, config)
-            
-            for t in sorted(candidates):
-                if current_state['data'].get(t) != backup_state['data'].get(t):
-                    data_sql_buffer.append(f"-- phase: backfill (data-only, optional)")
-                    data_sql_buffer.append(f"-- Data changed in: {t}")
-                    data_sql_buffer.append(f"TRUNCATE TABLE {t};")
-                    data_sql_buffer.append(engine.dump_table_data(active_db, t))
-                    data_sql_buffer.append("")
-            
-            if data_sql_buffer:
-                sql.append("")
-                sql.append("-- [BACKFILL PHASE - DATA SYNC] --")
-                sql.append("-- ⚠️  Data operations are destructive (TRUNCATE).")
-                sql.append("-- Ensure these are lookup/reference tables only.")
-                sql.extend(data_sql_buffer)
+    whitelist = config.get('track_tables', [])
+    blacklist = config.get('ignore_tables', [])
+    candidates = [t for t in common_tables if (t in whitelist) or (not whitelist and t not in blacklist)]
+    if candidates:
+        if states.get('active') is None or states.get('backup') is None:
+            states['active'], states['backup'] = get_db_states(
+                engine, [active_db, backup_db], config,
+                schemas={active_db: active_schema, backup_db: backup_schema})
+        current_state, backup_state = states['active'], states['backup']
+        data_changed = [t for t in sorted(candidates) if current_state['data'].get(t) != backup_state['data'].get(t)]
     else:
-        whitelist = config.get('track_tables', [])
-        blacklist = config.get('ignore_tables', [])
-        candidates = [t for t in common_tables if (t in whitelist) or (not whitelist and t not in blacklist)]
-        if candidates:
-            current_state = get_state(engine, active_db, config)
-            backup_state = get_state(engine, backup_db, config)
-            data_changed = [t for t in sorted(candidates) if current_state['data'].get(t) != backup_state['data'].get(t)]
-            
-            if data_changed:
-                sql.append("")
-                sql.append("-- [⚠️  DATA CHANGES DETECTED] --")
-                sql.append("-- The following tables have changed data:")
-                for t in data_changed:
-                    sql.append(f"--   {t}")
-                sql.append("-- To include data sync, use: dbl commit -m \"msg\" --with-data")
-                sql.append("")
-
-    return "\n".join(sql)
+        data_changed = []
+
+    if include_data:
+        data_format = (config.get('layers') or {}).get('data_format', 'inserts')
+        partial = {}
+        for t in data_changed:
+            range_sql = _diff_changed_rows(config, engine, active_db, backup_db, t, active_schema[t],
+                                           backup_schema[t], current_state, backup_state)
+            if range_sql is None:
+                range_sql = _dump_changed_ranges(engine, active_db, t, active_schema[t],
+                                                 current_state, backup_state)
+            partial[t] = range_sql
+        # Tables resynced whole are dumped together (few dump processes, run concurrently)
+        full = [t for t in data_changed if partial[t] is None]
+        dumps = engine.spool_tables_data(active_db, full, data_format=data_format,
+                                         columns={t: list(active_schema[t]) for t in full}) if full else {}
+
+        if data_changed:
+            sql.append("")
+            sql.append("-- [BACKFILL PHASE - DATA SYNC] --")
+            sql.append("-- ⚠️  Data operations are destructive (DELETE/TRUNCATE).")
+            sql.append("-- Ensure these are lookup/reference tables only.")
+        for t in data_changed:
+            sql.append(f"-- phase: backfill (data-only, optional)")
+            sql.append(f"-- Data changed in: {t}")
+            if partial[t] is not None:
+                sql.extend(partial[t])
+            else:
+                sql.append(f"TRUNCATE TABLE {engine.qualified_table(t)};")
+                sql.append(dumps[t])
+            sql.append("")
+    elif data_changed:
+        sql.append("")
+        sql.append("-- [⚠️  DATA CHANGES DETECTED] --")
+        sql.append("-- The following tables have changed data:")
+        for t in data_changed:
+            sql.append(f"--   {t}")
+        sql.append("-- To include data sync, use: dbl commit -m \"msg\" --with-data")
+        sql.append("")
@@ -0,0 +1,157 @@
+"""Pool of pre-cloned sandbox shadows
+
+`sandbox.pool_size` ready-made copies of the branch head wait on the server
+so `sandbox start` only has to claim one instead of cloning. Each member
+records the head it was cloned at (the checkpoint key of snapshot + layers);
+members left behind by a commit, reset or checkout are never claimed and
+are dropped by the next refill, which runs in a background process.
+"""
+
+import contextlib
+import json
+import os
+import time
+import uuid
+from .checkpoints import load_checkpoints, save_checkpoints, prefix_keys, layer_entries
+from .constants import DBL_DIR, POOL_FILE
+from .ledger import applied_prefix
+from .manifest import load_manifest, branch_paths
+from .utils import log, spawn_dbl
+
+POOL_LOCK = POOL_FILE + ".lock"
+POOL_LOG = os.path.join(DBL_DIR, "pool.log")
+# A lock older than this was left behind by a process that died holding it
+LOCK_TIMEOUT = 10
+
+
+def pool_size(config):
+    return max(0, int((config.get('sandbox') or {}).get('pool_size', 0)))
+
+
+def load_pool():
+    """Load the pool registry ({'members': [{'db', 'head', 'created'}]})"""
+    if not os.path.exists(POOL_FILE):
+        return {"members": []}
+    try:
+        with open(POOL_FILE, 'r') as f:
+            return {"members": json.load(f).get("members", [])}
+    except (ValueError, OSError):
+        return {"members": []}
+
+
+def save_pool(pool):
+    os.makedirs(DBL_DIR, exist_ok=True)
+    tmp = POOL_FILE + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump({"version": 1, **pool}, f)
+    os.replace(tmp, POOL_FILE)
+
+
+@contextlib.contextmanager
+def _locked():
+    """Serialize registry updates between the CLI and the background refill"""
+    os.makedirs(DBL_DIR, exist_ok=True)
+    deadline = time.time() + LOCK_TIMEOUT
+    while True:
+        try:
+            fd = os.open(POOL_LOCK, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            if time.time() > deadline:
+                with contextlib.suppress(OSError):
+                    os.remove(POOL_LOCK)
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        with contextlib.suppress(OSError):
+            os.remove(POOL_LOCK)
+
+
+def branch_head():
+    """(key, ledger entries) of the current branch head"""
+    m = load_manifest()
+    paths = branch_paths(m['branches'][m['current']])
+    registry = load_checkpoints()
+    keys = prefix_keys(registry, paths)
+    entries = layer_entries(registry, paths)
+    save_checkpoints(registry)
+    return (keys[-1] if keys else ""), entries
+
+
+def _at_head(engine, db_name, entries):
+    return bool(entries) and applied_prefix(engine, db_name, entries) == len(entries)
+
+
+def claim_shadow(engine, config, db_name):
+    """Take a pooled copy of the head for db_name's sandbox; None if there is none to use
+
+    Only used when db_name itself sits cleanly at the branch head, since the
+    shadow has to be a copy of it.
+    """
+    if pool_size(config) == 0 or not load_pool()["members"]:
+        return None
+    key, entries = branch_head()
+    if not _at_head(engine, db_name, entries):
+        return None
+    with _locked():
+        pool = load_pool()
+        member = next((m for m in pool["members"] if m["head"] == key), None)
+        if member:
+            pool["members"].remove(member)
+            save_pool(pool)
+    return member["db"] if member else None
+
+
+def _refill_source(engine, key, entries):
+    """The head checkpoint to clone from (None if there is none)
+
+    Only checkpoints qualify: edits made to the working database by hand
+    don't show in its ledger, and cloning a sandbox shadow would disconnect
+    the diffs, commits and sync jobs using it (PostgreSQL clones by template).
+    """
+    checkpoint = load_checkpoints()["entries"].get(key)
+    if checkpoint and _at_head(engine, checkpoint["db"], entries):
+        return checkpoint["db"]
+    return None
+
+
+def refill_pool(engine, config):
+    """Drop stale members and clone new ones until the pool holds `pool_size` copies of the head"""
+    db_name = config['db_name']
+    size = pool_size(config)
+    key, entries = branch_head()
+    with _locked():
+        pool = load_pool()
+        fresh = [m for m in pool["members"] if m["head"] == key][:size]
+        stale = [m for m in pool["members"] if m not in fresh]
+        pool["members"] = fresh
+        save_pool(pool)
+    for member in stale:
+        log(f"   Dropping stale pool member {member['db']}", "info")
+        engine.drop_db(member["db"])
+
+    missing = size - len(fresh)
+    if missing <= 0:
+        return
+    source = _refill_source(engine, key, entries)
+    if not source:
+        return log("No checkpoint holds the branch head (see checkpoints.enabled); sandbox pool left as is", "warn")
+    for _ in range(missing):
+        name = f"{db_name}_dbl_shadow_{uuid.uuid4().hex[:8]}"
+        engine.clone_db(source, name)
+        with _locked():
+            pool = load_pool()
+            pool["members"].append({"db": name, "head": key, "created": time.time()})
+            save_pool(pool)
+    log(f"Sandbox pool ready ({size} members)", "success")
+
+
+def schedule_refill(config):
+    """Refill the pool in a detached background process (output goes to .dbl/pool.log)"""
+    if pool_size(config) == 0 and not load_pool()["members"]:
+        return
+    os.makedirs(DBL_DIR, exist_ok=True)
+    with open(POOL_LOG, 'a') as out:
+        spawn_dbl(["sandbox", "pool"], out)
@@ -0,0 +1,106 @@
+"""Row-level table diffs in bounded memory
+
+Rows of both databases are streamed as (key, payload) pairs, sorted by key
+with an external merge sort (sorted runs spill to temporary files) and then
+merge-joined, so only `run_size` rows per database are ever held in memory.
+"""
+
+import heapq
+import json
+import tempfile
+
+
+DEFAULT_RUN_SIZE = 100000
+
+
+def _spill(buffer):
+    """Write a sorted run to a temporary file and rewind it"""
+    buffer.sort()
+    run = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+    for pair in buffer:
+        run.write(json.dumps(pair) + "\n")
+    run.seek(0)
+    return run
+
+
+def _read_run(run):
+    for line in run:
+        key, payload = json.loads(line)
+        yield key, payload
+
+
+def external_sort(pairs, run_size=DEFAULT_RUN_SIZE):
+    """Yield (key, payload) pairs sorted by key, spilling runs of `run_size` to disk"""
+    runs = []
+    buffer = []
+    try:
+        for pair in pairs:
+            buffer.append(tuple(pair))
+            if len(buffer) >= run_size:
+                runs.append(_spill(buffer))
+                buffer = []
+        buffer.sort()
+        if not runs:
+            yield from buffer
+            return
+        yield from heapq.merge(*[_read_run(run) for run in runs], iter(buffer))
+    finally:
+        for run in runs:
+            run.close()
+
+
+def merge_join(old, new):
+    """Diff two key-sorted pair streams: yields ('delete'|'insert'|'update', key, payload)
+
+    Deletes carry the old payload, inserts and updates the new one.
+    """
+    _end = object()
+    old, new = iter(old), iter(new)
+    a, b = next(old, _end), next(new, _end)
+    while a is not _end or b is not _end:
+        if b is _end or (a is not _end and a[0] < b[0]):
+            yield "delete", a[0], a[1]
+            a = next(old, _end)
+        elif a is _end or b[0] < a[0]:
+            yield "insert", b[0], b[1]
+            b = next(new, _end)
+        else:
+            if a[1] != b[1]:
+                yield "update", b[0], b[1]
+            a, b = next(old, _end), next(new, _end)
+
+
+def diff_table_rows(engine, active_db, backup_db, table, pk_cols, active_cols, backup_cols,
+                    where=None, run_size=DEFAULT_RUN_SIZE):
+    """SQL statements turning the shadow's rows of a table into the active DB's
+
+    Returns None if the engine can't stream row payloads; otherwise a
+    generator of statements (DELETE for removed rows, upserts for new and
+    changed ones).
+    """
+    if not pk_cols:
+        return None
+    # Generated columns can't be inserted; their values follow from the other columns
+    generated = set(engine.get_generated_columns(active_db, table))
+    active_cols = [c for c in active_cols if c not in generated]
+    backup_cols = [c for c in backup_cols if c not in generated]
+    active_query = engine.get_row_diff_query(table, pk_cols, list(active_cols), where)
+    backup_query = engine.get_row_diff_query(table, pk_cols, list(backup_cols), where)
+    if not active_query or not backup_query:
+        return None
+
+    def pairs(db_name, query):
+        for line in engine.stream_query(db_name, query):
+            if line.strip():
+                yield engine.parse_row_diff_line(line)
+
+    def statements():
+        old = external_sort(pairs(backup_db, backup_query), run_size)
+        new = external_sort(pairs(active_db, active_query), run_size)
+        for op, key, payload in merge_join(old, new):
+            if op == "delete":
+                yield engine.get_row_delete_sql(table, pk_cols, key, payload)
+            else:
+                yield engine.get_row_upsert_sql(table, pk_cols, list(active_cols), payload)
+
+    return statements()
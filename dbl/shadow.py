@@ -0,0 +1,235 @@
+"""Bringing the sandbox shadow up to date after a commit
+
+The shadow must hold the committed state again after each commit. Instead
+of cloning the active DB, which blocks on a full copy and would pick up
+edits made after the commit if it ran in the background, a background job
+applies the new layer to the shadow. diff, commit and rollback wait for it.
+
+When the shadow does have to become a copy of the active DB (schema-only
+commits, a layer that doesn't apply or doesn't reproduce the commit,
+`dbl sandbox sync`), only the tables whose columns or data fingerprints
+differ are copied over. The same table
+copy builds and restores the shadow of a partial sandbox, which holds only
+the tables the sandbox was started with.
+"""
+
+import os
+import tempfile
+from .apply import apply_layers
+from .checkpoints import appendable_entries
+from .constants import LEDGER_TABLE
+from .errors import DBLError
+from .jobs import start_job, load_job, list_jobs, remove_job, wait_for_jobs, JobRun
+from .ledger import stamp_schema
+from .pool import schedule_refill
+from .state import clear_baseline_state, store_baseline_state, get_states, scope_schema
+from .utils import log
+from .writer import LayerWriter
+
+JOB_KIND = "shadow-sync"
+
+
+def start_shadow_sync(meta, base_paths, layer_path, expected):
+    """Apply a just-committed layer to the shadow in a background job
+
+    `expected` is the state of the active DB the layer was written from; the
+    shadow must match it once the layer is in.
+    """
+    payload = {"active_db": meta['active_db'], "backup_db": meta['backup_db'],
+               "base_paths": base_paths, "layer": layer_path, "tables": meta.get('tables'),
+               "expected": {"schema": expected['schema'], "data": expected['data']}}
+    return start_job(JOB_KIND, payload, ["sandbox", "sync", "--job"])
+
+
+def _state_mismatch(state, expected):
+    """Tables (or '(schema)') where a state differs from the expected one"""
+    differ = sorted(t for t in set(state['data']) | set(expected['data'])
+                    if state['data'].get(t) != expected['data'].get(t))
+    return (["(schema)"] if state['schema'] != expected['schema'] else []) + differ
+
+
+def run_shadow_sync(engine, config, job_id):
+    """Body of the background job started by start_shadow_sync"""
+    job = load_job(job_id)
+    if job is None:
+        raise DBLError(f"Job no encontrado: {job_id}")
+    p = job["payload"]
+    with JobRun(job) as run:
+        run.step("applying layer to shadow")
+        try:
+            entries = appendable_entries(engine, p["backup_db"], p["base_paths"], [p["layer"]])
+            # All or nothing, so a failure leaves the shadow as it was
+            acfg = dict(config.get('apply') or {}, transaction='single')
+            apply_layers(engine, p["backup_db"], [p["layer"]], {**config, 'apply': acfg}, ledger=entries)
+            if entries:
+                stamp_schema(engine, p["backup_db"], entries[-1][0])
+        except DBLError:
+            log("Layer did not apply to the shadow, copying the active DB instead", "warn")
+        else:
+            # Layers leave out what the planner only comments (drops, type changes,
+            # NOT NULL...) and the data of new tables, so the result is checked
+            run.step("fingerprinting shadow")
+            state = get_states(engine, [p["backup_db"]], config, scope=p.get("tables"))[0]
+            differ = _state_mismatch(state, p["expected"])
+            if not differ:
+                store_baseline_state(engine, config, state)
+                schedule_refill(config)
+                return
+            log(f"Shadow differs from the commit after the layer ({', '.join(differ[:5])}), "
+                "copying the active DB instead", "warn")
+        run.step("copying active database")
+        refresh_shadow(engine, config, p["active_db"], p["backup_db"], scope=p.get("tables"))
+        # The active DB may have moved on since the commit
+        clear_baseline_state()
+    schedule_refill(config)
+
+
+def tables_to_refresh(active_schema, shadow_schema, active_state, shadow_state):
+    """Split the work of turning the shadow into a copy of the active DB
+
+    Returns (recreate, reload, drop): tables that are new or whose columns
+    differ, tables whose data fingerprint differs, and tables the active DB
+    no longer has. Tables without a fingerprint (untracked, or unreadable)
+    are reloaded, since nothing shows they are unchanged.
+    """
+    recreate, reload = [], []
+    for t in sorted(active_schema):
+        if shadow_schema.get(t) != active_schema[t]:
+            recreate.append(t)
+            continue
+        hash_val = active_state['data'].get(t)
+        if hash_val in (None, "read_error") or hash_val != shadow_state['data'].get(t):
+            reload.append(t)
+    drop = sorted(set(shadow_schema) - set(active_schema))
+    return recreate, reload, drop
+
+
+def _copy_tables(engine, config, active_db, shadow_db, recreate, reload, drop, columns):
+    """Replace tables of the shadow with the active DB's, in one transaction
+
+    Only all or nothing where DDL is transactional: on MySQL every DROP and
+    CREATE commits on its own, so a failure can leave tables dropped or half
+    loaded.
+    """
+    data_format = (config.get('layers') or {}).get('data_format', 'inserts')
+    copied = recreate + reload
+    fd, path = tempfile.mkstemp(suffix=".sql", prefix="dbl_shadow_")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            sql = LayerWriter(f)
+            for t in drop + recreate:
+                sql.append(f"DROP TABLE IF EXISTS {t};")
+            # Before the creates: pg_dump output empties search_path for the rest of the file
+            for t in reload:
+                sql.append(f"DELETE FROM {t};")
+            creates = engine.dump_tables_create(active_db, recreate) if recreate else {}
+            for t in recreate:
+                sql.append(creates[t])
+            dumps = engine.spool_tables_data(active_db, copied, data_format=data_format,
+                                             columns={t: columns[t] for t in copied if t in columns})
+            for t in copied:
+                sql.append(dumps[t])
+        # The tables end up exactly as in the active DB, like a rebuild from known-good layers
+        acfg = dict(config.get('apply') or {}, transaction='single')
+        apply_layers(engine, shadow_db, [path], {**config, 'apply': acfg}, fresh=True)
+    finally:
+        os.remove(path)
+
+
+def _sync_tables(engine, config, source_db, target_db, states, schemas, scope=None):
+    """Copy the tables of target_db that differ from source_db over; False when cloning is the better deal"""
+    for key, db in (('active', source_db), ('backup', target_db)):
+        if schemas.get(key) is None:
+            schemas[key] = engine.inspect_db(db)
+        schemas[key] = scope_schema(schemas[key], scope)
+    if states.get('active') is None or states.get('backup') is None:
+        # Not get_db_states: the stored baseline may already describe the shadow-to-be
+        states['active'], states['backup'] = get_states(
+            engine, [source_db, target_db], config,
+            schemas={source_db: schemas['active'], target_db: schemas['backup']}, scope=scope)
+    recreate, reload, drop = tables_to_refresh(schemas['active'], schemas['backup'],
+                                               states['active'], states['backup'])
+    # A whole-database clone beats copying every table (not an option for a partial sandbox)
+    if not scope and len(recreate) + len(reload) >= len(schemas['active']):
+        return False
+    log(f"Copying {len(recreate) + len(reload)} of {len(schemas['active'])} tables into {target_db}"
+        f"{f', dropping {len(drop)}' if drop else ''}...", "info")
+    # The ledger is not part of the inspected schema; it is tiny, so it always goes along
+    if engine.has_table(source_db, LEDGER_TABLE):
+        recreate.append(LEDGER_TABLE)
+    else:
+        drop.append(LEDGER_TABLE)
+    _copy_tables(engine, config, source_db, target_db, recreate, reload, drop,
+                 {t: list(cols) for t, cols in schemas['active'].items()})
+    return True
+
+
+def refresh_shadow(engine, config, active_db, shadow_db, states=None, schemas=None, scope=None):
+    """Make the shadow a copy of the active DB, copying only the tables that differ
+
+    `states` and `schemas` ({'active': ..., 'backup': ...}, as filled in by
+    write_migration_sql) are reused when given. Falls back to a full clone
+    when every table differs, when `sandbox.incremental_sync` is off, or
+    when the table copy fails (e.g. a recreated table is still referenced
+    by a foreign key). A partial sandbox's shadow (`scope`) is rebuilt from
+    its tables instead of cloned.
+    """
+    states = states if states is not None else {}
+    schemas = schemas if schemas is not None else {}
+    if scope:
+        try:
+            _sync_tables(engine, config, active_db, shadow_db, states, schemas, scope)
+        except DBLError as e:
+            log(f"Table copy failed, rebuilding the partial shadow ({str(e)[:80]})", "warn")
+            create_partial_shadow(engine, config, active_db, shadow_db, scope)
+        return
+    if (config.get('sandbox') or {}).get('incremental_sync', True):
+        try:
+            if _sync_tables(engine, config, active_db, shadow_db, states, schemas):
+                return
+        except DBLError as e:
+            log(f"Table copy failed, cloning the whole DB instead ({str(e)[:80]})", "warn")
+    engine.drop_db(shadow_db)
+    engine.clone_db(active_db, shadow_db)
+
+
+def create_partial_shadow(engine, config, active_db, shadow_db, tables):
+    """Create a shadow holding only `tables` of the active DB (partial sandbox)"""
+    engine.drop_db(shadow_db)
+    engine.create_db(shadow_db)
+    ledger = [LEDGER_TABLE] if engine.has_table(active_db, LEDGER_TABLE) else []
+    _copy_tables(engine, config, active_db, shadow_db, list(tables) + ledger, [], [], {})
+
+
+def restore_partial(engine, config, meta):
+    """Put the scoped tables of the active DB back as the shadow holds them (partial rollback)
+
+    Only the tables that differ are copied; the rest of the active DB is not
+    touched. There is no clone to fall back on, so a failed copy keeps the
+    sandbox and its shadow. On PostgreSQL the copy is one transaction and
+    the active DB is left as it was; on MySQL the scoped tables may be left
+    dropped or half loaded until rollback is run again.
+    """
+    try:
+        _sync_tables(engine, config, meta['backup_db'], meta['active_db'], {}, {}, scope=meta['tables'])
+    except DBLError as e:
+        partial = "" if engine.transactional_ddl else (
+            f"\n   Las tablas del sandbox en {meta['active_db']} pueden haber quedado borradas o a medio copiar.")
+        raise DBLError(f"No se pudieron restaurar las tablas del sandbox: {e}{partial}\n"
+                       f"   El sandbox sigue activo y {meta['backup_db']} conserva el último commit; "
+                       "corrige el problema y vuelve a ejecutar 'dbl sandbox rollback'.")
+
+
+def wait_for_shadow():
+    """Block until the shadow is in sync; fail if the last sync did not finish"""
+    failed = wait_for_jobs(JOB_KIND)
+    if failed:
+        raise DBLError(f"La sincronización del shadow falló: {failed[-1].get('error')}\n"
+                       "   Ejecuta 'dbl sandbox sync' para copiar de nuevo la DB activa.")
+
+
+def clear_shadow_jobs():
+    """Forget finished sync jobs (the shadow was rebuilt or the sandbox closed)"""
+    for job in list_jobs(JOB_KIND):
+        if job["status"] != "running":
+            remove_job(job["id"])
@@ -3,11 +3,20 @@
 import os
 import json
 import hashlib
+import fnmatch
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from .constants import STATE_FILE, SANDBOX_META_FILE
-from .utils import log, run_command
+from .utils import log, stream_command
 from .errors import DBLError
 from .engines.postgres import PostgresEngine
+from .cache import (
+    DEFAULT_CACHE_SIZE, load_fingerprint_cache, save_fingerprint_cache,
+    lookup_fingerprint, store_fingerprint
+)
+from .merkle import (
+    DEFAULT_CHUNK_SIZE, DEFAULT_FANOUT, is_chunkable, build_tree, tree_root,
+    load_chunk_state, save_chunk_state
+)
 
 
 def get_target_db(config):
@@ -20,44 +29,161 @@ def get_target_db(config):
     return config['db_name'], is_sandbox
 
 
-def _process_table(engine, db_name, table, config):
+def load_sandbox_meta():
+    """Load sandbox.json (None when no sandbox is active)"""
+    if not os.path.exists(SANDBOX_META_FILE):
+        return None
+    with open(SANDBOX_META_FILE) as f:
+        return json.load(f)
+
+
+def save_sandbox_meta(meta):
+    tmp = SANDBOX_META_FILE + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, SANDBOX_META_FILE)
+
+
+def sandbox_scope(meta=None):
+    """Tables a partial sandbox covers (None for a full sandbox or no sandbox)"""
+    meta = load_sandbox_meta() if meta is None else meta
+    return (meta or {}).get('tables') or None
+
+
+def resolve_tables(patterns, tables):
+    """Expand table names and glob patterns ('sales_*') against existing tables, sorted"""
+    selected = set()
+    for pattern in patterns:
+        matches = fnmatch.filter(tables, pattern)
+        if not matches:
+            raise DBLError(f"Ninguna tabla coincide con '{pattern}'")
+        selected.update(matches)
+    return sorted(selected)
+
+
+def scope_schema(schema_dict, scope):
+    """The part of an inspected schema inside a partial sandbox's scope"""
+    if not scope:
+        return schema_dict
+    return {t: cols for t, cols in schema_dict.items() if t in scope}
+
+
+def outside_signatures(schema_dict, scope):
+    """Column-list hash of every table outside the scope, to notice DDL made there"""
+    return {t: hashlib.md5(json.dumps(cols, sort_keys=True).encode()).hexdigest()
+            for t, cols in schema_dict.items() if t not in scope}
+
+
+def scope_violations(schema_dict, meta):
+    """Tables outside a partial sandbox's scope that were added, dropped or altered since it started"""
+    scope = sandbox_scope(meta)
+    if not scope:
+        return []
+    before = meta.get('outside') or {}
+    now = outside_signatures(schema_dict, scope)
+    return sorted(t for t in set(before) | set(now) if before.get(t) != now.get(t))
+
+
+def get_fingerprint_config(engine, config):
+    """Resolve the 'fingerprint' section of dbl.yaml with engine defaults"""
+    fcfg = dict((config or {}).get('fingerprint') or {})
+    fcfg.setdefault('mode', engine.default_fingerprint_mode)
+    return fcfg
+
+
+def _server_fingerprint(engine, db_name, table, columns, mode):
+    """Compute a table hash inside the server; returns None if the engine can't"""
+    query = engine.get_fingerprint_query(table, columns=columns, mode=mode)
+    if not query:
+        return None
+    rows = engine.fetch_rows(db_name, query)
+    # CHECKSUM TABLE returns (db.table, checksum); keep only the value so clones match
+    value = rows[-1][-1].strip() if rows else ""
+    return hashlib.md5(value.encode('utf-8')).hexdigest()
+
+
+def _hash_lines(lines):
+    """Incremental MD5 of the stripped, non-empty lines joined by newlines"""
+    hasher = hashlib.md5()
+    empty = True
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if not empty:
+            hasher.update(b'\n')
+        hasher.update(line.encode('utf-8'))
+        empty = False
+    return None if empty else hasher.hexdigest()
+
+
+def _process_table(engine, db_name, table, config, columns=None, pk_cols=None):
     """Process a single table to compute its data hash"""
     try:
-        pk_cols = engine.get_primary_keys(db_name, table)
+        mode = get_fingerprint_config(engine, config)['mode']
+        if mode in ('server', 'checksum'):
+            try:
+                hash_val = _server_fingerprint(engine, db_name, table, columns, mode)
+            except Exception:
+                # Hash the rows instead: a "read_error" on both sides would compare equal
+                hash_val = None
+            if hash_val:
+                return table, hash_val, None, None
+
+        env = engine._auth_env() if isinstance(engine, PostgresEngine) else None
+        if pk_cols is None:
+            pk_cols = engine.get_primary_keys(db_name, table)
         if not pk_cols:
             try:
-                data_raw = engine.dump_table_data(db_name, table)
-                if data_raw:
-                    normalized = '\n'.join(line.strip() for line in data_raw.splitlines() if line.strip())
-                    hash_val = hashlib.md5(normalized.encode('utf-8')).hexdigest()
-                    return table, hash_val, table, None
-                else:
-                    return table, "empty", table, None
+                hash_val = _hash_lines(stream_command(engine.get_dump_table_data_cmd(db_name, table), env=env))
+                return table, hash_val or "empty", table, None
             except Exception as e:
                 return table, "read_error", table, f"{table} (fallback failed)"
         
         order_by = ', '.join(pk_cols) if pk_cols else '1'
         query = f'SELECT * FROM {table} ORDER BY {order_by}'
-        cmd = engine.execute_query(db_name, query)
-        data_raw = run_command(cmd, capture=True, 
-                              env=engine._auth_env() if isinstance(engine, PostgresEngine) else None)
         
-        # Normalize data before hashing (strip whitespace, normalize newlines)
-        normalized = '\n'.join(line.strip() for line in data_raw.splitlines() if line.strip())
-        hash_val = hashlib.md5(normalized.encode('utf-8')).hexdigest()
+        # Stream rows straight into the hasher (same digest as hashing the normalized output)
+        hash_val = _hash_lines(engine.stream_query(db_name, query)) or hashlib.md5(b'').hexdigest()
         return table, hash_val, None, None
         
     except Exception as e:
         return table, "read_error", None, f"{table} ({str(e)[:50]})"
 
 
-def get_state(engine, db_name, config, filter_tables=None):
-    """Compute current DB state for comparison"""
+def _process_table_chunks(engine, db_name, table, config, schema_cols, pk_cols=None):
+    """Hash a table as a Merkle tree of PK-range chunks; falls back to _process_table"""
+    fcfg = get_fingerprint_config(engine, config)
+    chunk_size = int(fcfg.get('chunk_size', DEFAULT_CHUNK_SIZE))
+    try:
+        if pk_cols is None:
+            pk_cols = engine.get_primary_keys(db_name, table)
+        query = None
+        if is_chunkable(pk_cols, schema_cols):
+            query = engine.get_chunk_fingerprint_query(table, pk_cols[0], list(schema_cols), chunk_size)
+        if query:
+            leaves = {}
+            for row in engine.fetch_rows(db_name, query):
+                if len(row) == 2 and row[1].strip():
+                    leaves[str(int(row[0]))] = row[1].strip()
+            root = tree_root(build_tree(leaves, int(fcfg.get('fanout', DEFAULT_FANOUT))))
+            chunk_info = {"pk": pk_cols[0], "chunk_size": chunk_size, "leaves": leaves}
+            return table, root, None, None, chunk_info
+    except Exception as e:
+        return table, "read_error", None, f"{table} ({str(e)[:50]})", None
+    return _process_table(engine, db_name, table, config, list(schema_cols), pk_cols) + (None,)
+
+
+def _plan_state(engine, db_name, config, filter_tables=None, cache_entries=None, schema_dict=None, scope=None):
+    """Inspect a database (unless its schema is given) and decide which tables still need hashing"""
     log(f"Analyzing state of: {db_name}...", "info")
     
     # 1. Schema State
     try:
-        schema_dict = engine.inspect_db(db_name)
+        if schema_dict is None:
+            schema_dict = engine.inspect_db(db_name)
+        # A partial sandbox only compares the tables it covers, schema included
+        schema_dict = scope_schema(schema_dict, scope)
         if not schema_dict:
             log(f"   WARNING: No tables detected in schema!", "warn")
             all_tables_check = engine.get_tables(db_name)
@@ -86,42 +212,216 @@ def get_state(engine, db_name, config, filter_tables=None):
         track_tables = [t for t in all_tables if t not in blacklist]
         track_tables.sort()
     
-    data_hashes = {}
-    tables_without_pk = []
-    tables_with_errors = []
+    plan = {
+        "db_name": db_name, "schema": schema_dict, "schema_hash": schema_hash, "all_tables": all_tables,
+        "data": {}, "chunks": {}, "tokens": {}, "without_pk": [], "errors": [],
+    }
+    
+    fcfg = get_fingerprint_config(engine, config)
+    fingerprint_mode = fcfg['mode']
+    use_merkle = bool(fcfg.get('merkle'))
+    if use_merkle:
+        fingerprint_mode = f"{fingerprint_mode}+merkle{int(fcfg.get('chunk_size', DEFAULT_CHUNK_SIZE))}"
+    log(f"   Schema: {len(schema_dict)} tables | Tracking: {len(track_tables)} tables | Fingerprint: {fingerprint_mode}", "info")
+    plan.update(mode=fingerprint_mode, merkle=use_merkle, cache=cache_entries)
+    plan["stored_chunks"] = load_chunk_state(db_name) if use_merkle else {}
+    
+    # Reuse cached hashes for tables whose change counters did not move
+    pending_tables = track_tables
+    if cache_entries is not None and track_tables:
+        try:
+            counters = engine.get_change_counters(db_name)
+        except Exception as e:
+            counters = {}
+            log(f"   ⚠️  Change counters unavailable, rehashing all tables ({str(e)[:50]})", "warn")
+        pending_tables = []
+        for table in track_tables:
+            if counters.get(table):
+                columns_sig = hashlib.md5(json.dumps(schema_dict[table], sort_keys=True).encode()).hexdigest()
+                plan["tokens"][table] = f"{counters[table]}/{columns_sig}"
+            cached = lookup_fingerprint(cache_entries, db_name, table, plan["tokens"].get(table), fingerprint_mode)
+            if cached:
+                plan["data"][table] = cached
+                if table in plan["stored_chunks"]:
+                    plan["chunks"][table] = plan["stored_chunks"][table]
+            else:
+                pending_tables.append(table)
+        if plan["data"]:
+            log(f"   ♻️  Reused {len(plan['data'])} cached fingerprints, hashing {len(pending_tables)} tables", "info")
+    plan["pending"] = pending_tables
     
-    log(f"   Schema: {len(schema_dict)} tables | Tracking: {len(track_tables)} tables", "info")
+    # Primary keys for every table in one catalog round trip (only row/chunk hashing needs them)
+    pk_map = {}
+    if pending_tables and (use_merkle or fcfg['mode'] == 'rows'):
+        try:
+            pk_map = engine.get_all_primary_keys(db_name)
+        except Exception as e:
+            pk_map = None
+            log(f"   ⚠️  Bulk primary-key lookup failed, using per-table lookups ({str(e)[:50]})", "warn")
+    plan["pk_map"] = pk_map
+    return plan
+
+
+def _submit_tables(executor, engine, plan, config):
+    """Queue the hashing of a plan's pending tables; returns {future: (plan, table)}"""
+    def table_pks(table):
+        return None if plan["pk_map"] is None else plan["pk_map"].get(table, [])
+
+    db_name, schema_dict = plan["db_name"], plan["schema"]
+    futures = {}
+    for table in plan["pending"]:
+        if plan["merkle"]:
+            future = executor.submit(_process_table_chunks, engine, db_name, table, config, schema_dict[table], table_pks(table))
+        else:
+            future = executor.submit(_process_table, engine, db_name, table, config, list(schema_dict[table]), table_pks(table))
+        futures[future] = (plan, table)
+    return futures
+
+
+def _record_result(plan, table, future):
+    try:
+        result = future.result()
+        result_table, hash_val, pk_issue, error = result[:4]
+        plan["data"][result_table] = hash_val
+        if len(result) > 4 and result[4]:
+            plan["chunks"][result_table] = result[4]
+        if plan["cache"] is not None:
+            store_fingerprint(plan["cache"], plan["db_name"], result_table, plan["tokens"].get(result_table), plan["mode"], hash_val)
+        if pk_issue:
+            plan["without_pk"].append(pk_issue)
+        if error:
+            plan["errors"].append(error)
+    except Exception as e:
+        plan["errors"].append(f"{table} (thread error: {str(e)[:50]})")
+        plan["data"][table] = "read_error"
+
+
+def _finish_state(plan):
+    """Persist chunk trees, report problems and build the state dict"""
+    data_hashes, chunks = plan["data"], plan["chunks"]
+    if plan["merkle"]:
+        # Keep chunk trees of tables outside this run (e.g. --tables) unless they were dropped
+        merged = {t: c for t, c in plan["stored_chunks"].items() if t in plan["all_tables"] and t not in data_hashes}
+        merged.update(chunks)
+        save_chunk_state(plan["db_name"], merged)
     
+    prefix = f"   [{plan['db_name']}]"
+    log(f"{prefix} ✓ Tracked: {len(data_hashes)} tables successfully", "info")
+    tables_without_pk, tables_with_errors = plan["without_pk"], plan["errors"]
+    if tables_without_pk:
+        log(f"{prefix} ⚠️  {len(tables_without_pk)} tables without PK (using fallback): {', '.join(tables_without_pk[:5])}{'...' if len(tables_without_pk) > 5 else ''}", "warn")
+    if tables_with_errors:
+        log(f"{prefix} ❌ {len(tables_with_errors)} tables with errors: {', '.join(tables_with_errors[:3])}{'...' if len(tables_with_errors) > 3 else ''}", "error")
+
+    state = {"schema": plan["schema_hash"], "data": data_hashes}
+    if plan["merkle"]:
+        state["chunks"] = chunks
+    return state
+
+
+def get_states(engine, db_names, config, filter_tables=None, schemas=None, scope=None):
+    """Compute the states of several databases concurrently on one worker pool
+
+    Catalog inspection of every database runs in parallel, then all of their
+    tables are hashed on the same executor, so at most engine.max_workers
+    queries are in flight whatever the number of databases. Schemas already
+    inspected by the caller can be passed as {db_name: schema}. `scope`
+    limits the states to the tables of a partial sandbox.
+    """
+    schemas = schemas or {}
     from .utils import log_progress, clear_progress
     
-    # Use multithreading for table processing
-    max_workers = min(8, len(track_tables)) if track_tables else 1  # Limit to 8 workers max
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {executor.submit(_process_table, engine, db_name, table, config): table for table in track_tables}
+    fcfg = get_fingerprint_config(engine, config)
+    # One cache dict shared by every database, saved once
+    cache_entries = load_fingerprint_cache() if fcfg.get('cache') else None
+    
+    with ThreadPoolExecutor(max_workers=engine.max_workers) as executor:
+        plans = list(executor.map(lambda db: _plan_state(engine, db, config, filter_tables, cache_entries, schemas.get(db), scope), db_names))
+        futures = {}
+        for plan in plans:
+            futures.update(_submit_tables(executor, engine, plan, config))
         
         for idx, future in enumerate(as_completed(futures), 1):
-            table = futures[future]
+            plan, table = futures[future]
             # Show progress bar (truncate table name)
             table_display = table if len(table) <= 30 else table[:27] + "..."
-            log_progress(idx, len(track_tables), "tables", f"- {table_display}")
-            
-            try:
-                result_table, hash_val, pk_issue, error = future.result()
-                data_hashes[result_table] = hash_val
-                if pk_issue:
-                    tables_without_pk.append(pk_issue)
-                if error:
-                    tables_with_errors.append(error)
-            except Exception as e:
-                tables_with_errors.append(f"{table} (thread error: {str(e)[:50]})")
-                data_hashes[table] = "read_error"
+            log_progress(idx, len(futures), "tables", f"- {table_display}")
+            _record_result(plan, table, future)
+    
+    if cache_entries is not None:
+        save_fingerprint_cache(cache_entries, int(fcfg.get('cache_size', DEFAULT_CACHE_SIZE)))
     
     # Clear progress line and show summary
     clear_progress()
-    log(f"   ✓ Tracked: {len(data_hashes)} tables successfully", "info")
-    if tables_without_pk:
-        log(f"   ⚠️  {len(tables_without_pk)} tables without PK (using fallback): {', '.join(tables_without_pk[:5])}{'...' if len(tables_without_pk) > 5 else ''}", "warn")
-    if tables_with_errors:
-        log(f"   ❌ {len(tables_with_errors)} tables with errors: {', '.join(tables_with_errors[:3])}{'...' if len(tables_with_errors) > 3 else ''}", "error")
+    return [_finish_state(plan) for plan in plans]
+
+
+def get_state(engine, db_name, config, filter_tables=None):
+    """Compute current DB state for comparison"""
+    return get_states(engine, [db_name], config, filter_tables=filter_tables)[0]
+
+
+def fingerprint_signature(engine, config):
+    """Hash of every setting that changes what get_state returns for a database"""
+    key = {
+        "engine": type(engine).__name__,
+        "fingerprint": get_fingerprint_config(engine, config),
+        "track_tables": config.get('track_tables') or [],
+        "ignore_tables": config.get('ignore_tables') or [],
+    }
+    return hashlib.md5(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _subset_state(state, filter_tables):
+    if not filter_tables:
+        return state
+    subset = {"schema": state["schema"], "data": {t: h for t, h in state["data"].items() if t in filter_tables}}
+    if "chunks" in state:
+        subset["chunks"] = {t: c for t, c in state["chunks"].items() if t in filter_tables}
+    return subset
+
+
+def store_baseline_state(engine, config, state):
+    """Record the state of the sandbox shadow DB, which does not change until the next commit"""
+    meta = load_sandbox_meta()
+    if meta is None:
+        return
+    meta['baseline'] = {"signature": fingerprint_signature(engine, config), "state": state}
+    save_sandbox_meta(meta)
+
+
+def clear_baseline_state():
+    """Forget the stored shadow baseline (the shadow DB was rebuilt)"""
+    meta = load_sandbox_meta()
+    if meta and meta.pop('baseline', None) is not None:
+        save_sandbox_meta(meta)
+
+
+def get_db_states(engine, db_names, config, filter_tables=None, schemas=None):
+    """get_states, reusing the shadow baseline stored in sandbox.json for the shadow DB
+
+    Within a partial sandbox the states cover its tables only.
+    """
+    meta = load_sandbox_meta()
+    shadow = meta.get('backup_db') if meta else None
+    scope = sandbox_scope(meta)
+    results = {}
+    if shadow in db_names:
+        baseline = meta.get('baseline')
+        if baseline and baseline.get('signature') == fingerprint_signature(engine, config):
+            log(f"♻️  Using stored fingerprints of shadow DB: {shadow}", "info")
+            results[shadow] = _subset_state(baseline['state'], filter_tables)
+    
+    pending = [db for db in db_names if db not in results]
+    if pending:
+        results.update(zip(pending, get_states(engine, pending, config, filter_tables=filter_tables,
+                                                   schemas=schemas, scope=scope)))
+        # A partial (--tables) state can't serve as the baseline for later diffs
+        if shadow in pending and not filter_tables:
+            store_baseline_state(engine, config, results[shadow])
+    return [results[db] for db in db_names]
+
 
-    return {"schema": schema_hash, "data": data_hashes}
+def get_db_state(engine, db_name, config, filter_tables=None):
+    """get_state, reusing the shadow baseline stored in sandbox.json when db_name is the shadow"""
+    return get_db_states(engine, [db_name], config, filter_tables=filter_tables)[0]
@@ -1,10 +1,17 @@
 """Utility functions for DBL"""
 
+import os
 import subprocess
+import sys
+import tempfile
 from .constants import Color
 from .errors import DBLError
 
 
+# Bytes read from a subprocess pipe at a time when streaming its output
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
 def log(msg, type="info"):
     """Log messages with color coding"""
     if type == "header": 
@@ -67,14 +74,14 @@ def confirm_action(message):
         return False
 
 
-def run_command(cmd, capture=False, env=None, show_stderr=False):
-    """Execute a shell command"""
+def run_command(cmd, capture=False, env=None, show_stderr=False, stdin=None):
+    """Execute a shell command (stdin: optional file object fed to the command)"""
     try:
         result = subprocess.run(
             cmd, shell=True, check=True, text=True,
             stdout=subprocess.PIPE if capture else None,
             stderr=subprocess.PIPE if capture else None,
-            env=env
+            env=env, stdin=stdin
         )
         if show_stderr and capture and result.stderr:
             log(f"   stderr: {result.stderr.strip()}", "warn")
@@ -85,3 +92,57 @@ def run_command(cmd, capture=False, env=None, show_stderr=False):
             log(f"   Command failed: {cmd[:100]}...", "error")
             log(f"   Error: {error_msg}", "error")
         raise DBLError(f"Failed internal command.\n   Cmd: {cmd}\n   Err: {error_msg}")
+
+
+def spawn_dbl(argv, out):
+    """Run `dbl <argv>` in a detached process writing its output to `out`
+
+    A frozen (PyInstaller) build re-runs its own executable. Otherwise the
+    package runs with -m, with its parent directory on PYTHONPATH so it is
+    found however dbl was launched (installed script, symlinked dbl.py, any
+    working directory).
+    """
+    if getattr(sys, 'frozen', False):
+        cmd = [sys.executable, *argv]
+    else:
+        cmd = [sys.executable, "-m", "dbl", *argv]
+    env = os.environ.copy()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(p for p in (root, env.get('PYTHONPATH')) if p)
+    return subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=out, stderr=subprocess.STDOUT,
+                            start_new_session=True, env=env)
+
+
+def _is_complete_line(part):
+    """True if a splitlines(keepends=True) fragment ends with a line break"""
+    return part.splitlines()[0] != part
+
+
+def stream_command(cmd, env=None, chunk_size=STREAM_CHUNK_SIZE):
+    """Execute a shell command and yield its stdout line by line in bounded memory"""
+    with tempfile.TemporaryFile() as err:
+        # stderr goes to a file so a chatty client can never block the stdout pipe
+        proc = subprocess.Popen(cmd, shell=True, text=True, stdout=subprocess.PIPE, stderr=err, env=env)
+        try:
+            pending = ""
+            while True:
+                chunk = proc.stdout.read(chunk_size)
+                if not chunk:
+                    break
+                parts = (pending + chunk).splitlines(True)
+                pending = "" if _is_complete_line(parts[-1]) else parts.pop()
+                for part in parts:
+                    yield part.splitlines()[0]
+            if pending:
+                yield pending
+            proc.stdout.close()
+            if proc.wait() != 0:
+                err.seek(0)
+                error_msg = err.read().decode('utf-8', 'replace').strip()
+                log(f"   Command failed: {cmd[:100]}...", "error")
+                log(f"   Error: {error_msg}", "error")
+                raise DBLError(f"Failed internal command.\n   Cmd: {cmd}\n   Err: {error_msg}")
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
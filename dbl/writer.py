@@ -0,0 +1,62 @@
+"""Stream migration layers to a file"""
+
+import shutil
+
+
+def is_sql_line(line):
+    """Whether a line holds SQL (not blank, not a comment)"""
+    stripped = line.strip()
+    return bool(stripped) and not stripped.startswith("--")
+
+
+def file_has_sql(path):
+    """Whether a SQL file contains any statement, scanned line by line"""
+    with open(path, encoding="utf-8") as f:
+        return any(is_sql_line(line) for line in f)
+
+
+class LayerWriter:
+    """Write-through replacement for the list the planner builds a layer in
+
+    Items are written as `"\\n".join(items)` would lay them out, so nothing is
+    kept in memory. An item may also be a readable file (a spooled dump),
+    which is copied through and closed. `has_sql` records whether any
+    statement (rather than only comments) has been written.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.has_sql = False
+        self._started = False
+
+    def _separate(self):
+        if self._started:
+            self.f.write("\n")
+        self._started = True
+
+    def append(self, item):
+        self._separate()
+        if hasattr(item, "read"):
+            self._copy(item)
+            return
+        item = item or ""
+        if not self.has_sql:
+            self.has_sql = any(is_sql_line(line) for line in item.splitlines())
+        self.f.write(item)
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def _copy(self, part):
+        try:
+            # Only scan until the first statement, then copy in blocks
+            for line in part:
+                self.f.write(line)
+                if is_sql_line(line):
+                    self.has_sql = True
+                    break
+            shutil.copyfileobj(part, self.f)
+        finally:
+            part.close()
+
@@ -36,6 +36,10 @@ setup(
     install_requires=[
         "PyYAML>=6.0",
     ],
+    extras_require={
+        "postgres": ["psycopg>=3.1"],
+        "mysql": ["PyMySQL>=1.0"],
+    },
     entry_points={
         "console_scripts": [
             "dbl=dbl.__main__:main",
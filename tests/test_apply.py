@@ -0,0 +1,211 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+from dbl.apply import apply_layers, apply_sql_file, has_copy_blocks
+from dbl.errors import DBLError
+from dbl.engines.mysql import MySQLEngine, copy_row_to_values
+from dbl.engines.postgres import PostgresEngine
+
+
+LAYER = (
+    "-- Data changed in: users\n"
+    "TRUNCATE TABLE users;\n"
+    "-- dbl:copy-begin users (id, name)\n"
+    "1\tana\n"
+    "2\t\\N\n"
+    "-- dbl:copy-end\n"
+    "UPDATE settings SET v = 1;\n"
+)
+
+
+# Stand-in for psql/mysql: echoes marker lines, records everything else, fails on FAIL
+FAKE_CLIENT = """
+import sys
+with open(sys.argv[1], "a") as log:
+    for line in sys.stdin:
+        if line.startswith("MARK "):
+            print(line[5:].strip(), flush=True)
+        elif "FAIL" in line:
+            sys.stderr.write("ERROR: statement failed")
+            sys.exit(3)
+        else:
+            log.write(line)
+"""
+
+
+def _fake_engine(base, workdir):
+    script = os.path.join(workdir, "client.py")
+    received = os.path.join(workdir, "received.sql")
+    with open(script, "w") as f:
+        f.write(FAKE_CLIENT)
+
+    class FakeEngine(base):
+        def get_apply_cmd(self, db_name):
+            return f"{sys.executable} {script} {received}"
+
+        def get_apply_marker_sql(self, token):
+            return f"MARK {token}"
+
+    return FakeEngine({'host': 'localhost', 'port': 5432, 'user': 'u', 'password': 'p'}), received
+
+
+class TestApply(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.path = self._layer("layer1.sql", LAYER)
+        self.mysql = MySQLEngine({'host': 'localhost', 'port': 3306, 'user': 'root', 'password': 'pass'})
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def _layer(self, name, body):
+        path = os.path.join(self.workdir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(body)
+        return path
+
+    def _received(self, received):
+        with open(received) as f:
+            return f.read()
+
+    @patch('dbl.apply.log')
+    def test_layers_share_one_session(self, mock_log):
+        engine, received = _fake_engine(PostgresEngine, self.workdir)
+        second = self._layer("layer2.sql", "CREATE TABLE t (id int);\n")
+
+        with patch('dbl.apply.subprocess.Popen', wraps=subprocess.Popen) as mock_popen:
+            apply_layers(engine, 'app', [self.path, second], {'apply': {'transaction': 'layer'}})
+
+        mock_popen.assert_called_once()
+        sent = self._received(received)
+        self.assertTrue(sent.startswith("SET synchronous_commit = off;\nBEGIN;\n-- Data changed in: users"))
+        self.assertIn("COMMIT;\nBEGIN;\nCREATE TABLE t (id int);\n\nRESET ALL;\nSET synchronous_commit = off;\nCOMMIT;\n", sent)
+        timings = [c[0][0] for c in mock_log.call_args_list if "✓" in c[0][0]]
+        self.assertEqual(len(timings), 2)
+        self.assertIn("layer1.sql", timings[0])
+        self.assertIn("layer2.sql", timings[1])
+
+    @patch('dbl.apply.log')
+    def test_session_is_reset_after_a_pg_dump_snapshot(self, mock_log):
+        engine, received = _fake_engine(PostgresEngine, self.workdir)
+        snapshot = self._layer("snapshot.sql", "SELECT pg_catalog.set_config('search_path', '', false);\n"
+                                               "CREATE TABLE public.users (id int);\n")
+
+        apply_layers(engine, 'app', [snapshot, self.path], ledger=[(0, "snapshot.sql", "ab"), (1, "layer1.sql", "cd")])
+
+        sent = self._received(received)
+        reset = sent.index("RESET ALL;\nSET synchronous_commit = off;\n")
+        self.assertLess(sent.index("set_config('search_path'"), reset)
+        self.assertLess(reset, sent.index("INSERT INTO public._dbl_ledger (seq, file, sha256) VALUES (0,"))
+        self.assertLess(reset, sent.index("TRUNCATE TABLE users;"))
+
+    @patch('dbl.apply.log')
+    def test_ledger_is_created_after_the_snapshot(self, mock_log):
+        engine, received = _fake_engine(PostgresEngine, self.workdir)
+        # A plain pg_dump of a DBL-managed database
+        snapshot = self._layer("snapshot.sql", "CREATE TABLE public._dbl_ledger (seq integer);\n"
+                                               "INSERT INTO public._dbl_ledger VALUES (7);\n")
+
+        apply_layers(engine, 'app', [snapshot], fresh=True, ledger=[(0, "snapshot.sql", "ab")])
+
+        sent = self._received(received)
+        setup = sent.index("CREATE TABLE IF NOT EXISTS public._dbl_ledger")
+        self.assertLess(sent.index("CREATE TABLE public._dbl_ledger"), setup)
+        self.assertLess(setup, sent.index("DELETE FROM public._dbl_ledger WHERE seq >= 0;"))
+        self.assertLess(sent.index("DELETE FROM public._dbl_ledger WHERE seq >= 0;"),
+                        sent.index("INSERT INTO public._dbl_ledger (seq, file, sha256) VALUES (0,"))
+
+    @patch('dbl.apply.log')
+    def test_ledger_rows_follow_each_layer(self, mock_log):
+        engine, received = _fake_engine(PostgresEngine, self.workdir)
+
+        apply_layers(engine, 'app', [self.path], {'apply': {'transaction': 'layer'}},
+                     ledger=[(3, "layer1.sql", "ab")])
+
+        sent = self._received(received)
+        self.assertIn("DELETE FROM public._dbl_ledger WHERE seq >= 3;", sent)
+        self.assertIn("VALUES (3, 'layer1.sql', 'ab');\nCOMMIT;\n", sent)
+
+    @patch('dbl.apply.log')
+    def test_failure_raises(self, mock_log):
+        engine, _ = _fake_engine(PostgresEngine, self.workdir)
+        broken = self._layer("broken.sql", "SELECT FAIL;\n")
+
+        with self.assertRaises(DBLError) as ctx:
+            apply_layers(engine, 'app', [broken])
+        self.assertIn("statement failed", str(ctx.exception))
+
+    def test_invalid_transaction_mode(self):
+        with self.assertRaises(DBLError):
+            apply_layers(self.mysql, 'app', [self.path], {'apply': {'transaction': 'sometimes'}})
+
+    @patch('dbl.apply.log')
+    def test_mysql_copy_blocks_are_bulk_loaded(self, mock_log):
+        engine, received = _fake_engine(MySQLEngine, self.workdir)
+        loaded = []
+        with patch.object(MySQLEngine, 'bulk_load',
+                          side_effect=lambda db, t, cols, rows: loaded.append((t, cols, rows.read()))):
+            apply_sql_file(engine, 'app', self.path, fresh=True)
+
+        self.assertTrue(has_copy_blocks(self.path))
+        self.assertEqual(loaded, [('users', ['id', 'name'], "1\tana\n2\t\\N\n")])
+        sent = self._received(received)
+        self.assertTrue(sent.startswith("SET unique_checks = 0;\nSET foreign_key_checks = 0;\n"))
+        self.assertLess(sent.index("TRUNCATE TABLE users;"), sent.index("UPDATE settings"))
+        self.assertNotIn("ana", sent)
+
+    @patch('dbl.apply.log')
+    def test_mysql_copy_blocks_inside_a_transaction(self, mock_log):
+        engine, received = _fake_engine(MySQLEngine, self.workdir)
+
+        apply_sql_file(engine, 'app', self.path, {'apply': {'transaction': 'single', 'fast_settings': False}})
+
+        sent = self._received(received)
+        self.assertTrue(sent.startswith("BEGIN;\n"))
+        self.assertIn("INSERT INTO `users` (`id`, `name`) VALUES ('1', 'ana'), ('2', NULL);", sent)
+        self.assertTrue(sent.endswith("COMMIT;\n"))
+
+    @patch('dbl.engines.mysql.run_command')
+    def test_bulk_load_falls_back_to_inserts(self, mock_run):
+        statements = []
+
+        def run(cmd, capture=False, env=None, show_stderr=False, stdin=None):
+            if 'LOAD DATA' in cmd:
+                raise DBLError("local_infile disabled")
+            statements.append(stdin.read())
+        mock_run.side_effect = run
+
+        with tempfile.TemporaryFile(mode="w+", encoding="utf-8") as rows:
+            rows.write("1\tana\n2\t\\N\n")
+            rows.seek(0)
+            self.mysql.bulk_load('app', 'users', ['id', 'name'], rows)
+
+        self.assertEqual(statements, ["INSERT INTO `users` (`id`, `name`) VALUES ('1', 'ana'), ('2', NULL);\n"])
+
+    def test_copy_row_to_values_escapes(self):
+        self.assertEqual(copy_row_to_values("a\\tb\t\\\\\tit's\n"), "('a\tb', '\\\\', 'it\\'s')")
+
+    @patch('dbl.engines.mysql.stream_command')
+    def test_mysql_dump_copy_format(self, mock_stream):
+        mock_stream.return_value = iter(["1\tana", "2\t\\N"])
+
+        dump = self.mysql.dump_table_data('app', 'users', data_format="copy", columns=['id', 'name'])
+
+        self.assertEqual(dump.splitlines(), [
+            "-- dbl:copy-begin users (id, name)", "1\tana", "2\t\\N", "-- dbl:copy-end",
+        ])
+        self.assertIn("CONCAT_WS(CHAR(9)", mock_stream.call_args[0][0])
+
+    def test_postgres_copy_format_drops_column_inserts(self):
+        engine = PostgresEngine({'host': 'localhost', 'port': 5432, 'user': 'postgres', 'password': 'pass'})
+
+        self.assertIn("--column-inserts", engine.get_dump_table_data_cmd('app', 'users'))
+        self.assertNotIn("--column-inserts", engine.get_dump_table_data_cmd('app', 'users', "copy"))
+
+
+if __name__ == '__main__':
+    unittest.main()
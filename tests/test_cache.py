@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import unittest
+from dbl.cache import (
+    load_fingerprint_cache, save_fingerprint_cache, lookup_fingerprint,
+    store_fingerprint, invalidate_fingerprint_cache
+)
+
+
+class TestFingerprintCache(unittest.TestCase):
+    def setUp(self):
+        self.old_cwd = os.getcwd()
+        self.tmp = tempfile.mkdtemp(prefix="dbl_cache_test_")
+        os.chdir(self.tmp)
+
+    def tearDown(self):
+        os.chdir(self.old_cwd)
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_roundtrip_and_token_mismatch(self):
+        entries = {}
+        store_fingerprint(entries, 'db', 'users', 'tok1', 'server', 'abc')
+        save_fingerprint_cache(entries)
+
+        entries = load_fingerprint_cache()
+        self.assertEqual(lookup_fingerprint(entries, 'db', 'users', 'tok1', 'server'), 'abc')
+        self.assertIsNone(lookup_fingerprint(entries, 'db', 'users', 'tok2', 'server'))
+        self.assertIsNone(lookup_fingerprint(entries, 'db', 'users', 'tok1', 'rows'))
+
+    def test_errors_and_missing_tokens_are_not_cached(self):
+        entries = {}
+        store_fingerprint(entries, 'db', 'users', 'tok1', 'server', 'read_error')
+        store_fingerprint(entries, 'db', 'orders', None, 'server', 'abc')
+        self.assertEqual(entries, {})
+
+    def test_lru_eviction(self):
+        entries = {}
+        for i in range(5):
+            store_fingerprint(entries, 'db', f't{i}', 'tok', 'server', 'h')
+            entries[f'db|t{i}']['used'] = i
+        save_fingerprint_cache(entries, max_entries=2)
+
+        self.assertEqual(sorted(load_fingerprint_cache()), ['db|t3', 'db|t4'])
+
+    def test_invalidate_single_db(self):
+        entries = {}
+        store_fingerprint(entries, 'db', 'users', 'tok', 'server', 'h')
+        store_fingerprint(entries, 'db_shadow', 'users', 'tok', 'server', 'h')
+        save_fingerprint_cache(entries)
+
+        invalidate_fingerprint_cache('db')
+
+        self.assertEqual(list(load_fingerprint_cache()), ['db_shadow|users'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+from dbl import checkpoints
+from dbl.checkpoints import rebuild_db, load_checkpoints, checkpoint_db_name
+
+
+class TestCheckpoints(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.registry_file = os.path.join(self.workdir, "checkpoints.json")
+        self.paths = []
+        for i in range(4):
+            path = os.path.join(self.workdir, f"layer{i}.sql")
+            with open(path, "w") as f:
+                f.write(f"CREATE TABLE t{i} (id int);\n")
+            self.paths.append(path)
+        self.config = {'db_name': 'app', 'checkpoints': {'enabled': True}}
+        self.engine = MagicMock()
+        self.engine.get_db_size.return_value = 100
+        self.engine.fetch_rows.return_value = []
+        self.engine.inspect_db.return_value = {}
+        patchers = [
+            patch('dbl.checkpoints.CHECKPOINTS_FILE', self.registry_file),
+            patch('dbl.checkpoints.DBL_DIR', self.workdir),
+            patch('dbl.checkpoints.apply_layers'),
+            patch('dbl.checkpoints.log'),
+        ]
+        mocks = [p.start() for p in patchers]
+        self.mock_apply = mocks[2]
+        for p in patchers:
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def _replayed(self):
+        return [call[0][2] for call in self.mock_apply.call_args_list]
+
+    def test_first_rebuild_replays_everything_and_stores_tip(self):
+        rebuild_db(self.engine, self.config, 'app', self.paths)
+
+        self.engine.create_db.assert_called_once_with('app')
+        self.assertEqual(self._replayed(), [self.paths])
+        entries = load_checkpoints()["entries"]
+        self.assertEqual(len(entries), 1)
+        (key, entry), = entries.items()
+        self.assertEqual(entry["db"], checkpoint_db_name('app', key))
+        self.engine.clone_db.assert_called_once_with('app', entry["db"])
+
+    def test_longest_prefix_is_restored(self):
+        rebuild_db(self.engine, self.config, 'app', self.paths[:3])
+        self.engine.reset_mock()
+        self.mock_apply.reset_mock()
+
+        rebuild_db(self.engine, self.config, 'app', self.paths)
+
+        restored = self.engine.clone_db.call_args_list[0][0]
+        self.assertEqual(restored[1], 'app')
+        self.engine.create_db.assert_not_called()
+        self.assertEqual(self._replayed(), [self.paths[3:]])
+
+    def test_exact_hit_replays_nothing(self):
+        rebuild_db(self.engine, self.config, 'app', self.paths)
+        self.mock_apply.reset_mock()
+
+        rebuild_db(self.engine, self.config, 'app', self.paths)
+
+        self.mock_apply.assert_not_called()
+
+    def test_changed_layer_misses(self):
+        rebuild_db(self.engine, self.config, 'app', self.paths)
+        with open(self.paths[0], "a") as f:
+            f.write("-- edited\n")
+        os.utime(self.paths[0], ns=(1, 1))
+        self.mock_apply.reset_mock()
+
+        rebuild_db(self.engine, self.config, 'app', self.paths)
+
+        self.assertEqual(self._replayed(), [self.paths])
+
+    def test_intermediate_checkpoints_and_lru_eviction(self):
+        config = {'db_name': 'app', 'checkpoints': {'enabled': True, 'every': 1, 'max_count': 2}}
+
+        rebuild_db(self.engine, config, 'app', self.paths)
+
+        self.assertEqual(self._replayed(), [[p] for p in self.paths])
+        entries = load_checkpoints()["entries"]
+        self.assertEqual(sorted(e["files"] for e in entries.values()), [3, 4])
+        self.assertEqual(self.engine.drop_db.call_count, 3)  # target + two evictions
+
+    def test_size_budget(self):
+        config = {'db_name': 'app', 'checkpoints': {'enabled': True, 'every': 2, 'max_size_mb': 150 / (1024 * 1024)}}
+
+        rebuild_db(self.engine, config, 'app', self.paths)
+
+        self.assertEqual([e["files"] for e in load_checkpoints()["entries"].values()], [4])
+
+    def test_unusable_checkpoint_is_discarded(self):
+        rebuild_db(self.engine, self.config, 'app', self.paths)
+        self.engine.clone_db.side_effect = checkpoints.DBLError("template missing")
+        self.mock_apply.reset_mock()
+
+        rebuild_db(self.engine, self.config, 'app', self.paths)
+
+        self.assertEqual(self._replayed(), [self.paths])
+        self.assertEqual(load_checkpoints()["entries"], {})
+
+    def test_disabled(self):
+        rebuild_db(self.engine, {'db_name': 'app', 'checkpoints': {'enabled': False}}, 'app', self.paths)
+
+        self.engine.clone_db.assert_not_called()
+        self.assertFalse(os.path.exists(self.registry_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,11 +2,14 @@ import unittest
 from unittest.mock import patch, MagicMock, mock_open
 import os
 import json
+import shutil
+import tempfile
 from dbl.commands import (
     cmd_init, cmd_version, cmd_log, cmd_branch, cmd_checkout,
     cmd_rebase, cmd_validate, cmd_reset
 )
 from dbl.constants import CONFIG_FILE, LAYERS_DIR, MANIFEST_FILE
+from dbl.errors import DBLError
 
 
 class TestCommands(unittest.TestCase):
@@ -113,9 +116,9 @@ class TestCommands(unittest.TestCase):
     @patch('dbl.commands.reset.load_config')
     @patch('dbl.commands.reset.get_engine')
     @patch('dbl.commands.reset.confirm_action')
-    @patch('dbl.commands.reset.run_command')
+    @patch('dbl.commands.reset.rebuild_db')
     @patch('dbl.commands.reset.log')
-    @patch('dbl.commands.reset.os.path.exists')
+    @patch('dbl.manifest.os.path.exists')
     def test_cmd_reset(self, mock_exists, mock_log, mock_run, mock_confirm, mock_get_engine, mock_load_config, mock_get_target, mock_load):
         mock_load.return_value = {'current': 'master', 'branches': {'master': [{'file': 'layer1.sql'}]}}
         mock_get_target.return_value = ('testdb', False)
@@ -131,18 +134,22 @@ class TestCommands(unittest.TestCase):
     @patch('dbl.commands.init.load_config')
     @patch('dbl.commands.init.get_engine')
     @patch('dbl.commands.init.confirm_action')
+    @patch('dbl.commands.init.apply_layers')
+    @patch('dbl.commands.init.layer_entries', return_value=[(0, 'snapshot.sql', 'abc')])
     @patch('dbl.commands.init.run_command')
     @patch('dbl.commands.init.log')
-    def test_cmd_import(self, mock_log, mock_run, mock_confirm, mock_get_engine, mock_load_config):
+    def test_cmd_import(self, mock_log, mock_run, mock_entries, mock_apply, mock_confirm, mock_get_engine, mock_load_config):
         from dbl.commands import cmd_import
         mock_load_config.return_value = self.config
         mock_engine = MagicMock()
+        mock_engine.inspect_db.return_value = {}
         mock_get_engine.return_value = mock_engine
         mock_confirm.return_value = True
         args = MagicMock()
         args.file = 'snapshot.sql'
         cmd_import(args)
         mock_run.assert_called()
+        mock_apply.assert_called_once()
 
     @patch('dbl.commands.sandbox.load_config')
     @patch('dbl.commands.sandbox.get_engine')
@@ -156,9 +163,38 @@ class TestCommands(unittest.TestCase):
         mock_get_engine.return_value = mock_engine
         args = MagicMock()
         args.action = 'start'
+        args.tables = None
         cmd_sandbox(args)
         mock_log.assert_called()
 
+    @patch('dbl.commands.sandbox.restore_partial', side_effect=DBLError("still referenced"))
+    @patch('dbl.commands.sandbox.wait_for_shadow')
+    @patch('dbl.commands.sandbox.load_config')
+    @patch('dbl.commands.sandbox.get_engine')
+    @patch('dbl.commands.sandbox.log')
+    def test_failed_partial_rollback_keeps_sandbox_meta(self, mock_log, mock_get_engine, mock_load_config,
+                                                        mock_wait, mock_restore):
+        from dbl.commands import cmd_sandbox
+        mock_load_config.return_value = self.config
+        mock_engine = MagicMock()
+        mock_engine.inspect_db.return_value = {'users': {'id': {}}}
+        mock_get_engine.return_value = mock_engine
+        meta = {'active_db': 'testdb', 'backup_db': 'testdb_shadow', 'tables': ['users'], 'outside': {}}
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        meta_file = os.path.join(workdir, "sandbox.json")
+        with open(meta_file, 'w') as f:
+            json.dump(meta, f)
+        args = MagicMock()
+        args.action = 'rollback'
+
+        with patch('dbl.commands.sandbox.SANDBOX_META_FILE', meta_file):
+            with self.assertRaises(DBLError):
+                cmd_sandbox(args)
+
+        self.assertTrue(os.path.exists(meta_file))
+        mock_engine.drop_db.assert_not_called()
+
     @patch('dbl.commands.log.load_manifest')
     @patch('dbl.commands.log.log')
     def test_cmd_rev_parse(self, mock_log_func, mock_load):
@@ -175,8 +211,8 @@ class TestCommands(unittest.TestCase):
     @patch('dbl.commands.branch.load_manifest')
     @patch('dbl.state.get_target_db')
     @patch('dbl.commands.branch.load_config')
-    @patch('dbl.commands.init.get_engine')
-    @patch('dbl.commands.branch.run_command')
+    @patch('dbl.commands.branch.get_engine')
+    @patch('dbl.commands.branch.apply_layers')
     @patch('dbl.commands.branch.log')
     def test_cmd_merge(self, mock_log, mock_run, mock_get_engine, mock_load_config, mock_get_target, mock_load):
         from dbl.commands import cmd_merge
@@ -0,0 +1,101 @@
+import unittest
+from unittest.mock import patch
+from dbl.engines.docker import resolve_docker_endpoint
+from dbl.engines.postgres import PostgresEngine
+from dbl.engines.mysql import MySQLEngine
+
+
+class TestDockerEndpoint(unittest.TestCase):
+    @patch('dbl.engines.docker._reachable', return_value=True)
+    @patch('dbl.engines.docker._docker_output')
+    @patch('dbl.engines.docker.shutil.which', return_value='/usr/bin/psql')
+    def test_prefers_published_port(self, mock_which, mock_output, mock_reachable):
+        mock_output.side_effect = lambda args: "0.0.0.0:15432\n[::]:15432" if args[0] == 'port' else "172.17.0.2"
+
+        self.assertEqual(resolve_docker_endpoint('pg', '5432', 'psql'), ('127.0.0.1', '15432'))
+
+    @patch('dbl.engines.docker._reachable', side_effect=lambda host, port: host == '172.17.0.2')
+    @patch('dbl.engines.docker._docker_output')
+    @patch('dbl.engines.docker.shutil.which', return_value='/usr/bin/psql')
+    def test_falls_back_to_container_ip(self, mock_which, mock_output, mock_reachable):
+        mock_output.side_effect = lambda args: "" if args[0] == 'port' else "172.17.0.2 "
+
+        self.assertEqual(resolve_docker_endpoint('pg', '5432', 'psql'), ('172.17.0.2', '5432'))
+
+    @patch('dbl.engines.docker._reachable', return_value=True)
+    @patch('dbl.engines.docker._docker_output')
+    @patch('dbl.engines.docker.shutil.which', return_value='/usr/bin/psql')
+    def test_requires_a_working_login(self, mock_which, mock_output, mock_reachable):
+        mock_output.side_effect = lambda args: "0.0.0.0:15432" if args[0] == 'port' else "172.17.0.2"
+        login = lambda host, port: host == '172.17.0.2'
+
+        self.assertEqual(resolve_docker_endpoint('pg', '5432', 'psql', login), ('172.17.0.2', '5432'))
+        self.assertIsNone(resolve_docker_endpoint('pg', '5432', 'psql', lambda host, port: False))
+
+    @patch('dbl.engines.docker._docker_output')
+    @patch('dbl.engines.docker.shutil.which', return_value=None)
+    def test_requires_host_client(self, mock_which, mock_output):
+        self.assertIsNone(resolve_docker_endpoint('pg', '5432', 'psql'))
+        mock_output.assert_not_called()
+
+
+class TestDockerDirectEngines(unittest.TestCase):
+    def setUp(self):
+        self.config = {'host': 'localhost', 'port': 5432, 'user': 'admin',
+                       'password': 'pass', 'container_name': 'pg'}
+
+    @patch('dbl.engines.base.resolve_docker_endpoint', return_value=('127.0.0.1', '15432'))
+    def test_direct_queries_keep_docker_dumps(self, mock_resolve):
+        engine = PostgresEngine(self.config)
+
+        self.assertEqual(engine.get_base_cmd('app'), 'psql -h 127.0.0.1 -p 15432 -U admin -d app -v ON_ERROR_STOP=1')
+        self.assertEqual(engine._auth_env()['PGPASSWORD'], 'pass')
+        self.assertTrue(engine.get_dump_table_data_cmd('app', 'users').startswith('docker exec pg pg_dump'))
+        engine.get_base_cmd('other')
+        mock_resolve.assert_called_once_with('pg', '5432', 'psql', engine._direct_login)
+
+    @patch('dbl.engines.base.resolve_docker_endpoint', return_value=None)
+    def test_falls_back_to_docker_exec(self, mock_resolve):
+        engine = MySQLEngine(dict(self.config, port=3306))
+
+        self.assertTrue(engine.get_base_cmd('app').startswith('docker exec -i pg mysql -hlocalhost -P3306'))
+
+    @patch('dbl.engines.docker._reachable', return_value=True)
+    @patch('dbl.engines.docker._docker_output')
+    @patch('dbl.engines.docker.shutil.which', return_value='/usr/bin/psql')
+    @patch('dbl.engines.docker.subprocess.run')
+    def test_refused_login_keeps_docker_exec(self, mock_run, mock_which, mock_output, mock_reachable):
+        # e.g. trust auth inside the container, wrong password over the network
+        mock_output.side_effect = lambda args: "0.0.0.0:15432" if args[0] == 'port' else ""
+        mock_run.return_value.returncode = 2
+        engine = PostgresEngine(self.config)
+
+        self.assertTrue(engine.get_base_cmd('app').startswith('docker exec -i pg psql -h localhost -p 5432'))
+        self.assertNotIn('PGPASSWORD', engine._auth_env())
+        argv = mock_run.call_args[0][0]
+        self.assertEqual(argv[:5], ['psql', '-h', '127.0.0.1', '-p', '15432'])
+        self.assertIn('SELECT 1', argv)
+        self.assertEqual(mock_run.call_args[1]['env']['PGPASSWORD'], 'pass')
+
+    @patch('dbl.engines.base.resolve_docker_endpoint')
+    def test_docker_direct_disabled(self, mock_resolve):
+        engine = PostgresEngine(dict(self.config, docker_direct=False))
+
+        self.assertTrue(engine.get_base_cmd('app').startswith('docker exec -i pg psql'))
+        mock_resolve.assert_not_called()
+
+    @patch('dbl.engines.mysql.run_command')
+    def test_mysql_clone_runs_inside_container(self, mock_run_command):
+        engine = MySQLEngine(dict(self.config, port=3306, docker_direct=False))
+
+        with patch('sys.stdout'):
+            engine.clone_db('app', 'app_copy')
+
+        pipeline = mock_run_command.call_args_list[-1][0][0]
+        self.assertTrue(pipeline.startswith('docker exec pg sh -c "mysqldump'))
+        self.assertIn('| mysql -hlocalhost -P3306 -uadmin -ppass app_copy"', pipeline)
+        self.assertEqual(pipeline.count('docker exec'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
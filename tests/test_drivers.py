@@ -0,0 +1,126 @@
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+from dbl.config import get_engine
+from dbl.errors import DBLError
+from dbl.engines import PostgresEngine, MySQLEngine, PostgresDriverEngine, MySQLDriverEngine
+from dbl.engines.pool import ConnectionPool
+
+
+class TestConnectionPool(unittest.TestCase):
+    def test_reuses_released_connections(self):
+        connect = MagicMock(side_effect=lambda: object())
+        pool = ConnectionPool(connect, 2)
+
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+
+        self.assertIs(first, second)
+        self.assertEqual(connect.call_count, 1)
+
+    def test_discards_connection_on_error(self):
+        conn = MagicMock()
+        pool = ConnectionPool(lambda: conn, 1)
+
+        with self.assertRaises(ValueError):
+            with pool.connection():
+                raise ValueError("boom")
+
+        conn.close.assert_called_once()
+        self.assertEqual(pool._size, 0)
+
+    def test_blocks_at_max_size(self):
+        pool = ConnectionPool(lambda: object(), 1)
+        held = pool.acquire()
+        got = []
+        waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+        waiter.start()
+        waiter.join(0.1)
+        self.assertEqual(got, [])
+
+        pool.release(held)
+        waiter.join(1)
+
+        self.assertEqual(got, [held])
+
+
+class TestDriverEngines(unittest.TestCase):
+    def setUp(self):
+        self.config = {'engine': 'postgres', 'host': 'localhost', 'port': 5432,
+                       'user': 'admin', 'password': 'pass', 'db_name': 'testdb'}
+
+    def test_get_engine_cli_when_driver_missing(self):
+        with patch.object(PostgresDriverEngine, 'available', False):
+            engine = get_engine(self.config)
+        self.assertIs(type(engine), PostgresEngine)
+
+    def test_get_engine_auto_uses_driver(self):
+        with patch.object(PostgresDriverEngine, 'available', True):
+            engine = get_engine(self.config)
+            docker = get_engine(dict(self.config, container_name='db'))
+            cli = get_engine(dict(self.config, driver='cli'))
+        self.assertIsInstance(engine, PostgresDriverEngine)
+        self.assertIs(type(docker), PostgresEngine)
+        self.assertIs(type(cli), PostgresEngine)
+
+    def test_get_engine_native_requires_driver(self):
+        with patch.object(MySQLDriverEngine, 'available', False):
+            with self.assertRaises(DBLError):
+                get_engine(dict(self.config, engine='mysql', driver='native'))
+
+    def test_postgres_rows_match_psql_output(self):
+        engine = PostgresDriverEngine(dict(self.config, fingerprint={'workers': 3}))
+        conn = MagicMock()
+        conn.cursor.return_value.stream.return_value = iter([('1', None, 't')])
+        engine._connect = MagicMock(return_value=conn)
+
+        lines = list(engine.stream_query('testdb', 'SELECT * FROM users ORDER BY id'))
+
+        self.assertEqual(lines, ['1||t'])
+        self.assertEqual(engine._pool('testdb').max_size, 3)
+
+    def test_mysql_rows_match_batch_output(self):
+        engine = MySQLDriverEngine(dict(self.config, engine='mysql'))
+        conn = MagicMock()
+        cur = conn.cursor.return_value
+        cur.description = [('TABLE_NAME',), ('COLUMN_NAME',)]
+        cur.fetchall.return_value = [('users', None), ('notes', 'a\tb\\c')]
+        engine._connect = MagicMock(return_value=conn)
+
+        rows = engine.fetch_rows('testdb', 'SELECT 1')
+
+        self.assertEqual(rows, [('users', 'NULL'), ('notes', 'a\\tb\\\\c')])
+
+    def test_driver_errors_raise_dbl_error(self):
+        class DriverError(Exception):
+            pass
+
+        engine = MySQLDriverEngine(dict(self.config, engine='mysql'))
+        conn = MagicMock()
+        conn.cursor.return_value.execute.side_effect = DriverError("syntax error")
+        engine._connect = MagicMock(return_value=conn)
+        engine._iter_rows = MagicMock(side_effect=DriverError("lost connection"))
+
+        with patch.object(MySQLDriverEngine, 'driver_error', DriverError):
+            with self.assertRaises(DBLError):
+                engine.fetch_rows('testdb', 'SELECT 1; SELECT 2')
+            with self.assertRaises(DBLError):
+                list(engine.stream_query('testdb', 'SELECT 1'))
+
+    @patch('dbl.engines.postgres.run_command')
+    def test_drop_db_closes_pool(self, mock_run_command):
+        engine = PostgresDriverEngine(self.config)
+        conn = MagicMock()
+        engine._connect = MagicMock(return_value=conn)
+        engine.fetch_rows('testdb', 'SELECT 1')
+
+        engine.drop_db('testdb')
+
+        conn.close.assert_called_once()
+        self.assertNotIn('testdb', engine._pools)
+
+
+if __name__ == '__main__':
+    unittest.main()
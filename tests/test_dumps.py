@@ -0,0 +1,141 @@
+import unittest
+from unittest.mock import patch
+from dbl.engines.postgres import PostgresEngine
+from dbl.engines.mysql import MySQLEngine
+from dbl.errors import DBLError
+
+
+PG_SCHEMA_DUMP = """SET statement_timeout = 0;
+
+--
+-- Name: orders; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.orders (
+    id integer NOT NULL,
+    user_id integer
+);
+
+--
+-- Name: users; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.users (
+    id integer NOT NULL
+);
+
+--
+-- Name: users_id_seq; Type: SEQUENCE; Schema: public; Owner: postgres
+--
+
+CREATE SEQUENCE public.users_id_seq;
+
+--
+-- Name: orders orders_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.orders ADD CONSTRAINT orders_pkey PRIMARY KEY (id);
+
+--
+-- Name: idx_buyer; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX idx_buyer ON public.orders USING btree (user_id);
+"""
+
+MYSQL_DATA_DUMP = """/*!40103 SET TIME_ZONE='+00:00' */;
+
+--
+-- Dumping data for table `orders`
+--
+
+INSERT INTO `orders` (`id`) VALUES (1);
+
+--
+-- Dumping data for table `users`
+--
+
+INSERT INTO `users` (`id`) VALUES (7);
+/*!40103 SET TIME_ZONE=@OLD_TIME_ZONE */;
+
+-- Dump completed
+"""
+
+
+class TestBatchedDumps(unittest.TestCase):
+    def setUp(self):
+        self.pg = PostgresEngine({'host': 'localhost', 'port': 5432, 'user': 'postgres', 'password': 'pass'})
+        self.mysql = MySQLEngine({'host': 'localhost', 'port': 3306, 'user': 'root', 'password': 'pass'})
+
+    @patch('dbl.engines.postgres.run_command')
+    def test_postgres_creates_in_one_dump(self, mock_run):
+        mock_run.return_value = PG_SCHEMA_DUMP
+
+        creates = self.pg.dump_tables_create('app', ['orders', 'users'])
+
+        mock_run.assert_called_once()
+        self.assertIn("--table=public.orders --table=public.users", mock_run.call_args[0][0])
+        orders, users = creates['orders'], creates['users']
+        self.assertTrue(orders.startswith("SET statement_timeout"))
+        self.assertIn("CREATE TABLE IF NOT EXISTS public.orders", orders)
+        self.assertIn("orders_pkey", orders)
+        self.assertIn("CREATE INDEX idx_buyer", orders)
+        self.assertIn("CREATE TABLE IF NOT EXISTS public.users", users)
+        self.assertIn("users_id_seq", users)
+        self.assertNotIn("orders", users)
+
+    @patch('dbl.engines.mysql.run_command')
+    def test_mysql_data_in_one_dump(self, mock_run):
+        mock_run.return_value = MYSQL_DATA_DUMP
+
+        dumps = self.mysql.dump_tables_data('app', ['orders', 'users'])
+
+        mock_run.assert_called_once()
+        self.assertTrue(mock_run.call_args[0][0].endswith("app orders users"))
+        self.assertIn("VALUES (1)", dumps['orders'])
+        self.assertNotIn("VALUES (7)", dumps['orders'])
+        for sql in dumps.values():
+            self.assertTrue(sql.startswith("/*!40103 SET TIME_ZONE='+00:00' */;"))
+            self.assertIn("SET TIME_ZONE=@OLD_TIME_ZONE", sql)
+
+    @patch('dbl.engines.mysql.stream_command')
+    def test_mysql_data_spooled_from_one_stream(self, mock_stream):
+        mock_stream.return_value = iter(MYSQL_DATA_DUMP.splitlines())
+
+        parts = self.mysql.spool_tables_data('app', ['orders', 'users'])
+
+        mock_stream.assert_called_once()
+        users = parts['users'].read()
+        self.assertIn("VALUES (7)", users)
+        self.assertNotIn("VALUES (1)", users)
+        self.assertTrue(users.rstrip().endswith("-- Dump completed"))
+        for part in parts.values():
+            part.close()
+
+    @patch('dbl.engines.postgres.run_command')
+    def test_failed_batch_falls_back_to_single_dumps(self, mock_run):
+        def run(cmd, capture=False, env=None):
+            if cmd.count("--table=") > 1:
+                raise DBLError("pg_dump failed")
+            return "INSERT INTO t VALUES (1);"
+        mock_run.side_effect = run
+
+        dumps = self.pg.dump_tables_data('app', ['a', 'b', 'c'])
+
+        self.assertEqual(sorted(dumps), ['a', 'b', 'c'])
+        self.assertEqual(mock_run.call_count, 4)
+
+    @patch('dbl.engines.mysql.MySQLEngine.dump_table_copy')
+    @patch('dbl.engines.mysql.run_command')
+    def test_mysql_copy_format_dumps_per_table(self, mock_run, mock_copy):
+        mock_copy.side_effect = lambda db, t, cols: f"-- dbl:copy-begin {t}"
+
+        dumps = self.mysql.dump_tables_data('app', ['a', 'b'], data_format="copy", columns={'a': ['id']})
+
+        mock_run.assert_not_called()
+        self.assertEqual(dumps, {'a': "-- dbl:copy-begin a", 'b': "-- dbl:copy-begin b"})
+        mock_copy.assert_any_call('app', 'a', ['id'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,286 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+import dbl
+from dbl.errors import DBLError
+from dbl.jobs import JobRun, start_job, load_job, save_job, list_jobs, wait_for_jobs
+from dbl.shadow import run_shadow_sync, wait_for_shadow, start_shadow_sync, refresh_shadow, tables_to_refresh
+from dbl.shadow import create_partial_shadow, restore_partial
+
+
+class TestJobs(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        patchers = [
+            patch('dbl.jobs.JOBS_DIR', self.workdir),
+            patch('dbl.utils.subprocess.Popen'),
+            patch('dbl.jobs.log'),
+            patch('dbl.shadow.log'),
+        ]
+        mocks = [p.start() for p in patchers]
+        for p in patchers:
+            self.addCleanup(p.stop)
+        self.mock_popen = mocks[1]
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def _sync_job(self):
+        meta = {'active_db': 'app', 'backup_db': 'app_shadow'}
+        return start_shadow_sync(meta, ['.dbl/snapshot.sql'], '.dbl/layers/master_1.sql',
+                                 {'schema': 's', 'data': {'users': 'a'}, 'chunks': {}})
+
+    def test_start_job_spawns_detached_process(self):
+        job = self._sync_job()
+
+        argv = self.mock_popen.call_args[0][0]
+        self.assertEqual(argv[-5:], ["dbl", "sandbox", "sync", "--job", job["id"]])
+        self.assertTrue(self.mock_popen.call_args[1]["start_new_session"])
+        # The package is found from any working directory, e.g. through a symlinked dbl.py
+        root = os.path.dirname(os.path.dirname(os.path.abspath(dbl.__file__)))
+        self.assertEqual(self.mock_popen.call_args[1]["env"]["PYTHONPATH"].split(os.pathsep)[0], root)
+        self.assertEqual(load_job(job["id"])["status"], "running")
+
+    def test_frozen_build_runs_its_own_executable(self):
+        with patch.object(sys, 'frozen', True, create=True), patch.object(sys, 'executable', '/opt/dbl/dbl'):
+            job = self._sync_job()
+
+        self.assertEqual(self.mock_popen.call_args[0][0], ['/opt/dbl/dbl', "sandbox", "sync", "--job", job["id"]])
+
+    def test_job_run_records_outcome(self):
+        job = self._sync_job()
+        with JobRun(load_job(job["id"])) as run:
+            run.step("applying")
+        self.assertEqual(load_job(job["id"])["status"], "done")
+
+        other = self._sync_job()
+        with self.assertRaises(DBLError):
+            with JobRun(load_job(other["id"])):
+                raise DBLError("boom")
+        self.assertEqual(load_job(other["id"])["status"], "failed")
+        self.assertEqual([j["id"] for j in wait_for_jobs("shadow-sync")], [other["id"]])
+
+    def test_silent_job_counts_as_failed(self):
+        job = self._sync_job()
+        job["heartbeat"] = time.time() - 3600
+        save_job(job)
+
+        self.assertEqual(list_jobs()[0]["status"], "failed")
+        with self.assertRaises(DBLError):
+            wait_for_shadow()
+
+    @patch('dbl.shadow.schedule_refill')
+    @patch('dbl.shadow.store_baseline_state')
+    @patch('dbl.shadow.get_states', return_value=[{'schema': 's', 'data': {'users': 'a'}}])
+    @patch('dbl.shadow.stamp_schema')
+    @patch('dbl.shadow.appendable_entries', return_value=[(1, "master_1.sql", "ab")])
+    @patch('dbl.shadow.apply_layers')
+    def test_sync_applies_layer_to_shadow(self, mock_apply, mock_entries, mock_stamp, mock_states, mock_store,
+                                          mock_refill):
+        job = self._sync_job()
+        engine = MagicMock()
+
+        run_shadow_sync(engine, {'db_name': 'app'}, job["id"])
+
+        # The baseline is measured on the shadow itself, after the layer
+        mock_states.assert_called_once_with(engine, ['app_shadow'], {'db_name': 'app'}, scope=None)
+        mock_store.assert_called_once_with(engine, {'db_name': 'app'}, {'schema': 's', 'data': {'users': 'a'}})
+        self.assertNotIn('chunks', load_job(job["id"])["payload"]["expected"])
+        args, kwargs = mock_apply.call_args
+        self.assertEqual(args[:3], (engine, 'app_shadow', ['.dbl/layers/master_1.sql']))
+        self.assertEqual(args[3]['apply']['transaction'], 'single')
+        self.assertEqual(kwargs['ledger'], [(1, "master_1.sql", "ab")])
+        engine.clone_db.assert_not_called()
+        self.assertEqual(load_job(job["id"])["status"], "done")
+
+    @patch('dbl.shadow.schedule_refill')
+    @patch('dbl.shadow.clear_baseline_state')
+    @patch('dbl.shadow.store_baseline_state')
+    @patch('dbl.shadow.refresh_shadow')
+    @patch('dbl.shadow.get_states', return_value=[{'schema': 'without-not-null', 'data': {'users': 'a'}}])
+    @patch('dbl.shadow.appendable_entries', return_value=None)
+    @patch('dbl.shadow.apply_layers')
+    def test_sync_copies_when_the_layer_falls_short(self, mock_apply, mock_entries, mock_states, mock_refresh,
+                                                    mock_store, mock_clear, mock_refill):
+        job = self._sync_job()
+        engine = MagicMock()
+
+        run_shadow_sync(engine, {'db_name': 'app'}, job["id"])
+
+        # e.g. a NOT NULL the planner only writes as a comment
+        mock_refresh.assert_called_once_with(engine, {'db_name': 'app'}, 'app', 'app_shadow', scope=None)
+        mock_store.assert_not_called()
+        mock_clear.assert_called_once()
+        self.assertEqual(load_job(job["id"])["status"], "done")
+
+    @patch('dbl.shadow.schedule_refill')
+    @patch('dbl.shadow.clear_baseline_state')
+    @patch('dbl.shadow.refresh_shadow')
+    @patch('dbl.shadow.appendable_entries', return_value=None)
+    @patch('dbl.shadow.apply_layers', side_effect=DBLError("duplicate key"))
+    def test_sync_falls_back_to_copy(self, mock_apply, mock_entries, mock_refresh, mock_clear, mock_refill):
+        job = self._sync_job()
+        engine = MagicMock()
+
+        run_shadow_sync(engine, {'db_name': 'app'}, job["id"])
+
+        mock_refresh.assert_called_once_with(engine, {'db_name': 'app'}, 'app', 'app_shadow', scope=None)
+        mock_clear.assert_called_once()
+        self.assertEqual(load_job(job["id"])["status"], "done")
+
+
+class TestRefreshShadow(unittest.TestCase):
+    SCHEMA = {'users': {'id': {}}, 'orders': {'id': {}}, 'logs': {'id': {}}}
+
+    def setUp(self):
+        patcher = patch('dbl.shadow.log')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.engine = MagicMock()
+        self.engine.dump_tables_create.side_effect = lambda db, tables: {t: f"CREATE TABLE {t} ();" for t in tables}
+        self.engine.spool_tables_data.side_effect = lambda db, tables, **kw: {t: f"-- rows of {t}" for t in tables}
+        self.engine.has_table.return_value = True
+
+    def test_tables_to_refresh(self):
+        active = dict(self.SCHEMA, orders={'id': {}, 'total': {}}, coupons={'id': {}})
+        shadow = dict(self.SCHEMA, old={'id': {}})
+        active_state = {'data': {'users': 'a', 'orders': 'b', 'logs': 'read_error', 'coupons': 'c'}}
+        shadow_state = {'data': {'users': 'a', 'orders': 'x', 'logs': 'read_error'}}
+
+        recreate, reload, drop = tables_to_refresh(active, shadow, active_state, shadow_state)
+
+        self.assertEqual(recreate, ['coupons', 'orders'])
+        self.assertEqual(reload, ['logs'])
+        self.assertEqual(drop, ['old'])
+
+    def _refresh(self, active_data, config=None):
+        schemas = {'active': self.SCHEMA, 'backup': self.SCHEMA}
+        states = {'active': {'data': active_data}, 'backup': {'data': {'users': 'a', 'orders': 'b', 'logs': 'c'}}}
+        written = []
+
+        def apply(engine, db, paths, cfg, fresh=False):
+            with open(paths[0]) as f:
+                written.append(f.read())
+            self.assertEqual(cfg['apply']['transaction'], 'single')
+
+        with patch('dbl.shadow.apply_layers', side_effect=apply) as mock_apply:
+            refresh_shadow(self.engine, config or {}, 'app', 'app_shadow', states=states, schemas=schemas)
+        return mock_apply, written
+
+    def test_copies_only_changed_tables(self):
+        mock_apply, written = self._refresh({'users': 'a', 'orders': 'changed', 'logs': 'c'})
+
+        sql = written[0]
+        self.assertIn("DELETE FROM orders;", sql)
+        self.assertIn("-- rows of orders", sql)
+        self.assertIn("DROP TABLE IF EXISTS _dbl_ledger;", sql)
+        self.assertNotIn("users", sql)
+        self.assertNotIn("logs", sql)
+        self.assertTrue(mock_apply.call_args[1]['fresh'])
+        self.engine.clone_db.assert_not_called()
+
+    def test_deletes_run_before_pg_dump_clears_search_path(self):
+        self.engine.dump_tables_create.side_effect = lambda db, tables: {
+            t: f"SELECT pg_catalog.set_config('search_path', '', false);\nCREATE TABLE public.{t} ();" for t in tables}
+
+        _, written = self._refresh({'users': 'a', 'orders': 'changed', 'logs': 'c'})
+
+        sql = written[0]
+        self.assertLess(sql.index("DELETE FROM orders;"), sql.index("set_config('search_path'"))
+        self.assertIn("CREATE TABLE public._dbl_ledger ();", sql)
+
+    def test_clones_when_every_table_changed(self):
+        mock_apply, _ = self._refresh({'users': 'x', 'orders': 'y', 'logs': 'z'})
+
+        mock_apply.assert_not_called()
+        self.engine.clone_db.assert_called_once_with('app', 'app_shadow')
+
+    def test_clones_when_copy_fails(self):
+        with patch('dbl.shadow.apply_layers', side_effect=DBLError("still referenced")) as mock_apply:
+            refresh_shadow(self.engine, {}, 'app', 'app_shadow',
+                           states={'active': {'data': {'users': 'a'}}, 'backup': {'data': {'users': 'a'}}},
+                           schemas={'active': {'users': {}, 'orders': {}}, 'backup': {'users': {}}})
+
+        mock_apply.assert_called_once()
+        self.engine.drop_db.assert_called_once_with('app_shadow')
+        self.engine.clone_db.assert_called_once_with('app', 'app_shadow')
+
+    def test_incremental_sync_can_be_disabled(self):
+        mock_apply, _ = self._refresh({'users': 'a', 'orders': 'changed', 'logs': 'c'},
+                                      config={'sandbox': {'incremental_sync': False}})
+
+        mock_apply.assert_not_called()
+        self.engine.clone_db.assert_called_once_with('app', 'app_shadow')
+
+
+    def test_partial_shadow_holds_only_scoped_tables(self):
+        with patch('dbl.shadow.apply_layers') as mock_apply:
+            create_partial_shadow(self.engine, {}, 'app', 'app_shadow', ['users'])
+
+        self.engine.create_db.assert_called_once_with('app_shadow')
+        self.engine.clone_db.assert_not_called()
+        self.assertEqual(self.engine.dump_tables_create.call_args[0], ('app', ['users', '_dbl_ledger']))
+        self.assertEqual(mock_apply.call_args[0][1], 'app_shadow')
+
+    def test_partial_refresh_never_clones(self):
+        schemas = {'active': self.SCHEMA, 'backup': {'users': self.SCHEMA['users']}}
+        states = {'active': {'data': {'users': 'changed'}}, 'backup': {'data': {'users': 'a'}}}
+        written = []
+
+        def apply(engine, db, paths, cfg, fresh=False):
+            with open(paths[0]) as f:
+                written.append(f.read())
+
+        with patch('dbl.shadow.apply_layers', side_effect=apply):
+            refresh_shadow(self.engine, {}, 'app', 'app_shadow', states=states, schemas=schemas, scope=['users'])
+
+        self.engine.clone_db.assert_not_called()
+        self.assertIn("DELETE FROM users;", written[0])
+        self.assertNotIn("orders", written[0])
+
+    def test_restore_partial_copies_back_into_active_db(self):
+        self.engine.inspect_db.side_effect = lambda db: {'users': {'id': {}, 'note': {}}} if db == 'app' else {'users': {'id': {}}}
+        meta = {'active_db': 'app', 'backup_db': 'app_shadow', 'tables': ['users']}
+
+        with patch('dbl.shadow.get_states', return_value=[{'data': {}}, {'data': {}}]), \
+             patch('dbl.shadow.apply_layers') as mock_apply:
+            restore_partial(self.engine, {}, meta)
+
+        self.assertEqual(mock_apply.call_args[0][1], 'app')
+        self.assertEqual(self.engine.dump_tables_create.call_args[0], ('app_shadow', ['users', '_dbl_ledger']))
+
+    def test_failed_partial_restore_keeps_the_sandbox(self):
+        meta = {'active_db': 'app', 'backup_db': 'app_shadow', 'tables': ['users']}
+        self.engine.inspect_db.return_value = {'users': {'id': {}}}
+
+        with patch('dbl.shadow.get_states', return_value=[{'data': {}}, {'data': {}}]), \
+             patch('dbl.shadow.apply_layers', side_effect=DBLError("still referenced")):
+            with self.assertRaises(DBLError) as ctx:
+                restore_partial(self.engine, {}, meta)
+
+        self.assertIn("app_shadow", str(ctx.exception))
+        self.assertNotIn("a medio copiar", str(ctx.exception))
+        self.engine.drop_db.assert_not_called()
+        self.engine.clone_db.assert_not_called()
+
+    def test_failed_partial_restore_warns_without_transactional_ddl(self):
+        # MySQL: the DROP/CREATE already committed when the copy failed
+        meta = {'active_db': 'app', 'backup_db': 'app_shadow', 'tables': ['users']}
+        self.engine.inspect_db.return_value = {'users': {'id': {}}}
+        self.engine.transactional_ddl = False
+
+        with patch('dbl.shadow.get_states', return_value=[{'data': {}}, {'data': {}}]), \
+             patch('dbl.shadow.apply_layers', side_effect=DBLError("duplicate key")):
+            with self.assertRaises(DBLError) as ctx:
+                restore_partial(self.engine, {}, meta)
+
+        self.assertIn("a medio copiar", str(ctx.exception))
+        self.assertIn("dbl sandbox rollback", str(ctx.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+from dbl.checkpoints import rebuild_db, layer_entries, appendable_entries, load_checkpoints
+from dbl.constants import LEDGER_TABLE
+from dbl.engines.mysql import MySQLEngine
+from dbl.engines.postgres import PostgresEngine
+from dbl.ledger import common_prefix, applied_prefix, schema_hash, ledger_setup_sql, ledger_insert_sql, record_layers
+
+
+class TestLedger(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.paths = []
+        for i in range(4):
+            path = os.path.join(self.workdir, f"layer{i}.sql")
+            with open(path, "w") as f:
+                f.write(f"CREATE TABLE t{i} (id int);\n")
+            self.paths.append(path)
+        self.entries = layer_entries({"files": {}}, self.paths)
+        self.engine = MagicMock()
+        self.engine.ledger_table = LEDGER_TABLE
+        self.engine.get_db_size.return_value = 100
+        self.engine.inspect_db.return_value = {"t0": {"id": {"type": "integer"}}}
+        self.engine.fetch_rows.return_value = []
+        patchers = [
+            patch('dbl.checkpoints.CHECKPOINTS_FILE', os.path.join(self.workdir, "checkpoints.json")),
+            patch('dbl.checkpoints.DBL_DIR', self.workdir),
+            patch('dbl.checkpoints.apply_layers'),
+            patch('dbl.checkpoints.log'),
+            patch('dbl.ledger.log'),
+        ]
+        mocks = [p.start() for p in patchers]
+        self.mock_apply = mocks[2]
+        for p in patchers:
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def _ledger(self, count, schema=None):
+        """Make the engine report a ledger holding the first `count` files"""
+        schema = schema_hash(self.engine, 'app') if schema is None else schema
+        rows = [(str(seq), name, sha, "") for seq, name, sha in self.entries[:count]]
+        rows[-1] = rows[-1][:3] + (schema,)
+        self.engine.fetch_rows.side_effect = lambda db, q: rows if q.startswith("SELECT seq") else []
+
+    def test_common_prefix(self):
+        applied = [(0, "layer0.sql", self.entries[0][2], ""), (1, "other.sql", "x", "")]
+
+        self.assertEqual(common_prefix(applied, self.entries), 1)
+        self.assertEqual(common_prefix([], self.entries), 0)
+
+    def test_applied_prefix_rejects_extra_rows_and_schema_drift(self):
+        self._ledger(2)
+        self.assertEqual(applied_prefix(self.engine, 'app', self.entries), 2)
+        self.assertIsNone(applied_prefix(self.engine, 'app', self.entries[:1]))
+
+        self._ledger(2, schema="stale")
+        self.assertIsNone(applied_prefix(self.engine, 'app', self.entries))
+
+    def test_reset_applies_only_missing_layers(self):
+        self._ledger(2)
+
+        rebuild_db(self.engine, {'db_name': 'app'}, 'app', self.paths)
+
+        self.engine.drop_db.assert_not_called()
+        self.mock_apply.assert_called_once()
+        args, kwargs = self.mock_apply.call_args
+        self.assertEqual(args[2], self.paths[2:])
+        self.assertEqual(kwargs['ledger'], self.entries[2:])
+        self.assertFalse(kwargs.get('fresh', False))
+
+    def test_up_to_date_does_nothing(self):
+        self._ledger(4)
+
+        rebuild_db(self.engine, {'db_name': 'app'}, 'app', self.paths)
+
+        self.engine.drop_db.assert_not_called()
+        self.mock_apply.assert_not_called()
+
+    def test_diverged_ledger_rebuilds(self):
+        self._ledger(3)
+        with open(self.paths[2], "a") as f:
+            f.write("-- rewritten\n")
+
+        rebuild_db(self.engine, {'db_name': 'app'}, 'app', self.paths)
+
+        self.engine.drop_db.assert_called_with('app')
+        args, kwargs = self.mock_apply.call_args
+        self.assertEqual(args[2], self.paths)
+        self.assertTrue(kwargs['fresh'])
+        self.assertEqual([e[1] for e in kwargs['ledger']], [os.path.basename(p) for p in self.paths])
+
+    def test_full_skips_the_ledger(self):
+        self._ledger(2)
+
+        rebuild_db(self.engine, {'db_name': 'app'}, 'app', self.paths, full=True)
+
+        self.engine.drop_db.assert_called_with('app')
+        self.assertEqual(self.mock_apply.call_args[0][2], self.paths)
+
+    def test_appendable_entries(self):
+        self._ledger(2)
+
+        entries = appendable_entries(self.engine, 'app', self.paths[:2], self.paths[2:])
+
+        self.assertEqual([e[0] for e in entries], [2, 3])
+        self.assertIsNone(appendable_entries(self.engine, 'app', self.paths[:3], self.paths[3:]))
+        self.assertIn(self.paths[0], load_checkpoints()["files"])
+
+    def test_ledger_sql(self):
+        mysql = MySQLEngine({'host': 'localhost', 'port': 3306, 'user': 'root', 'password': 'pass'})
+        postgres = PostgresEngine({'host': 'localhost', 'port': 5432, 'user': 'postgres', 'password': 'pass'})
+
+        self.assertIn(f"DELETE FROM {LEDGER_TABLE} WHERE seq >= 2;", ledger_setup_sql(mysql, 2))
+        self.assertEqual(ledger_insert_sql(mysql, 1, "it's.sql", "ab"),
+                         f"INSERT INTO {LEDGER_TABLE} (seq, file, sha256) VALUES (1, 'it''s.sql', 'ab');\n")
+        # pg_dump snapshots leave search_path empty
+        self.assertIn(f"DELETE FROM public.{LEDGER_TABLE} WHERE seq >= 2;", ledger_setup_sql(postgres, 2))
+        self.assertTrue(ledger_insert_sql(postgres, 1, "a.sql", "ab").startswith(f"INSERT INTO public.{LEDGER_TABLE} "))
+
+    def test_record_layers_sends_one_statement_per_query(self):
+        record_layers(self.engine, 'app', self.entries[2:])
+
+        queries = [c[0][1] for c in self.engine.fetch_rows.call_args_list]
+        self.assertTrue(queries[0].startswith(f"CREATE TABLE IF NOT EXISTS {LEDGER_TABLE} "))
+        self.assertEqual(queries[1], f"DELETE FROM {LEDGER_TABLE} WHERE seq >= 2;")
+        self.assertEqual([q.split(" VALUES ")[1] for q in queries[2:4]],
+                         [f"(2, 'layer2.sql', '{self.entries[2][2]}');", f"(3, 'layer3.sql', '{self.entries[3][2]}');"])
+        self.assertTrue(queries[4].startswith(f"UPDATE {LEDGER_TABLE} SET schema_hash"))
+        self.assertTrue(all(q.count(";") == 1 for q in queries))
+
+
+if __name__ == '__main__':
+    unittest.main()
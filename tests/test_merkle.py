@@ -0,0 +1,39 @@
+import unittest
+from dbl.merkle import build_tree, tree_root, diff_buckets, bucket_ranges, changed_ranges, is_chunkable
+
+
+class TestMerkle(unittest.TestCase):
+    def setUp(self):
+        self.leaves = {str(i): f"{i}:1:2" for i in range(300)}
+
+    def test_identical_trees_have_same_root(self):
+        self.assertEqual(tree_root(build_tree(self.leaves)), tree_root(build_tree(dict(self.leaves))))
+
+    def test_diff_finds_changed_added_and_removed_buckets(self):
+        other = dict(self.leaves)
+        other['17'] = "changed"
+        other['400'] = "added"
+        del other['5']
+
+        self.assertEqual(diff_buckets(self.leaves, other), [5, 17, 400])
+
+    def test_bucket_ranges_merge_adjacent(self):
+        self.assertEqual(bucket_ranges([3, 4, 9], 100), [(300, 499), (900, 999)])
+
+    def test_changed_ranges_requires_matching_layout(self):
+        a = {"pk": "id", "chunk_size": 100, "leaves": {"0": "a", "1": "b"}}
+        b = {"pk": "id", "chunk_size": 100, "leaves": {"0": "a", "1": "c"}}
+
+        self.assertEqual(changed_ranges(a, b), [(100, 199)])
+        self.assertIsNone(changed_ranges(a, dict(b, chunk_size=50)))
+        self.assertIsNone(changed_ranges(a, None))
+
+    def test_is_chunkable(self):
+        cols = {'id': {'type': 'integer'}, 'code': {'type': 'character varying'}}
+        self.assertTrue(is_chunkable(['id'], cols))
+        self.assertFalse(is_chunkable(['code'], cols))
+        self.assertFalse(is_chunkable(['id', 'code'], cols))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+from unittest.mock import patch
+from dbl.engines.mysql import MySQLEngine
+
+
+class TestMySQLEngine(unittest.TestCase):
+    def setUp(self):
+        self.config = {
+            'db_name': 'testdb',
+            'engine': 'mysql',
+            'host': 'localhost',
+            'port': 3306,
+            'user': 'root',
+            'password': 'pass',
+        }
+        self.engine = MySQLEngine(self.config)
+
+    @patch('dbl.engines.mysql.run_command')
+    def test_get_tables(self, mock_run_command):
+        mock_run_command.return_value = "users\nproducts\n"
+
+        tables = self.engine.get_tables('testdb')
+
+        self.assertEqual(tables, ['users', 'products'])
+
+    @patch('dbl.engines.mysql.run_command')
+    def test_replace_db_renames_tables(self, mock_run_command):
+        def run(cmd, capture=False, **kwargs):
+            if "TABLE_TYPE <> 'BASE TABLE'" in cmd:
+                return "0"
+            if "SELECT TABLE_SCHEMA, TABLE_NAME" in cmd:
+                return "app\tusers\napp_shadow\tusers\napp_shadow\torders"
+            return ""
+        mock_run_command.side_effect = run
+
+        self.engine.replace_db('app_shadow', 'app')
+
+        cmds = [c[0][0] for c in mock_run_command.call_args_list]
+        rename = next(c for c in cmds if "RENAME TABLE" in c)
+        self.assertRegex(rename, r"RENAME TABLE app\.users TO app_dbl_old_\d+\.users, "
+                                 r"app_shadow\.users TO app\.users, app_shadow\.orders TO app\.orders;")
+        self.assertEqual(len([c for c in cmds if "DROP DATABASE" in c]), 2)
+
+    @patch('dbl.engines.mysql.run_command')
+    def test_replace_db_with_views_copies(self, mock_run_command):
+        mock_run_command.return_value = "1"
+
+        with patch.object(MySQLEngine, 'clone_db') as mock_clone:
+            self.engine.replace_db('app_shadow', 'app')
+
+        mock_clone.assert_called_once_with('app_shadow', 'app')
+        self.assertFalse(any("RENAME TABLE" in c[0][0] for c in mock_run_command.call_args_list))
+
+    def test_fingerprint_query_aggregate(self):
+        query = self.engine.get_fingerprint_query('users', columns=['id', 'order'])
+
+        self.assertIn('BIT_XOR', query)
+        # Reserved words are valid column names once quoted
+        self.assertIn("CONCAT_WS(',', QUOTE(`id`), QUOTE(`order`))", query)
+        self.assertIn('FROM `users`', query)
+        self.assertNotIn('ORDER BY', query)
+
+    @patch('dbl.engines.mysql.os.name', 'posix')
+    @patch('dbl.engines.mysql.run_command')
+    def test_shell_queries_escape_backticks(self, mock_run_command):
+        self.engine.dump_table_rows('testdb', 'users', 'id BETWEEN 1 AND 2', ['id', 'key'])
+
+        self.assertIn("QUOTE(\\`key\\`)", mock_run_command.call_args[0][0])
+
+    def test_fingerprint_query_checksum(self):
+        self.assertEqual(self.engine.get_fingerprint_query('users', mode='checksum'), "CHECKSUM TABLE `users`;")
+
+    def test_fingerprint_query_needs_columns(self):
+        self.assertIsNone(self.engine.get_fingerprint_query('users'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import io
+import unittest
+from unittest.mock import patch, MagicMock
+from dbl.planner import generate_migration_sql
+from dbl.engines.postgres import PostgresEngine
+
+
+class TestPlanner(unittest.TestCase):
+    def setUp(self):
+        self.config = {'engine': 'postgres', 'track_tables': [], 'ignore_tables': []}
+        self.engine = MagicMock(spec=PostgresEngine)
+        schema = {'users': {'id': {'type': 'integer', 'nullable': False}}}
+        self.engine.inspect_db.side_effect = lambda db: dict(schema)
+        self.engine.spool_tables_data.side_effect = lambda db, tables, **kw: {
+            t: io.StringIO(f"INSERT INTO {t} VALUES (1);") for t in tables}
+        self.engine.get_all_primary_keys.return_value = {}
+        self.engine.qualified_table.side_effect = lambda t: f"public.{t}"
+
+    @patch('dbl.planner.get_db_states')
+    def test_inspects_and_hashes_each_db_once(self, mock_states):
+        mock_states.return_value = [{'schema': 's', 'data': {'users': 'new'}},
+                                    {'schema': 's', 'data': {'users': 'old'}}]
+        states = {}
+
+        sql = generate_migration_sql(self.config, self.engine, 'app', 'app_shadow', include_data=True, states=states)
+
+        self.assertEqual(self.engine.inspect_db.call_count, 2)
+        mock_states.assert_called_once()
+        self.assertEqual(set(mock_states.call_args[1]['schemas']), {'app', 'app_shadow'})
+        self.assertIn("TRUNCATE TABLE public.users;", sql)
+        self.assertEqual(states['active']['data'], {'users': 'new'})
+
+    @patch('dbl.planner.get_db_states')
+    def test_reuses_precomputed_results(self, mock_states):
+        schema = {'users': {'id': {'type': 'integer', 'nullable': False}}}
+        states = {'active': {'schema': 's', 'data': {'users': 'new'}},
+                  'backup': {'schema': 's', 'data': {'users': 'old'}}}
+
+        sql = generate_migration_sql(self.config, self.engine, 'app', 'app_shadow', include_data=False,
+                                     states=states, schemas={'active': schema, 'backup': schema})
+
+        self.engine.inspect_db.assert_not_called()
+        mock_states.assert_not_called()
+        self.assertIn("--   users", sql)
+
+    @patch('dbl.planner.get_db_states')
+    def test_row_diff_replaces_truncate(self, mock_states):
+        engine = PostgresEngine(self.config)
+        schema = {'users': {'id': {'type': 'integer', 'nullable': False}, 'name': {'type': 'text', 'nullable': True}}}
+        rows = {
+            'app': ['[1]\t{"id":1,"name":"a"}', '[2]\t{"id":2,"name":"B"}', '[4]\t{"id":4,"name":"d"}'],
+            'app_shadow': ['[1]\t{"id":1,"name":"a"}', '[2]\t{"id":2,"name":"b"}', '[3]\t{"id":3,"name":"c"}'],
+        }
+        mock_states.return_value = [{'schema': 's', 'data': {'users': 'new'}},
+                                    {'schema': 's', 'data': {'users': 'old'}}]
+        with patch.object(PostgresEngine, 'inspect_db', return_value=schema), \
+             patch.object(PostgresEngine, 'get_all_primary_keys', return_value={'users': ['id']}), \
+             patch.object(PostgresEngine, 'get_generated_columns', return_value=[]), \
+             patch.object(PostgresEngine, 'stream_query', side_effect=lambda db, query: iter(rows[db])):
+            sql = generate_migration_sql(self.config, engine, 'app', 'app_shadow', include_data=True)
+
+        self.assertNotIn("TRUNCATE TABLE", sql)
+        self.assertIn("-- Changed rows: 3", sql)
+        # Qualified: the layer may hold pg_dump output, which empties search_path
+        self.assertIn("DELETE FROM public.users WHERE (id) = (SELECT id FROM json_populate_record(NULL::public.users, '{\"id\":3,\"name\":\"c\"}'));", sql)
+        self.assertIn("ON CONFLICT (id) DO UPDATE SET name = EXCLUDED.name;", sql)
+        self.assertEqual(sql.count("INSERT INTO public.users (id, name) OVERRIDING SYSTEM VALUE SELECT id, name "
+                                   "FROM json_populate_record(NULL::public.users, "), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+from dbl import pool
+from dbl.pool import claim_shadow, refill_pool, schedule_refill, load_pool, save_pool
+
+
+class TestSandboxPool(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.config = {'db_name': 'app', 'sandbox': {'pool_size': 2}}
+        self.engine = MagicMock()
+        self.head = ("head-1", [(0, "snapshot.sql", "aa")])
+        self.at_head = {'app': True}
+        patchers = [
+            patch('dbl.pool.POOL_FILE', os.path.join(self.workdir, "pool.json")),
+            patch('dbl.pool.POOL_LOCK', os.path.join(self.workdir, "pool.json.lock")),
+            patch('dbl.pool.POOL_LOG', os.path.join(self.workdir, "pool.log")),
+            patch('dbl.pool.DBL_DIR', self.workdir),
+            patch('dbl.pool.branch_head', side_effect=lambda: self.head),
+            patch('dbl.pool._at_head', side_effect=lambda engine, db, entries: self.at_head.get(db, False)),
+            patch('dbl.pool.load_checkpoints', return_value={"entries": {}, "files": {}}),
+            patch('dbl.pool.log'),
+        ]
+        for p in patchers:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def _members(self):
+        return [(m["db"], m["head"]) for m in load_pool()["members"]]
+
+    def test_refill_clones_missing_members(self):
+        self.at_head['app_ckpt_abc'] = True
+        with patch('dbl.pool.load_checkpoints', return_value={"entries": {"head-1": {"db": "app_ckpt_abc"}}}):
+            refill_pool(self.engine, self.config)
+
+        members = self._members()
+        self.assertEqual(len(members), 2)
+        self.assertTrue(all(head == "head-1" and db.startswith("app_dbl_shadow_") for db, head in members))
+        self.assertEqual([c[0][0] for c in self.engine.clone_db.call_args_list], ['app_ckpt_abc', 'app_ckpt_abc'])
+
+    def test_refill_never_copies_a_database_in_use(self):
+        self.at_head['app_shadow'] = True
+        refill_pool(self.engine, self.config)
+
+        self.engine.clone_db.assert_not_called()
+        self.assertEqual(self._members(), [])
+
+    def test_head_change_invalidates_members(self):
+        save_pool({"members": [{"db": "app_dbl_shadow_old", "head": "head-0", "created": 0}]})
+
+        self.assertIsNone(claim_shadow(self.engine, self.config, 'app'))
+        refill_pool(self.engine, self.config)
+
+        self.engine.drop_db.assert_called_once_with('app_dbl_shadow_old')
+        self.assertNotIn('app_dbl_shadow_old', [db for db, _ in self._members()])
+
+    def test_claim_takes_a_member(self):
+        save_pool({"members": [{"db": "app_dbl_shadow_1", "head": "head-1", "created": 0},
+                               {"db": "app_dbl_shadow_2", "head": "head-1", "created": 0}]})
+
+        self.assertEqual(claim_shadow(self.engine, self.config, 'app'), 'app_dbl_shadow_1')
+        self.assertEqual(self._members(), [("app_dbl_shadow_2", "head-1")])
+        self.engine.clone_db.assert_not_called()
+
+    def test_drifted_database_is_not_served_from_the_pool(self):
+        save_pool({"members": [{"db": "app_dbl_shadow_1", "head": "head-1", "created": 0}]})
+        self.at_head['app'] = False
+
+        self.assertIsNone(claim_shadow(self.engine, self.config, 'app'))
+        self.assertEqual(len(self._members()), 1)
+
+    def test_refill_runs_in_background_only_when_configured(self):
+        with patch('dbl.utils.subprocess.Popen') as mock_popen:
+            schedule_refill({'db_name': 'app'})
+            mock_popen.assert_not_called()
+
+            schedule_refill(self.config)
+
+        argv = mock_popen.call_args[0][0]
+        self.assertEqual(argv[-3:], ["dbl", "sandbox", "pool"])
+        self.assertTrue(mock_popen.call_args[1]["start_new_session"])
+
+    def test_stale_lock_is_broken(self):
+        open(pool.POOL_LOCK, "w").close()
+        with patch('dbl.pool.LOCK_TIMEOUT', 0):
+            save_pool({"members": [{"db": "app_dbl_shadow_1", "head": "head-1", "created": 0}]})
+            claim_shadow(self.engine, self.config, 'app')
+
+        self.assertFalse(os.path.exists(pool.POOL_LOCK))
+        self.assertEqual(self._members(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 import unittest
 from unittest.mock import patch
 from dbl.engines.postgres import PostgresEngine
+from dbl.errors import DBLError
 
 
 class TestPostgresEngine(unittest.TestCase):
@@ -36,6 +37,61 @@ class TestPostgresEngine(unittest.TestCase):
 
         self.assertEqual(tables, ['users', 'products'])
 
+    @patch('dbl.engines.postgres.run_command')
+    def test_get_all_primary_keys_single_query_cached(self, mock_run_command):
+        mock_run_command.return_value = "orders|id\norder_items|order_id\norder_items|line\n"
+
+        first = self.engine.get_all_primary_keys('testdb')
+        second = self.engine.get_all_primary_keys('testdb')
+
+        self.assertEqual(first, {'orders': ['id'], 'order_items': ['order_id', 'line']})
+        self.assertIs(first, second)
+        self.assertEqual(mock_run_command.call_count, 1)
+
+
+    @patch('dbl.engines.postgres.run_command')
+    def test_replace_db_swaps_by_rename(self, mock_run_command):
+        self.engine.replace_db('app_shadow', 'app')
+
+        cmds = [c[0][0] for c in mock_run_command.call_args_list]
+        swap = next(c for c in cmds if "RENAME TO" in c)
+        self.assertRegex(swap, r"BEGIN; ALTER DATABASE app RENAME TO app_dbl_old_\d+; ALTER DATABASE app_shadow RENAME TO app; COMMIT;")
+        self.assertLess(cmds.index(swap), next(i for i, c in enumerate(cmds) if "DROP DATABASE" in c))
+        self.assertFalse(any("TEMPLATE" in c for c in cmds))
+
+    @patch('dbl.engines.postgres.time.sleep')
+    @patch('dbl.engines.postgres.run_command')
+    def test_replace_db_falls_back_to_copy(self, mock_run_command, mock_sleep):
+        def run(cmd, **kwargs):
+            if "RENAME TO" in cmd:
+                raise DBLError("database is being accessed by other users")
+        mock_run_command.side_effect = run
+
+        with patch.object(PostgresEngine, 'clone_db') as mock_clone:
+            self.engine.replace_db('app_shadow', 'app')
+
+        mock_clone.assert_called_once_with('app_shadow', 'app')
+
+
+    @patch('dbl.engines.postgres.run_command')
+    def test_change_counters_wait_for_other_clients_to_flush(self, mock_run_command):
+        mock_run_command.return_value = "users|1/2/3/4/5\n"
+
+        self.assertEqual(self.engine.get_change_counters('testdb'), {'users': '1/2/3/4/5'})
+        query = mock_run_command.call_args[0][0]
+        self.assertIn("pg_stat_activity", query)
+        self.assertIn("application_name <> 'dbl'", query)
+        self.assertEqual(self.engine._auth_env()['PGAPPNAME'], 'dbl')
+
+    @patch('dbl.engines.postgres.run_command')
+    def test_dump_table_rows_skips_generated_columns(self, mock_run_command):
+        mock_run_command.return_value = ""
+        with patch.object(PostgresEngine, 'get_generated_columns', return_value=['total']):
+            self.engine.dump_table_rows('testdb', 'items', 'id BETWEEN 1 AND 9', ['id', 'qty', 'total'])
+
+        self.assertIn("INSERT INTO public.items (id, qty) OVERRIDING SYSTEM VALUE SELECT id, qty "
+                      "FROM json_populate_record(NULL::public.items, %L);", mock_run_command.call_args[0][0])
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,62 @@
+import unittest
+from unittest.mock import patch
+from dbl import rowdiff
+from dbl.rowdiff import external_sort, merge_join, diff_table_rows
+from dbl.engines.mysql import MySQLEngine
+from dbl.engines.postgres import PostgresEngine
+
+
+class TestRowDiff(unittest.TestCase):
+    def test_external_sort_spills_runs(self):
+        pairs = [(str(k), f"row{k}") for k in [5, 3, 9, 1, 7, 2, 8]]
+
+        with patch('dbl.rowdiff._spill', wraps=rowdiff._spill) as mock_spill:
+            result = list(external_sort(pairs, run_size=2))
+
+        self.assertEqual(result, sorted(pairs))
+        self.assertEqual(mock_spill.call_count, 3)
+
+    def test_merge_join(self):
+        old = [('1', 'a'), ('2', 'b'), ('3', 'c')]
+        new = [('1', 'a'), ('2', 'B'), ('4', 'd')]
+
+        self.assertEqual(list(merge_join(old, new)), [
+            ('update', '2', 'B'), ('delete', '3', 'c'), ('insert', '4', 'd'),
+        ])
+
+    def test_mysql_statements(self):
+        engine = MySQLEngine({'host': 'localhost', 'port': 3306, 'user': 'root', 'password': 'pass'})
+        rows = {
+            'app': ["1\t1, 'x\\ty'", "2\t2, NULL"],
+            'app_shadow': ["1\t1, 'old'", "3\t3, 'gone'"],
+        }
+        with patch.object(MySQLEngine, 'stream_query', side_effect=lambda db, query: iter(rows[db])), \
+             patch.object(MySQLEngine, 'get_generated_columns', return_value=[]):
+            sql = list(diff_table_rows(engine, 'app', 'app_shadow', 'notes', ['id'], ['id', 'body'], ['id', 'body'],
+                                       run_size=1))
+
+        self.assertEqual(sql, [
+            "INSERT INTO `notes` (`id`, `body`) VALUES (1, 'x\ty') ON DUPLICATE KEY UPDATE `body` = VALUES(`body`);",
+            "INSERT INTO `notes` (`id`, `body`) VALUES (2, NULL) ON DUPLICATE KEY UPDATE `body` = VALUES(`body`);",
+            "DELETE FROM `notes` WHERE (`id`) = (3);",
+        ])
+
+    def test_generated_columns_are_left_out(self):
+        engine = PostgresEngine({'host': 'localhost', 'port': 5432, 'user': 'postgres', 'password': 'pass'})
+        rows = {'app': ['[1]\t{"id":1,"qty":2,"total":4}'], 'app_shadow': []}
+        with patch.object(PostgresEngine, 'stream_query', side_effect=lambda db, query: iter(rows[db])), \
+             patch.object(PostgresEngine, 'get_generated_columns', return_value=['total']):
+            sql = list(diff_table_rows(engine, 'app', 'app_shadow', 'items', ['id'], ['id', 'qty', 'total'],
+                                       ['id', 'qty', 'total']))
+
+        self.assertEqual(len(sql), 1)
+        self.assertTrue(sql[0].startswith("INSERT INTO public.items (id, qty) OVERRIDING SYSTEM VALUE SELECT id, qty "))
+        self.assertTrue(sql[0].endswith("ON CONFLICT (id) DO UPDATE SET qty = EXCLUDED.qty;"))
+
+    def test_no_primary_key(self):
+        engine = MySQLEngine({})
+        self.assertIsNone(diff_table_rows(engine, 'app', 'app_shadow', 'logs', [], ['msg'], ['msg']))
+
+
+if __name__ == '__main__':
+    unittest.main()
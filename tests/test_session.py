@@ -0,0 +1,62 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from dbl.errors import DBLError
+from dbl.engines.postgres import PostgresEngine
+from dbl.engines.session import CLISession, SessionManager
+
+
+class TestCLISession(unittest.TestCase):
+    def test_reads_until_sentinel(self):
+        # cat echoes the query, then the sentinel command itself
+        session = CLISession("cat", lambda token: f"{token} false")
+        try:
+            self.assertEqual(list(session.run("SELECT 1")), ["SELECT 1;"])
+            self.assertEqual(list(session.run("SELECT 2;")), ["SELECT 2;"])
+        finally:
+            session.close()
+
+    def test_error_flag_raises(self):
+        session = CLISession("cat", lambda token: f"{token} true")
+        try:
+            with self.assertRaises(DBLError):
+                list(session.run("SELECT broken"))
+        finally:
+            session.close()
+
+    def test_exited_process_raises(self):
+        session = CLISession("true", lambda token: token)
+        try:
+            with self.assertRaises(DBLError):
+                list(session.run("SELECT 1"))
+        finally:
+            session.close()
+
+
+class TestSessionEngine(unittest.TestCase):
+    def setUp(self):
+        self.config = {'engine': 'postgres', 'host': 'localhost', 'port': 5432,
+                       'user': 'admin', 'password': 'pass', 'execution': 'session'}
+
+    def test_fetch_rows_reuses_one_session(self):
+        engine = PostgresEngine(self.config)
+        session = MagicMock()
+        session.run.side_effect = lambda query: iter(["users", "orders"])
+        with patch.object(PostgresEngine, 'open_session', return_value=session) as mock_open:
+            engine.sessions = SessionManager(engine.open_session, 2)
+            self.assertEqual(engine.get_tables('testdb'), ['users', 'orders'])
+            self.assertEqual(engine.get_tables('testdb'), ['users', 'orders'])
+
+        mock_open.assert_called_once_with('testdb')
+
+    def test_session_cmd_uses_interactive_docker_exec(self):
+        engine = PostgresEngine(dict(self.config, container_name='pg', docker_direct=False))
+        with patch('dbl.engines.postgres.CLISession') as mock_session:
+            engine.open_session('testdb')
+
+        cmd = mock_session.call_args[0][0]
+        self.assertTrue(cmd.startswith('docker exec -i pg psql'))
+        self.assertIn('ON_ERROR_STOP=0', cmd)
+
+
+if __name__ == '__main__':
+    unittest.main()
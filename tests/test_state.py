@@ -1,8 +1,15 @@
+import os
+import tempfile
 import unittest
 from unittest.mock import patch, MagicMock
 import json
-from dbl.state import get_state, _process_table
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from dbl.state import get_state, get_states, get_db_state, store_baseline_state, _process_table, _process_table_chunks
+from dbl.state import resolve_tables, outside_signatures, scope_violations
+from dbl.errors import DBLError
 from dbl.engines.postgres import PostgresEngine
+from dbl.engines.mysql import MySQLEngine
 
 
 class TestState(unittest.TestCase):
@@ -19,10 +26,11 @@ class TestState(unittest.TestCase):
         }
         self.engine = PostgresEngine(self.config)
 
+    @patch.object(PostgresEngine, 'get_all_primary_keys')
     @patch('dbl.state._process_table')
     @patch.object(PostgresEngine, 'inspect_db')
     @patch.object(PostgresEngine, 'get_tables')
-    def test_get_state_schema_only(self, mock_get_tables, mock_inspect_db, mock_process):
+    def test_get_state_schema_only(self, mock_get_tables, mock_inspect_db, mock_process, mock_all_pks):
         mock_inspect_db.return_value = {'table1': {'id': {'type': 'int'}}, 'table2': {'name': {'type': 'varchar'}}}
         mock_get_tables.return_value = ['table1', 'table2']
         mock_process.side_effect = [('table1', 'hash1', None, None), ('table2', 'hash2', None, None)]
@@ -33,27 +41,56 @@ class TestState(unittest.TestCase):
         self.assertIn('data', result)
         self.assertEqual(len(result['data']), 2)  # 2 data tables
 
+    @patch.object(PostgresEngine, 'get_all_primary_keys')
+    @patch('dbl.state._process_table')
+    @patch.object(PostgresEngine, 'inspect_db')
+    def test_get_state_uses_bulk_primary_keys(self, mock_inspect_db, mock_process, mock_all_pks):
+        mock_inspect_db.return_value = {'table1': {'id': {'type': 'int'}}, 'table2': {'name': {'type': 'varchar'}}}
+        mock_all_pks.return_value = {'table1': ['id']}
+        mock_process.side_effect = lambda engine, db, table, config, cols, pks: (table, 'h', None, None)
+
+        get_state(self.engine, 'testdb', self.config)
+
+        mock_all_pks.assert_called_once_with('testdb')
+        passed = {c.args[2]: c.args[5] for c in mock_process.call_args_list}
+        self.assertEqual(passed, {'table1': ['id'], 'table2': []})
+
+    @patch('dbl.state._process_table')
+    @patch.object(PostgresEngine, 'get_all_primary_keys')
+    @patch.object(PostgresEngine, 'inspect_db')
+    def test_get_states_shares_one_pool(self, mock_inspect_db, mock_all_pks, mock_process):
+        mock_inspect_db.side_effect = lambda db: {'users': {'id': {'type': 'int'}}, f'{db}_only': {'id': {'type': 'int'}}}
+        mock_all_pks.return_value = {}
+        mock_process.side_effect = lambda engine, db, table, *args: (table, f"{db}:{table}", None, None)
+        engine = PostgresEngine(dict(self.config, fingerprint={'workers': 2}))
+
+        with patch('dbl.state.ThreadPoolExecutor', wraps=ThreadPoolExecutor) as mock_pool:
+            active, shadow = get_states(engine, ['a', 'b'], self.config)
+
+        mock_pool.assert_called_once_with(max_workers=2)
+        self.assertEqual(active['data'], {'users': 'a:users', 'a_only': 'a:a_only'})
+        self.assertEqual(shadow['data'], {'users': 'b:users', 'b_only': 'b:b_only'})
+
     @patch.object(PostgresEngine, 'get_primary_keys')
-    @patch.object(PostgresEngine, 'execute_query')
-    @patch('dbl.state.run_command')
-    def test_process_table_with_pk(self, mock_run_command, mock_execute_query, mock_get_pk):
+    @patch.object(PostgresEngine, 'stream_query')
+    def test_process_table_with_pk(self, mock_stream_query, mock_get_pk):
         mock_get_pk.return_value = ['id']
-        mock_execute_query.return_value = "psql ... -c 'SELECT * FROM table1 ORDER BY id'"
-        mock_run_command.return_value = "1|test\n2|data\n"
+        mock_stream_query.return_value = iter(["1|test ", "", "2|data"])
 
         result = _process_table(self.engine, 'testdb', 'table1', self.config)
 
         table, hash_val, pk_issue, error = result
         self.assertEqual(table, 'table1')
-        self.assertIsInstance(hash_val, str)
+        self.assertEqual(hash_val, hashlib.md5(b"1|test\n2|data").hexdigest())
+        mock_stream_query.assert_called_once_with('testdb', 'SELECT * FROM table1 ORDER BY id')
         self.assertIsNone(pk_issue)
         self.assertIsNone(error)
 
     @patch.object(PostgresEngine, 'get_primary_keys')
-    @patch.object(PostgresEngine, 'dump_table_data')
-    def test_process_table_without_pk(self, mock_dump, mock_get_pk):
+    @patch('dbl.state.stream_command')
+    def test_process_table_without_pk(self, mock_stream_command, mock_get_pk):
         mock_get_pk.return_value = []
-        mock_dump.return_value = "test data\n"
+        mock_stream_command.return_value = iter(["test data"])
 
         result = _process_table(self.engine, 'testdb', 'table1', self.config)
 
@@ -63,6 +100,161 @@ class TestState(unittest.TestCase):
         self.assertEqual(pk_issue, 'table1')  # Without PK
         self.assertIsNone(error)
 
+    @patch.object(PostgresEngine, 'get_primary_keys')
+    @patch('dbl.engines.postgres.run_command')
+    def test_process_table_server_fingerprint(self, mock_run_command, mock_get_pk):
+        config = dict(self.config, fingerprint={'mode': 'server'})
+        mock_run_command.return_value = "2:123:456"
+
+        table, hash_val, pk_issue, error = _process_table(self.engine, 'testdb', 'table1', config)
+
+        self.assertEqual(table, 'table1')
+        self.assertEqual(len(hash_val), 32)
+        self.assertIsNone(error)
+        mock_get_pk.assert_not_called()
+        self.assertIn('md5(t::text)', mock_run_command.call_args[0][0])
+
+    @patch('dbl.engines.mysql.run_command')
+    def test_process_table_mysql_defaults_to_server(self, mock_run_command):
+        engine = MySQLEngine(dict(self.config, engine='mysql'))
+        mock_run_command.return_value = "2\t123\t456"
+
+        table, hash_val, pk_issue, error = _process_table(engine, 'testdb', 'table1', self.config, ['id', 'name'])
+
+        self.assertIsNone(pk_issue)
+        self.assertIsNone(error)
+        self.assertEqual(mock_run_command.call_count, 1)
+        self.assertIn('BIT_XOR', mock_run_command.call_args[0][0])
+
+    @patch.object(MySQLEngine, 'stream_query')
+    @patch('dbl.engines.mysql.run_command')
+    def test_failed_server_fingerprint_hashes_rows(self, mock_run_command, mock_stream_query):
+        engine = MySQLEngine(dict(self.config, engine='mysql'))
+        mock_run_command.side_effect = DBLError("You have an error in your SQL syntax")
+        mock_stream_query.return_value = iter(["1\ta"])
+
+        table, hash_val, pk_issue, error = _process_table(engine, 'testdb', 'table1', self.config, ['id'], ['id'])
+
+        self.assertEqual(hash_val, hashlib.md5(b"1\ta").hexdigest())
+        self.assertIsNone(error)
+
+    @patch('dbl.state.save_fingerprint_cache')
+    @patch('dbl.state.load_fingerprint_cache')
+    @patch('dbl.state._process_table')
+    @patch.object(PostgresEngine, 'get_change_counters')
+    @patch.object(PostgresEngine, 'inspect_db')
+    def test_get_state_reuses_cached_fingerprints(self, mock_inspect_db, mock_counters, mock_process, mock_load, mock_save):
+        from dbl.state import store_fingerprint
+        schema = {'table1': {'id': {'type': 'int'}}, 'table2': {'id': {'type': 'int'}}}
+        mock_inspect_db.return_value = schema
+        mock_counters.return_value = {'table1': '1/2/3', 'table2': '4/5/6'}
+        columns_sig = hashlib.md5(json.dumps(schema['table1'], sort_keys=True).encode()).hexdigest()
+        entries = {}
+        store_fingerprint(entries, 'testdb', 'table1', f"1/2/3/{columns_sig}", 'rows', 'cached1')
+        mock_load.return_value = entries
+        mock_process.return_value = ('table2', 'hash2', None, None)
+        config = dict(self.config, fingerprint={'cache': True})
+
+        result = get_state(self.engine, 'testdb', config)
+
+        self.assertEqual(result['data'], {'table1': 'cached1', 'table2': 'hash2'})
+        mock_process.assert_called_once()
+        self.assertIn('testdb|table2', mock_save.call_args[0][0])
+
+    @patch.object(PostgresEngine, 'get_primary_keys')
+    @patch('dbl.engines.postgres.run_command')
+    def test_process_table_chunks(self, mock_run_command, mock_get_pk):
+        mock_get_pk.return_value = ['id']
+        mock_run_command.return_value = "0|10:1:2\n3|4:5:6\n"
+        config = dict(self.config, fingerprint={'mode': 'server', 'merkle': True, 'chunk_size': 100})
+
+        table, hash_val, pk_issue, error, chunk_info = _process_table_chunks(
+            self.engine, 'testdb', 'table1', config, {'id': {'type': 'integer'}})
+
+        self.assertIsNone(error)
+        self.assertEqual(chunk_info, {'pk': 'id', 'chunk_size': 100, 'leaves': {'0': '10:1:2', '3': '4:5:6'}})
+        self.assertIn('GROUP BY b', mock_run_command.call_args[0][0])
+
+
+class TestShadowBaseline(unittest.TestCase):
+    def setUp(self):
+        self.config = {'db_name': 'testdb', 'engine': 'postgres', 'track_tables': [], 'ignore_tables': []}
+        self.engine = PostgresEngine(self.config)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.meta_file = os.path.join(self.tmp.name, 'sandbox.json')
+        with open(self.meta_file, 'w') as f:
+            json.dump({"mode": "shadow", "active_db": "testdb", "backup_db": "testdb_shadow"}, f)
+        patcher = patch('dbl.state.SANDBOX_META_FILE', self.meta_file)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+    @patch('dbl.state.get_states')
+    def test_shadow_state_computed_once(self, mock_get_state):
+        mock_get_state.return_value = [{'schema': 's', 'data': {'users': 'h1', 'orders': 'h2'}}]
+
+        first = get_db_state(self.engine, 'testdb_shadow', self.config)
+        second = get_db_state(self.engine, 'testdb_shadow', self.config, filter_tables=['users'])
+
+        self.assertEqual(first['data'], {'users': 'h1', 'orders': 'h2'})
+        self.assertEqual(second, {'schema': 's', 'data': {'users': 'h1'}})
+        mock_get_state.assert_called_once_with(self.engine, ['testdb_shadow'], self.config, filter_tables=None, schemas=None,
+                                               scope=None)
+
+    @patch('dbl.state.get_states')
+    def test_config_change_invalidates_baseline(self, mock_get_state):
+        store_baseline_state(self.engine, self.config, {'schema': 'old', 'data': {}})
+        mock_get_state.return_value = [{'schema': 'new', 'data': {}}]
+
+        state = get_db_state(self.engine, 'testdb_shadow', dict(self.config, ignore_tables=['logs']))
+
+        self.assertEqual(state['schema'], 'new')
+
+    @patch('dbl.state.get_states')
+    def test_active_db_is_always_fingerprinted(self, mock_get_state):
+        store_baseline_state(self.engine, self.config, {'schema': 'old', 'data': {}})
+        mock_get_state.return_value = [{'schema': 'live', 'data': {}}]
+
+        self.assertEqual(get_db_state(self.engine, 'testdb', self.config)['schema'], 'live')
+
+
+class TestPartialSandbox(unittest.TestCase):
+    SCHEMA = {'users': {'id': {'type': 'int'}}, 'sales_2024': {'id': {'type': 'int'}},
+              'sales_2025': {'id': {'type': 'int'}}, 'events': {'id': {'type': 'int'}}}
+
+    def setUp(self):
+        self.config = {'db_name': 'testdb', 'engine': 'postgres', 'track_tables': [], 'ignore_tables': []}
+        self.engine = PostgresEngine(self.config)
+
+    def test_resolve_tables_expands_globs(self):
+        self.assertEqual(resolve_tables(['users', 'sales_*'], list(self.SCHEMA)),
+                         ['sales_2024', 'sales_2025', 'users'])
+        with self.assertRaises(DBLError):
+            resolve_tables(['orders'], list(self.SCHEMA))
+
+    def test_scope_violations_report_ddl_outside_scope(self):
+        scope = ['users']
+        meta = {'tables': scope, 'outside': outside_signatures(self.SCHEMA, scope)}
+        altered = dict(self.SCHEMA, events={'id': {'type': 'int'}, 'kind': {'type': 'text'}}, coupons={})
+        del altered['sales_2024']
+        # Changes inside the scope are what the sandbox is for
+        altered['users'] = {'id': {'type': 'bigint'}}
+
+        self.assertEqual(scope_violations(self.SCHEMA, meta), [])
+        self.assertEqual(scope_violations(altered, meta), ['coupons', 'events', 'sales_2024'])
+
+    @patch('dbl.state._process_table', side_effect=lambda e, db, t, c, cols, pks: (t, 'h', None, None))
+    @patch.object(PostgresEngine, 'get_all_primary_keys', return_value={})
+    @patch.object(PostgresEngine, 'inspect_db')
+    def test_scope_limits_schema_and_tracking(self, mock_inspect, mock_pks, mock_process):
+        # The partial shadow only holds the scoped tables
+        mock_inspect.side_effect = lambda db: self.SCHEMA if db == 'testdb' else {'users': self.SCHEMA['users']}
+
+        active, shadow = get_states(self.engine, ['testdb', 'testdb_shadow'], self.config, scope=['users'])
+
+        self.assertEqual(active, shadow)
+        self.assertEqual(list(active['data']), ['users'])
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
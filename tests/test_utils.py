@@ -0,0 +1,20 @@
+import unittest
+from dbl.errors import DBLError
+from dbl.utils import stream_command
+
+
+class TestStreamCommand(unittest.TestCase):
+    def test_lines_split_across_chunks(self):
+        lines = list(stream_command('printf "alpha\\r\\nbeta\\n\\ngamma"', chunk_size=3))
+
+        self.assertEqual(lines, ['alpha', 'beta', '', 'gamma'])
+
+    def test_failure_raises_with_stderr(self):
+        with self.assertRaises(DBLError) as ctx:
+            list(stream_command('echo partial; echo boom >&2; exit 3'))
+
+        self.assertIn('boom', str(ctx.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+from dbl.writer import LayerWriter, file_has_sql
+
+
+class TestLayerWriter(unittest.TestCase):
+    def test_matches_join_layout(self):
+        buf = io.StringIO()
+        writer = LayerWriter(buf)
+        items = ["-- header", "", "ALTER TABLE t ADD COLUMN c int;", ""]
+
+        writer.extend(items)
+
+        self.assertEqual(buf.getvalue(), "\n".join(items))
+        self.assertTrue(writer.has_sql)
+
+    def test_comments_only_is_not_sql(self):
+        writer = LayerWriter(io.StringIO())
+
+        writer.extend(["-- header", "", "--   users"])
+
+        self.assertFalse(writer.has_sql)
+
+    def test_copies_spooled_parts(self):
+        buf = io.StringIO()
+        writer = LayerWriter(buf)
+        part = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+        part.write("-- dump\nINSERT INTO t VALUES (1);\nINSERT INTO t VALUES (2);\n")
+        part.seek(0)
+
+        writer.extend(["TRUNCATE TABLE t;", part, ""])
+
+        self.assertEqual(buf.getvalue(),
+                         "TRUNCATE TABLE t;\n-- dump\nINSERT INTO t VALUES (1);\nINSERT INTO t VALUES (2);\n\n")
+        self.assertTrue(part.closed)
+
+
+class TestCommitNoEdit(unittest.TestCase):
+    def setUp(self):
+        self.layers = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.layers)
+
+    def _commit(self, body):
+        from dbl.commands import cmd_commit
+
+        def write(sql, *a, **kw):
+            sql.extend(body)
+            kw['states']['active'] = {'schema': 's', 'data': {'t': 'h'}}
+
+        args = MagicMock()
+        args.message = "ci"
+        args.schema_only = False
+        args.no_edit = True
+        manifest = {'current': 'master', 'branches': {'master': []}}
+        with patch('dbl.commands.commit.LAYERS_DIR', self.layers), \
+             patch('dbl.commands.commit.load_config', return_value={}), \
+             patch('dbl.commands.commit.get_engine', return_value=MagicMock()), \
+             patch('dbl.commands.commit.get_target_db', return_value=('app', True)), \
+             patch('dbl.commands.commit.open', unittest.mock.mock_open(read_data='{"backup_db": "app_shadow"}')), \
+             patch('dbl.commands.commit.write_migration_sql', side_effect=write), \
+             patch('dbl.commands.commit.load_manifest', return_value=manifest), \
+             patch('dbl.commands.commit.save_manifest'), \
+             patch('dbl.commands.commit.store_baseline_state'), \
+             patch('dbl.commands.commit.clear_baseline_state'), \
+             patch('dbl.commands.commit.invalidate_fingerprint_cache'), \
+             patch('dbl.commands.commit.log'), \
+             patch('dbl.commands.commit.wait_for_shadow'), \
+             patch('dbl.commands.commit.start_shadow_sync', return_value={'id': 'shadow-sync-1'}) as mock_sync, \
+             patch('dbl.commands.commit.subprocess.call') as mock_editor:
+            cmd_commit(args)
+        self.mock_sync = mock_sync
+        return manifest, mock_editor
+
+    def test_writes_layer_without_editor(self):
+        manifest, mock_editor = self._commit(["-- header", "CREATE TABLE t (id int);"])
+
+        mock_editor.assert_not_called()
+        fname = manifest['branches']['master'][0]['file']
+        path = os.path.join(self.layers, fname)
+        with open(path) as f:
+            self.assertEqual(f.read(), "-- ci\n-- header\nCREATE TABLE t (id int);")
+        self.assertTrue(file_has_sql(path))
+        self.assertEqual(os.listdir(self.layers), [fname])
+        self.assertEqual(self.mock_sync.call_args[0][2:], (path, {'schema': 's', 'data': {'t': 'h'}}))
+
+    def test_no_changes_leaves_nothing_behind(self):
+        manifest, _ = self._commit(["-- header", ""])
+
+        self.assertEqual(manifest['branches']['master'], [])
+        self.assertEqual(os.listdir(self.layers), [])
+
+
+if __name__ == '__main__':
+    unittest.main()